@@ -1,53 +1,151 @@
-from flask import Blueprint, jsonify, request
+import base64
+import json
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 from config.supabase_client import supabase
+from services.options_service import DistinctValuesService
+from utils.helpers import check_admin_token
+from utils.metrics import span, register_cache
 
 data_bp = Blueprint('data', __name__)
+options_service = DistinctValuesService()
+register_cache('options', options_service.cache.stats)
+
+# Columns of mitti_mitra_data that /records may project; `id` is the keyset cursor
+RECORD_FIELDS = [
+    'id', 'state', 'district', 'agro_climatic_zone', 'crop', 'crop_type', 'season',
+    'soil_n', 'soil_p', 'soil_k', 'soil_ph', 'avg_temperature', 'avg_rainfall',
+    'humidity', 'area_hectare', 'yield_ton_per_hectare'
+]
+RECORD_FILTERS = ['state', 'crop', 'season', 'crop_type', 'agro_climatic_zone']
+CURSOR_COLUMN = 'id'
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 1000
 
 
 @data_bp.route('/options', methods=['GET'])
 def get_options():
-    """Return distinct values for states, crops, seasons, crop_type and zones."""
+    """Return distinct values for states, crops, seasons, crop_type and zones.
+
+    Served from an in-memory cache; clients sending If-None-Match with the
+    current ETag get an empty 304.
+    """
     try:
         if supabase is None:
             return jsonify({'error': 'supabase client not configured'}), 500
 
-        fields = ['state', 'crop', 'season', 'crop_type', 'agro_climatic_zone', 'district']
-        result = {}
-        for f in fields:
-            try:
-                resp = supabase.table('mitti_mitra_data').select(f).neq(f, None).limit(1000).execute()
-                # resp.data is list of dicts
-                vals = []
-                if hasattr(resp, 'data') and resp.data:
-                    vals = list({r.get(f) for r in resp.data if r.get(f) is not None})
-                result[f] = sorted(vals)
-            except Exception:
-                result[f] = []
-
-        return jsonify(result)
+        result, etag = options_service.get()
+        resp = jsonify(result)
+        resp.set_etag(etag)
+        resp.cache_control.public = True
+        resp.cache_control.max_age = 60
+        return resp.make_conditional(request)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@data_bp.route('/options/invalidate', methods=['POST'])
+def invalidate_options():
+    """Drop the cached options so the next request recomputes them (needs X-Admin-Token)."""
+    if not check_admin_token(request.headers):
+        return jsonify({'error': 'Unauthorized'}), 401
+    options_service.invalidate()
+    return jsonify({'status': 'invalidated'})
+
+
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(json.dumps({CURSOR_COLUMN: last_id}).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return the last seen key from an opaque cursor, raising ValueError if malformed."""
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))[CURSOR_COLUMN]
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def _parse_fields(raw):
+    """Validate the `fields=` projection; None means all columns."""
+    if not raw:
+        return None
+    fields = [f.strip() for f in raw.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in RECORD_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def _fetch_page(fields, filters, after, limit):
+    """One keyset page ordered by the cursor column, starting after `after`."""
+    columns = '*'
+    if fields is not None:
+        columns = ','.join(fields if CURSOR_COLUMN in fields else fields + [CURSOR_COLUMN])
+
+    q = supabase.table('mitti_mitra_data').select(columns).order(CURSOR_COLUMN).limit(limit)
+    if after is not None:
+        q = q.gt(CURSOR_COLUMN, after)
+    for param, val in filters.items():
+        q = q.eq(param, val)
+
+    with span('supabase'):
+        rows = getattr(q.execute(), 'data', None) or []
+    last_id = rows[-1].get(CURSOR_COLUMN) if rows else None
+    if fields is not None and CURSOR_COLUMN not in fields:
+        rows = [{f: r.get(f) for f in fields} for r in rows]
+    return rows, last_id
+
+
+def _stream_ndjson(fields, filters, after, page_size):
+    """Yield every matching row as NDJSON, fetching one keyset page at a time."""
+    while True:
+        rows, last_id = _fetch_page(fields, filters, after, page_size)
+        for row in rows:
+            yield json.dumps(row, default=str) + '\n'
+        if len(rows) < page_size or last_id is None:
+            return
+        after = last_id
+
+
 @data_bp.route('/records', methods=['GET'])
 def get_records():
     """Return filtered records from mitti_mitra_data. Query params are allowed: state, crop, season, crop_type.
 
     This is a simple passthrough to allow frontend to fetch matching rows for previews.
+
+    Paging and shaping params:
+      limit   page size (default 500, max 1000)
+      cursor  `next_cursor` from the previous page, to continue after it
+      fields  comma-separated columns to return, e.g. fields=state,crop,yield_ton_per_hectare
+      format  `ndjson` streams every matching row (from `cursor` on) as
+              newline-delimited JSON instead of returning one page
     """
     try:
         if supabase is None:
             return jsonify({'error': 'supabase client not configured'}), 500
 
-        q = supabase.table('mitti_mitra_data').select('*').limit(500)
+        try:
+            fields = _parse_fields(request.args.get('fields'))
+            cursor = request.args.get('cursor')
+            after = decode_cursor(cursor) if cursor else None
+            limit = min(max(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
         # Apply filters
-        for param in ['state', 'crop', 'season', 'crop_type', 'agro_climatic_zone']:
+        filters = {}
+        for param in RECORD_FILTERS:
             val = request.args.get(param)
             if val:
-                q = q.eq(param, val)
+                filters[param] = val
+
+        if request.args.get('format') == 'ndjson':
+            return Response(
+                stream_with_context(_stream_ndjson(fields, filters, after, limit)),
+                mimetype='application/x-ndjson'
+            )
 
-        resp = q.execute()
-        data = getattr(resp, 'data', [])
-        return jsonify({'count': len(data), 'data': data})
+        data, last_id = _fetch_page(fields, filters, after, limit)
+        next_cursor = encode_cursor(last_id) if len(data) == limit and last_id is not None else None
+        return jsonify({'count': len(data), 'data': data, 'next_cursor': next_cursor})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1,74 +1,254 @@
+import logging
 from flask import Blueprint, request, jsonify
 import os
-import joblib
 import numpy as np
 import pandas as pd
-from config.supabase_client import supabase
 from services.fertilizer_service import recommend_fertilizer
+from services.zone_service import ZoneResolver
+from utils.helpers import check_admin_token
+from utils.metrics import span, register_collector, register_cache
+from ml.model_registry import ModelRegistry, ModelLoadError
+
+logger = logging.getLogger(__name__)
 
 predict_bp = Blueprint('predict', __name__)
 
 # Paths
 REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
 MODEL_DIR = os.path.join(REPO_ROOT, 'models')
-RF_MODEL_PATH = os.path.join(MODEL_DIR, 'rf_crop_model.joblib')
-XGB_MODEL_PATH = os.path.join(MODEL_DIR, 'xgb_yield_model.joblib')
-PREPROC_CLF = os.path.join(MODEL_DIR, 'preprocessor_clf.joblib')
-PREPROC_REG = os.path.join(MODEL_DIR, 'preprocessor_reg.joblib')
-
-# Lazy-loaded objects
-rf_model = None
-reg_model = None
-preproc_clf = None
-preproc_reg = None
 
+# Representative payload used to warm up a freshly loaded model set
+WARM_UP_INPUT = {
+    'N': 90, 'P': 42, 'K': 43, 'ph': 6.5, 'temperature': 25.0, 'humidity': 70.0,
+    'rainfall': 200.0, 'state': 'Karnataka', 'season': 'Kharif', 'crop_type': 'Agriculture'
+}
 
-def load_models():
-    """Load models and preprocessors lazily."""
-    global rf_model, reg_model, preproc_clf, preproc_reg
-    if rf_model is not None:
-        return
 
+def warm_up_models(models):
+    """Run one prediction through a new model set so the first real request doesn't pay for it."""
     try:
-        if os.path.exists(PREPROC_CLF):
-            preproc_clf = joblib.load(PREPROC_CLF)
+        row = build_input_row(WARM_UP_INPUT)
+        preds = classify_rows(models, [row])
+        predict_yields(models, [row], [[entry['crop'] for entry in preds[0]]])
     except Exception as e:
-        print('Could not load preprocessor_clf:', e)
+        logger.warning('Model warm-up failed: %s', e)
 
-    try:
-        if os.path.exists(PREPROC_REG):
-            preproc_reg = joblib.load(PREPROC_REG)
-    except Exception as e:
-        print('Could not load preprocessor_reg:', e)
 
+model_registry = ModelRegistry(MODEL_DIR, warm_up=warm_up_models)
+zone_resolver = ZoneResolver()
+
+
+def load_models():
+    """Return the currently served model set, loading it on first use."""
+    return model_registry.current()
+
+
+def enrich_with_zone(state: str):
+    """Resolve agro_climatic_zone for a given state (cached, no per-request DB query)."""
+    return zone_resolver.resolve(state)
+
+
+# Request field -> model column mapping (the first alias wins when both are sent)
+NUMERIC_FIELDS = [
+    ('soil_n', 'N'),
+    ('soil_p', 'P'),
+    ('soil_k', 'K'),
+    ('soil_ph', 'ph'),
+    ('avg_temperature', 'temperature'),
+    ('avg_rainfall', 'rainfall'),
+    ('humidity', None),
+]
+CATEGORICAL_FIELDS = ['state', 'district', 'agro_climatic_zone', 'season', 'crop_type']
+
+TOP_N = 3
+MAX_BATCH_SIZE = 1000
+
+
+def build_input_row(data: dict) -> dict:
+    """Map a request payload onto the column names the preprocessors expect."""
+    input_row = {}
+
+    # Numeric inputs
+    for column, alias in NUMERIC_FIELDS:
+        input_row[column] = data.get(column) or (data.get(alias) if alias else None)
+
+    # Categorical inputs
+    for k in CATEGORICAL_FIELDS:
+        if k in data:
+            input_row[k] = data.get(k)
+
+    return input_row
+
+
+def validate_input(data) -> str:
+    """Return why a payload cannot be scored, or None if it can."""
+    if not isinstance(data, dict):
+        return 'Input must be a JSON object'
+    row = build_input_row(data)
+    for column, alias in NUMERIC_FIELDS:
+        value = row[column]
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            return f"{column} must be a number"
+        try:
+            float(value)
+        except (TypeError, ValueError):
+            return f"{column} must be a number"
+    for column in CATEGORICAL_FIELDS:
+        value = data.get(column)
+        if value is not None and not isinstance(value, str):
+            return f"{column} must be a string"
+    return None
+
+
+def _frame_for(preproc, rows):
+    """Build a DataFrame from input rows, padding columns the preprocessor expects."""
+    df = pd.DataFrame(rows)
+    if hasattr(preproc, 'feature_names_in_'):
+        missing = [c for c in preproc.feature_names_in_ if c not in df.columns]
+        if missing:
+            df = df.reindex(columns=list(df.columns) + missing)
+    return df
+
+
+def classify_rows(models, rows, top_n=TOP_N):
+    """Top-N crop predictions for every input row using a single predict_proba call.
+
+    Returns one list of ``{'crop', 'probability'}`` dicts per row (empty lists
+    when the classifier is unavailable).
+    """
+    if not rows or models is None or models.preproc_clf is None or models.rf_model is None:
+        return [[] for _ in rows]
+
+    with span('preprocessing'):
+        Xc = models.preproc_clf.transform(_frame_for(models.preproc_clf, rows))
+    clf = models.fast_clf if models.fast_clf is not None else models.rf_model
+    with span('classification'):
+        probs = clf.predict_proba(Xc)
+    classes = models.rf_model.classes_
+
+    top_idx = np.argsort(probs, axis=1)[:, ::-1][:, :top_n]
+    return [
+        [{'crop': str(classes[i]), 'probability': float(probs[r][i])} for i in top_idx[r]]
+        for r in range(len(rows))
+    ]
+
+
+def predict_yields(models, rows, crops_per_row):
+    """Score every (input row, crop) pair with a single reg_model.predict call.
+
+    Returns one list of yields per row, aligned with ``crops_per_row``, or
+    ``None`` when the regressor is unavailable.
+    """
+    if models is None or models.yield_scorer is None:
+        return None
+    with span('yield'):
+        return models.yield_scorer.score(rows, crops_per_row)
+
+
+def _enrich_zones(items):
+    """Fill in agro_climatic_zone for payloads that only carry a state."""
+    zones = {}
+    for data in items:
+        if 'state' in data and 'agro_climatic_zone' not in data:
+            state = data.get('state')
+            if state not in zones:
+                zones[state] = enrich_with_zone(state)
+            if zones[state]:
+                data['agro_climatic_zone'] = zones[state]
+
+
+def _build_result(data, clf_preds, yields):
+    """Assemble the per-farm response body shared by the single and batch endpoints."""
+    reg_preds = None
+    if clf_preds and yields is not None:
+        for entry, val in zip(clf_preds, yields):
+            entry['predicted_yield'] = val
+        reg_preds = yields
+
+    # -------- Fertilizer Recommendation (FIXED) --------
+    soil_n = data.get('soil_n') or data.get('N')
+    soil_p = data.get('soil_p') or data.get('P')
+    soil_k = data.get('soil_k') or data.get('K')
+
+    with span('fertilizer'):
+        fertilizer_recommendations = recommend_fertilizer(
+            soil_n=soil_n,
+            soil_p=soil_p,
+            soil_k=soil_k
+        )
+
+    return {
+        'status': 'success',
+        'crops': clf_preds,
+        'predicted_yield': reg_preds,
+        'fertilizer_recommendations': fertilizer_recommendations,
+        'used_params': data
+    }
+
+
+def _recommend_many(items, strict=False):
+    """
+    Run classification and yield scoring for a list of payloads in bulk.
+
+    Model errors are logged and leave the crops / yields empty, unless
+    ``strict`` is set, in which case they propagate.
+    """
+    with span('zone_enrichment'):
+        _enrich_zones(items)
+    rows = [build_input_row(data) for data in items]
+
+    # One model set per request, even if a hot-swap happens meanwhile
+    models = load_models()
+
+    # -------- Crop Classification --------
     try:
-        if os.path.exists(RF_MODEL_PATH):
-            rf_model = joblib.load(RF_MODEL_PATH)
+        clf_preds = classify_rows(models, rows)
     except Exception as e:
-        print('Could not load rf model:', e)
+        if strict:
+            raise
+        logger.exception('Classifier inference error: %s', e)
+        clf_preds = [[] for _ in rows]
 
+    # -------- Yield Prediction --------
+    yields = None
     try:
-        if os.path.exists(XGB_MODEL_PATH):
-            reg_model = joblib.load(XGB_MODEL_PATH)
+        crops_per_row = [[entry['crop'] for entry in preds] for preds in clf_preds]
+        yields = predict_yields(models, rows, crops_per_row)
     except Exception as e:
-        print('Could not load regressor model:', e)
+        if strict:
+            raise
+        logger.exception('Regressor inference error: %s', e)
 
+    return [
+        _build_result(data, preds, yields[i] if yields is not None else None)
+        for i, (data, preds) in enumerate(zip(items, clf_preds))
+    ]
 
-def enrich_with_zone(state: str):
-    """Fetch agro_climatic_zone for a given state."""
-    if not state or supabase is None:
+
+@register_collector
+def _model_metrics():
+    """Load time and completeness of the served model set."""
+    info = model_registry.describe()
+    loaded = info.get('load_seconds') is not None
+    return [
+        ('mitti_model_load_seconds', 'gauge', 'Time taken to load the served model set.',
+         [({'version': str(info.get('version'))}, info['load_seconds'])] if loaded else []),
+        ('mitti_model_set_complete', 'gauge', '1 when every model artifact is loaded.',
+         [({}, 1 if info.get('complete') else 0)]),
+    ]
+
+
+def _yield_cache_stats():
+    models = model_registry.peek()
+    if models is None or models.yield_scorer is None:
         return None
-    try:
-        resp = supabase.table('mitti_mitra_data') \
-            .select('agro_climatic_zone') \
-            .eq('state', state) \
-            .limit(1) \
-            .execute()
-        if getattr(resp, 'data', None):
-            return resp.data[0].get('agro_climatic_zone')
-    except Exception:
-        pass
-    return None
+    return models.yield_scorer.stats()
+
+
+register_cache('zone', zone_resolver.cache.stats)
+register_cache('yield_rows', _yield_cache_stats)
 
 
 @predict_bp.route('/recommend', methods=['POST'])
@@ -82,99 +262,94 @@ def recommend():
     """
     try:
         data = request.json or {}
+        return jsonify(_recommend_many([data])[0])
 
-        # Enrich agro-climatic zone
-        if 'state' in data and 'agro_climatic_zone' not in data:
-            zone = enrich_with_zone(data.get('state'))
-            if zone:
-                data['agro_climatic_zone'] = zone
-
-        # Build input row for ML
-        input_row = {}
-
-        # Numeric inputs
-        input_row['soil_n'] = data.get('soil_n') or data.get('N')
-        input_row['soil_p'] = data.get('soil_p') or data.get('P')
-        input_row['soil_k'] = data.get('soil_k') or data.get('K')
-        input_row['soil_ph'] = data.get('soil_ph') or data.get('ph')
-        input_row['avg_temperature'] = data.get('avg_temperature') or data.get('temperature')
-        input_row['avg_rainfall'] = data.get('avg_rainfall') or data.get('rainfall')
-        input_row['humidity'] = data.get('humidity')
-
-        # Categorical inputs
-        for k in ['state', 'district', 'agro_climatic_zone', 'season', 'crop_type']:
-            if k in data:
-                input_row[k] = data.get(k)
-
-        clf_preds = []
-        reg_preds = None
-
-        # Load ML models
-        load_models()
-
-        # -------- Crop Classification --------
-        if preproc_clf is not None and rf_model is not None:
-            try:
-                df = pd.DataFrame([input_row])
-                if hasattr(preproc_clf, 'feature_names_in_'):
-                    for c in preproc_clf.feature_names_in_:
-                        if c not in df.columns:
-                            df[c] = np.nan
-
-                Xc = preproc_clf.transform(df)
-                probs = rf_model.predict_proba(Xc)
-                classes = rf_model.classes_
-
-                top_idx = np.argsort(probs[0])[::-1][:3]
-                clf_preds = [
-                    {'crop': str(classes[i]), 'probability': float(probs[0][i])}
-                    for i in top_idx
-                ]
-            except Exception as e:
-                print('Classifier inference error:', e)
-
-        # -------- Yield Prediction --------
-        try:
-            if clf_preds and preproc_reg is not None and reg_model is not None:
-                yields = []
-                for entry in clf_preds:
-                    dfr = pd.DataFrame([input_row])
-                    dfr['crop'] = entry['crop']
-
-                    if hasattr(preproc_reg, 'feature_names_in_'):
-                        for c in preproc_reg.feature_names_in_:
-                            if c not in dfr.columns:
-                                dfr[c] = np.nan
-
-                    Xr = preproc_reg.transform(dfr)
-                    val = float(reg_model.predict(Xr)[0])
-                    entry['predicted_yield'] = val
-                    yields.append(val)
-
-                reg_preds = yields
-        except Exception as e:
-            print('Regressor inference error:', e)
+    except Exception as e:
+        logger.exception('Prediction API error: %s', e)
+        return jsonify({'error': 'Internal Server Error'}), 500
 
-        # -------- Fertilizer Recommendation (FIXED) --------
-        soil_n = data.get('soil_n') or data.get('N')
-        soil_p = data.get('soil_p') or data.get('P')
-        soil_k = data.get('soil_k') or data.get('K')
 
-        fertilizer_recommendations = recommend_fertilizer(
-            soil_n=soil_n,
-            soil_p=soil_p,
-            soil_k=soil_k
-        )
+@predict_bp.route('/recommend/batch', methods=['POST'])
+def recommend_batch():
+    """
+    Batch variant of /recommend for dashboards refreshing many plots at once.
+
+    Accepts either a JSON list of payloads or ``{"inputs": [...]}``. All inputs
+    go through the classifier as one matrix and all (input, top-k crop) pairs
+    are scored with one regressor call. ``results`` holds one entry per input,
+    in order, with the same structure /recommend returns.
+
+    Inputs are validated one by one; an invalid input gets
+    ``{"index", "status": "error", "error"}`` and does not affect the others.
+    If the bulk model call still fails, the inputs are scored one at a time
+    so only the failing ones are reported as errors.
+    """
+    try:
+        body = request.get_json(silent=True)
+        items = body.get('inputs') if isinstance(body, dict) else body
+        if not isinstance(items, list):
+            return jsonify({'error': 'Expected a JSON list of inputs or {"inputs": [...]}'}), 400
+        if len(items) > MAX_BATCH_SIZE:
+            return jsonify({'error': f'Batch too large (max {MAX_BATCH_SIZE} inputs)'}), 413
+
+        results = [None] * len(items)
+        valid = []
+        for i, data in enumerate(items):
+            error = validate_input(data)
+            if error:
+                results[i] = {'index': i, 'status': 'error', 'error': error}
+            else:
+                valid.append(i)
+
+        try:
+            scored = _recommend_many([items[i] for i in valid], strict=True)
+        except Exception as e:
+            logger.warning('Bulk scoring failed, scoring inputs one by one: %s', e, extra={'rows': len(valid)})
+            scored = []
+            for i in valid:
+                try:
+                    scored.append(_recommend_many([items[i]], strict=True)[0])
+                except Exception as row_error:
+                    logger.warning('Scoring input %d failed: %s', i, row_error)
+                    scored.append({'index': i, 'status': 'error', 'error': 'Prediction failed'})
+        for i, result in zip(valid, scored):
+            results[i] = result
 
-        # -------- Final Response --------
-        return jsonify({
-            'status': 'success',
-            'crops': clf_preds,
-            'predicted_yield': reg_preds,
-            'fertilizer_recommendations': fertilizer_recommendations,
-            'used_params': data
-        })
+        failed = sum(1 for r in results if r['status'] == 'error')
+        return jsonify({'status': 'success', 'count': len(results), 'failed': failed, 'results': results})
 
     except Exception as e:
-        print('Prediction API Error:', e)
+        logger.exception('Batch prediction API error: %s', e)
         return jsonify({'error': 'Internal Server Error'}), 500
+
+
+@predict_bp.route('/models', methods=['GET'])
+def model_info():
+    """Version, checksums and load status of the served model set."""
+    return jsonify(model_registry.describe())
+
+
+@predict_bp.route('/models/reload', methods=['POST'])
+def reload_models():
+    """
+    Hot-swap to the models currently on disk (e.g. after scripts/train_models.py).
+
+    The new set is loaded and warmed up before it replaces the served one; on
+    failure the previous set keeps serving. The request must carry
+    ADMIN_TOKEN (or MODEL_ADMIN_TOKEN) in the X-Admin-Token header; without
+    a configured token the endpoint is disabled.
+    """
+    if not check_admin_token(request.headers):
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    try:
+        model_registry.load()
+    except ModelLoadError as e:
+        return jsonify({'status': 'error', 'message': str(e), 'models': model_registry.describe()}), 409
+    return jsonify({'status': 'reloaded', 'models': model_registry.describe()})
+
+
+@predict_bp.route('/zones/stats', methods=['GET'])
+def zone_stats():
+    """Hit/miss counters of the agro-climatic zone resolver."""
+    return jsonify(zone_resolver.stats())
@@ -1,5 +1,6 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 from datetime import datetime
+import json
 from services.aggregation_service import AggregationService
 
 report_bp = Blueprint('report', __name__)
@@ -9,10 +10,12 @@ agg_service = AggregationService()
 def get_summary_report():
     """
     Returns a unified soil health report based on aggregated data.
+    Pass ?rebuild=1 to recompute from raw readings instead of the daily buckets.
     """
     try:
         # Fetch 30-day aggregation
-        stats = agg_service.get_30_day_average()
+        rebuild = request.args.get('rebuild') in ('1', 'true')
+        stats = agg_service.get_30_day_average(rebuild=rebuild)
         
         report = {
             'report_id': f"RPT-{int(datetime.now().timestamp())}",
@@ -25,3 +28,67 @@ def get_summary_report():
         return jsonify(report)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+
+MAX_FLEET_DEVICES = 500
+
+
+def _fleet_request():
+    """Device ids from ?device_ids=a,b / ?region=x, or a JSON body with the same keys."""
+    body = request.get_json(silent=True) if request.method == 'POST' else None
+    body = body if isinstance(body, dict) else {}
+
+    device_ids = body.get('device_ids') or request.args.get('device_ids')
+    if isinstance(device_ids, str):
+        device_ids = [d.strip() for d in device_ids.split(',') if d.strip()]
+    region = body.get('region') or request.args.get('region')
+    if not device_ids and region:
+        device_ids = agg_service.devices_in_region(region)
+    return device_ids or [], region
+
+
+@report_bp.route('/fleet', methods=['GET', 'POST'])
+def get_fleet_report():
+    """
+    30-day summaries for many devices at once, plus fleet-wide percentiles.
+
+    Select devices with `device_ids` (comma-separated or a JSON list) or a
+    `region` from the `devices` table. With ?format=ndjson each device is
+    streamed as its own line as soon as it is aggregated, followed by a final
+    line holding the fleet percentiles.
+    """
+    try:
+        device_ids, region = _fleet_request()
+        if not device_ids:
+            return jsonify({'error': 'Provide device_ids or a region with registered devices'}), 400
+        if len(device_ids) > MAX_FLEET_DEVICES:
+            return jsonify({'error': f'Too many devices (max {MAX_FLEET_DEVICES})'}), 413
+
+        generated_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+        if request.args.get('format') == 'ndjson':
+            def generate():
+                summaries = []
+                for device_id, stats in agg_service.iter_fleet_averages(device_ids):
+                    summaries.append(stats)
+                    yield json.dumps({'device_id': device_id, 'soil_health_summary': stats}, default=float) + '\n'
+                yield json.dumps({
+                    'fleet': agg_service.fleet_percentiles(summaries),
+                    'device_count': len(device_ids),
+                    'generated_at': generated_at
+                }) + '\n'
+
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+        devices = dict(agg_service.iter_fleet_averages(device_ids))
+        return jsonify({
+            'report_id': f"FLT-{int(datetime.now().timestamp())}",
+            'generated_at': generated_at,
+            'period': 'Last 30 Days',
+            'region': region,
+            'device_count': len(device_ids),
+            'devices': {d: devices.get(d) for d in device_ids},
+            'fleet': agg_service.fleet_percentiles(devices.values())
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
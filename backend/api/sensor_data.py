@@ -1,42 +1,142 @@
+import logging
 from flask import Blueprint, request, jsonify
 from config.supabase_client import supabase
+from services.ingest_buffer import IngestBuffer
+from services.rolling_aggregates import daily_store
+from utils.helpers import validate_sensor_data
+from utils.metrics import span, register_collector
 from datetime import datetime
+import json
+import os
+import zlib
+
+logger = logging.getLogger(__name__)
 
 sensor_bp = Blueprint('sensor', __name__)
 
+# Readings are journaled locally and flushed to Supabase in the background.
+# Not with the offline dummy client: every flush would fail.
+WRITE_BEHIND = os.getenv('INGEST_WRITE_BEHIND', '1') != '0' and hasattr(supabase, 'table')
+JOURNAL_PATH = os.getenv(
+    'INGEST_JOURNAL_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ingest_journal', 'sensor_readings.jsonl')
+)
+# One locked journal per worker process: sensor_readings.<slot>.jsonl
+JOURNAL_SLOTS = int(os.getenv('INGEST_JOURNAL_SLOTS', '32'))
+ingest_buffer = IngestBuffer(JOURNAL_PATH, slots=JOURNAL_SLOTS)
+
+INSERT_CHUNK_SIZE = 500
+MAX_BATCH_READINGS = 10000
+MAX_BODY_BYTES = 32 * 1024 * 1024  # limit for decompressed request bodies
+SENSOR_LOG_SAMPLE_RATE = float(os.getenv('SENSOR_LOG_SAMPLE_RATE', '0.01'))
+
+
+def _to_record(data):
+    """Map an incoming reading to the sensor_readings schema."""
+    record = {
+        'device_id': data.get('device_id', 'pi_01'),
+        'temperature': data.get('temperature'),
+        'humidity': data.get('humidity'),
+        'ph': data.get('ph'),
+        'nitrogen': data.get('nitrogen'),
+        'phosphorus': data.get('phosphorus'),
+        'potassium': data.get('potassium'),
+        'rainfall': data.get('rainfall', 0.0),
+        'timestamp': data.get('timestamp', datetime.now().isoformat())
+    }
+    # Pi window summaries (edge aggregation): values are window means over sample_count samples
+    if data.get('sample_count') is not None:
+        record['sample_count'] = data['sample_count']
+        record['stats'] = data.get('stats')
+    return record
+
+
+def _validate(data):
+    try:
+        return validate_sensor_data(data)
+    except TypeError:
+        return False, "Non-numeric sensor value"
+
+
+def _request_text():
+    """Request body as text, inflating it when sent with Content-Encoding: gzip."""
+    raw = request.get_data()
+    if request.headers.get('Content-Encoding', '').lower() == 'gzip':
+        inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        raw = inflater.decompress(raw, MAX_BODY_BYTES)
+        if inflater.unconsumed_tail:
+            raise ValueError('Decompressed body too large')
+    return raw.decode('utf-8')
+
+
+def _parse_readings():
+    """Readings from a JSON array, {"readings": [...]} or an NDJSON body (optionally gzipped)."""
+    try:
+        text = _request_text()
+    except (ValueError, zlib.error, UnicodeDecodeError):
+        return None
+
+    if request.mimetype in ('application/x-ndjson', 'application/ndjson'):
+        readings = []
+        for line in text.splitlines():
+            if line.strip():
+                try:
+                    readings.append(json.loads(line))
+                except ValueError:
+                    readings.append(None)
+        return readings
+
+    try:
+        body = json.loads(text)
+    except ValueError:
+        return None
+    if isinstance(body, dict):
+        body = body.get('readings')
+    return body if isinstance(body, list) else None
+
+
 @sensor_bp.route('/data', methods=['POST'])
 def receive_data():
     """
-    Ingest data from Raspberry Pi.
+    Ingest data from Raspberry Pi (JSON body, optionally gzip-compressed).
     """
-    data = request.json
+    try:
+        data = json.loads(_request_text() or 'null')
+    except (ValueError, zlib.error, UnicodeDecodeError):
+        data = None
     if not data:
         return jsonify({'error': 'No data received'}), 400
+
+    ok, message = _validate(data)
+    if not ok:
+        return jsonify({'error': message}), 400
         
-    # Validates output
-    print(f"Received Sensor Data: {data}")
+    # One reading per device per window; log a sample of them
+    logger.debug('Received sensor data %s', data, extra={'sample_rate': SENSOR_LOG_SAMPLE_RATE})
+
+    if supabase and WRITE_BEHIND:
+        try:
+            record = _to_record(data)
+            ingest_buffer.append(record)
+            daily_store.add(record)
+            return jsonify({'status': 'queued'}), 202
+        except Exception as e:
+            # Journal unavailable (e.g. disk full): fall back to a direct insert
+            logger.error('Ingest journal error: %s', e)
 
     if supabase:
         try:
             # Map input to DB schema
-            record = {
-                'device_id': data.get('device_id', 'pi_01'),
-                'temperature': data.get('temperature'),
-                'humidity': data.get('humidity'),
-                'ph': data.get('ph'),
-                'nitrogen': data.get('nitrogen'),
-                'phosphorus': data.get('phosphorus'),
-                'potassium': data.get('potassium'),
-                'rainfall': data.get('rainfall', 0.0),
-                'timestamp': data.get('timestamp', datetime.now().isoformat())
-            }
+            record = _to_record(data)
             
             # Fire and forget / await
-            supabase.table('sensor_readings').insert(record).execute()
+            with span('supabase'):
+                supabase.table('sensor_readings').insert(record).execute()
+            daily_store.add(record)
             return jsonify({'status': 'stored'}), 201
             
         except Exception as e:
-            print(f"Supabase Insert Error: {e}")
+            logger.error('Supabase insert error: %s', e)
             # Do not fail the Pi request if DB is down, just log
             # The Pi has local backup logic
             return jsonify({'error': 'db_error', 'message': str(e)}), 500
@@ -44,6 +144,77 @@ def receive_data():
         # Mock mode
         return jsonify({'status': 'mock_stored'}), 200
 
+
+@sensor_bp.route('/data/batch', methods=['POST'])
+def receive_batch():
+    """
+    Ingest many readings at once (e.g. a Pi uploading its offline backlog).
+
+    Body: JSON array of readings, {"readings": [...]}, or NDJSON; may be
+    gzip-compressed (Content-Encoding: gzip).
+    Each reading is validated on its own; valid ones are written with one
+    multi-row insert per chunk of INSERT_CHUNK_SIZE. The response lists a
+    status for every input row, in order.
+    """
+    readings = _parse_readings()
+    if readings is None:
+        return jsonify({'error': 'Expected a JSON array of readings, {"readings": [...]} or NDJSON'}), 400
+    if len(readings) > MAX_BATCH_READINGS:
+        return jsonify({'error': f'Batch too large (max {MAX_BATCH_READINGS} readings)'}), 413
+
+    results = [None] * len(readings)
+    valid = []
+    for i, data in enumerate(readings):
+        ok, message = _validate(data)
+        if ok:
+            valid.append(i)
+        else:
+            results[i] = {'index': i, 'status': 'rejected', 'error': message}
+
+    stored_status = 'stored' if supabase else 'mock_stored'
+    for start in range(0, len(valid), INSERT_CHUNK_SIZE):
+        chunk = valid[start:start + INSERT_CHUNK_SIZE]
+        try:
+            records = [_to_record(readings[i]) for i in chunk]
+            if supabase:
+                with span('supabase'):
+                    supabase.table('sensor_readings').insert(records).execute()
+                for record in records:
+                    daily_store.add(record)
+            for i in chunk:
+                results[i] = {'index': i, 'status': stored_status}
+        except Exception as e:
+            logger.error('Supabase batch insert error: %s', e, extra={'rows': len(chunk)})
+            for i in chunk:
+                results[i] = {'index': i, 'status': 'rejected', 'error': 'db_error'}
+
+    accepted = sum(1 for r in results if r['status'] != 'rejected')
+    return jsonify({
+        'accepted': accepted,
+        'rejected': len(results) - accepted,
+        'results': results
+    }), 200
+
+@sensor_bp.route('/ingest/stats', methods=['GET'])
+def ingest_stats():
+    """Queue depth and flush latency of the write-behind ingest buffer."""
+    return jsonify(ingest_buffer.stats())
+
+@register_collector
+def _ingest_metrics():
+    """Write-behind queue depth and flush counters."""
+    stats = ingest_buffer.stats()
+    return [
+        ('mitti_ingest_queue_depth', 'gauge', 'Readings journaled but not yet flushed to Supabase.',
+         [({}, stats['queue_depth'])]),
+        ('mitti_ingest_oldest_age_seconds', 'gauge', 'Age of the oldest unflushed reading.',
+         [({}, stats['oldest_age_seconds'])]),
+        ('mitti_ingest_flush_failures_total', 'counter', 'Failed Supabase flushes.',
+         [({}, stats['flush_failures'])]),
+        ('mitti_ingest_dead_lettered_total', 'counter', 'Readings rejected by Supabase and moved to the dead-letter file.',
+         [({}, stats['dead_lettered'])]),
+    ]
+
 @sensor_bp.route('/latest', methods=['GET'])
 def get_latest():
     """
@@ -51,16 +222,17 @@ def get_latest():
     """
     if supabase:
         try:
-            response = supabase.table('sensor_readings')\
-                .select('*')\
-                .order('timestamp', desc=True)\
-                .limit(1)\
-                .execute()
+            with span('supabase'):
+                response = supabase.table('sensor_readings')\
+                    .select('*')\
+                    .order('timestamp', desc=True)\
+                    .limit(1)\
+                    .execute()
             
             if response.data:
                 return jsonify(response.data[0])
         except Exception as e:
-            print(f"Fetch Error: {e}")
+            logger.error('Latest reading fetch error: %s', e)
             
     # Mock Fallback (Simulated Dynamic Data)
     import random
@@ -1,3 +1,4 @@
+import logging
 from flask import Flask, jsonify
 from flask_cors import CORS
 from dotenv import load_dotenv
@@ -9,9 +10,16 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 load_dotenv()
 
+from utils.log import configure_logging
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
 def create_app():
+    configure_logging()
     app = Flask(__name__)
     CORS(app)  # Allow Frontend to communicate
+    metrics.init_app(app)  # request timing + GET /metrics
 
     # Import Blueprints (Assumes these files will be created next)
     # We use deferred imports inside create_app to avoid circular dependencies if any
@@ -25,9 +33,23 @@ def create_app():
         app.register_blueprint(sensor_bp, url_prefix='/api/sensor') # '/api/sensor' matches pi config
         app.register_blueprint(report_bp, url_prefix='/api/report')
         app.register_blueprint(data_bp, url_prefix='/api/data')
+
+        # Preload and warm up models so the first request after a deploy doesn't pay for it
+        if os.getenv('PRELOAD_MODELS', '1') != '0':
+            from api.predict import load_models, zone_resolver
+            load_models()
+            # The zone table pages through the database; requests use the offline mapping until it lands
+            zone_resolver.preload_async()
+
+        from api.sensor_data import ingest_buffer, WRITE_BEHIND
+        if WRITE_BEHIND:
+            from services.ingest_buffer import JournalLockedError
+            try:
+                ingest_buffer.start()
+            except JournalLockedError as e:
+                logger.warning('Write-behind ingest disabled for this worker: %s', e)
     except ImportError as e:
-        print(f"Warning: Could not import some API blueprints: {e}")
-        print("Note: This is expected during initial generation phase.")
+        logger.warning('Could not import some API blueprints: %s', e)
 
     @app.route('/')
     def health_check():
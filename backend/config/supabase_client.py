@@ -1,6 +1,9 @@
+import logging
 import os
 from dotenv import load_dotenv
 
+logger = logging.getLogger(__name__)
+
 # Optional import; keep import-time failures isolated
 try:
     from supabase import create_client, Client
@@ -17,7 +20,7 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
 class _DummyPostgrest:
     def get(self, path: str):
-        print(f"[supabase_client] Dummy postgrest.get called with: {path}")
+        logger.debug('Dummy postgrest.get called with: %s', path)
         return []
 
 
@@ -34,24 +37,24 @@ def get_supabase_client() -> Client:
     `client.postgrest.get(...)` can still run.
     """
     if not SUPABASE_URL or not SUPABASE_KEY:
-        print("Warning: SUPABASE_URL or SUPABASE_KEY not found in environment variables. Using dummy client for local development.")
+        logger.warning('SUPABASE_URL or SUPABASE_KEY not found in environment variables. Using dummy client for local development.')
         return _DummyClient()
 
     # Detect obvious placeholder values and treat them as missing
     lower_url = (SUPABASE_URL or "").lower()
     if "your-project-ref" in lower_url or "your-" in lower_url or "example" in lower_url:
-        print("Warning: SUPABASE_URL looks like a placeholder. Using dummy client for local development.")
+        logger.warning('SUPABASE_URL looks like a placeholder. Using dummy client for local development.')
         return _DummyClient()
 
     if create_client is None:
-        print("Warning: `supabase` package not available in this environment. Using dummy client.")
+        logger.warning('`supabase` package not available in this environment. Using dummy client.')
         return _DummyClient()
 
     try:
         client = create_client(SUPABASE_URL, SUPABASE_KEY)
         return client
     except Exception as e:
-        print(f"Failed to initialize Supabase client: {e}\nUsing dummy client instead.")
+        logger.error('Failed to initialize Supabase client: %s. Using dummy client instead.', e)
         return _DummyClient()
 
 
@@ -1,7 +1,15 @@
+import logging
 import pandas as pd
 import os
 import sys
 
+try:
+    from ml.dataset_cache import read_csv_cached
+except ImportError:  # ml/ itself is on sys.path (train.py, debug_model.py)
+    from dataset_cache import read_csv_cached
+
+logger = logging.getLogger(__name__)
+
 class DataHandler:
     def __init__(self):
         # Determine the root directory (assuming this script is in backend/ml/)
@@ -20,7 +28,8 @@ class DataHandler:
             raise FileNotFoundError(f"Dataset not found at {self.data_path}")
 
         try:
-            df = pd.read_csv(self.data_path)
+            # float32 / categorical columns, memory-mapped from the cache after the first parse
+            df = read_csv_cached(self.data_path)
             
             # 1. Drop rows where ALL columns are missing
             df.dropna(how='all', inplace=True)
@@ -42,5 +51,5 @@ class DataHandler:
             
             return df
         except Exception as e:
-            print(f"Error loading data: {e}")
+            logger.error('Error loading data: %s', e)
             return None
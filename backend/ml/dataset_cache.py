@@ -0,0 +1,277 @@
+"""
+Columnar, typed cache for the CSV datasets.
+
+``read_csv_cached(path)`` parses a CSV once and stores it as an uncompressed
+``.npz``: numeric columns in one column-major matrix per dtype, every text
+column as categorical codes with its categories in the JSON metadata.
+
+No value changes on the way. Integer columns stay int64. Float columns are
+stored as float32 only when every value has at most FLOAT32_MAX_DECIMALS
+decimals and is small enough for float32 to tell those decimals apart;
+otherwise they stay float64. ``to_float64`` then recovers the exact parsed
+float64 values from the float32 ones.
+Later loads memory-map the archive (``fast_inference.read_npz``), so nothing
+is re-parsed, pages are shared between processes, and only the columns a
+caller touches are read from disk.
+
+Entries are keyed by the SHA-256 of the CSV contents. A small index keyed
+by source path records each file's size, mtime, hash and current entry; it
+saves rehashing a file that has not changed, and when a file changes only
+that file's previous entry is deleted.
+
+Environment:
+  DATASET_CACHE=0     bypass the cache (plain, untyped pandas.read_csv)
+  DATASET_CACHE_DIR   where entries are written (default: .cache next to the CSV)
+"""
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    from ml.fast_inference import read_npz
+except ImportError:  # ml/ itself is on sys.path (train.py, debug_model.py)
+    from fast_inference import read_npz
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv('DATASET_CACHE', '1') != '0'
+CACHE_FORMAT_VERSION = 2
+FLOAT32_MAX_DECIMALS = 6
+NUMERIC_DTYPES = ('float32', 'float64', 'int64')
+INDEX_FILE = 'index.json'
+_HASH_CHUNK = 1 << 20
+
+
+def file_hash(path):
+    """SHA-256 of a file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_dir_for(csv_path, cache_dir=None):
+    return cache_dir or os.getenv('DATASET_CACHE_DIR') or os.path.join(
+        os.path.dirname(os.path.abspath(csv_path)), '.cache')
+
+
+def _read_index(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, INDEX_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_index(cache_dir, index):
+    index_path = os.path.join(cache_dir, INDEX_FILE)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f, indent=1)
+        os.replace(tmp_path, index_path)
+    except OSError as e:
+        logger.warning('Could not update dataset cache index %s: %s', index_path, e)
+
+
+def source_hash(csv_path, cache_dir=None):
+    """Content hash of ``csv_path``, reusing the indexed hash while size and mtime match."""
+    cache_dir = cache_dir_for(csv_path, cache_dir)
+    key = os.path.abspath(csv_path)
+    st = os.stat(csv_path)
+
+    index = _read_index(cache_dir)
+    entry = index.get(key) or {}
+    if entry.get('size') == st.st_size and entry.get('mtime_ns') == st.st_mtime_ns:
+        return entry['sha256']
+
+    digest = file_hash(csv_path)
+    # 'entry' still names the cache written for the previous contents
+    index[key] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha256': digest, 'entry': entry.get('entry')}
+    _write_index(cache_dir, index)
+    return digest
+
+
+def _replace_entry(csv_path, path, cache_dir=None):
+    """Record ``path`` as the entry of ``csv_path`` and delete the one it replaces."""
+    cache_dir = cache_dir_for(csv_path, cache_dir)
+    key = os.path.abspath(csv_path)
+    name = os.path.basename(path)
+
+    index = _read_index(cache_dir)
+    entry = index.setdefault(key, {})
+    previous = entry.get('entry')
+    if previous == name:
+        return
+    entry['entry'] = name
+    _write_index(cache_dir, index)
+
+    # Another CSV with the same name and contents may share the old entry
+    if previous and not any(e.get('entry') == previous for e in index.values()):
+        try:
+            os.remove(os.path.join(cache_dir, previous))
+        except OSError:
+            pass
+
+
+def cache_path_for(csv_path, digest, cache_dir=None):
+    stem = os.path.splitext(os.path.basename(csv_path))[0].replace(' ', '_')
+    return os.path.join(cache_dir_for(csv_path, cache_dir), f"{stem}-{digest[:16]}.npz")
+
+
+def float32_decimals(values):
+    """
+    Decimals needed to recover ``values`` exactly from float32, or None.
+
+    Each value must equal itself rounded to d <= FLOAT32_MAX_DECIMALS
+    decimals, and |value| * 10**d must stay below 2**23 so that float32's
+    rounding error is under half a unit of the last decimal.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    if not values.size:
+        return 0
+    largest = float(np.abs(values).max())
+    for decimals in range(FLOAT32_MAX_DECIMALS + 1):
+        if largest * 10 ** decimals >= 2 ** 23:
+            return None
+        if np.array_equal(np.round(values, decimals), values):
+            return decimals
+    return None
+
+
+def to_typed_frame(df):
+    """
+    Integers as int64, floats as float32 when that is lossless (else float64),
+    everything else as pandas categoricals.
+
+    The decimals of each float32 column are kept in
+    ``attrs['float32_decimals']`` for ``to_float64``.
+    """
+    typed = {}
+    decimals = {}
+    for column in df.columns:
+        values = df[column]
+        if pd.api.types.is_integer_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            typed[column] = values.astype(np.int64)
+        elif pd.api.types.is_float_dtype(values):
+            d = float32_decimals(values)
+            if d is None:
+                typed[column] = values.astype(np.float64)
+            else:
+                typed[column] = values.astype(np.float32)
+                decimals[str(column)] = d
+        else:
+            typed[column] = values.astype('string').astype('category')
+    typed = pd.DataFrame(typed, index=df.index)
+    typed.attrs['float32_decimals'] = decimals
+    return typed
+
+
+def to_float64(df):
+    """
+    ``df`` with its float32 columns turned back into the exact float64 values
+    parsed from the CSV (using ``attrs['float32_decimals']``), e.g. to feed
+    models trained on plain ``pandas.read_csv`` output.
+    """
+    decimals = df.attrs.get('float32_decimals', {})
+    restored = {}
+    for column in df.columns:
+        if df[column].dtype == np.float32:
+            values = df[column].to_numpy(dtype=np.float64)
+            d = decimals.get(str(column))
+            restored[column] = np.round(values, d) if d is not None else values
+    if not restored:
+        return df
+    df = df.copy(deep=False)
+    for column, values in restored.items():
+        df[column] = values
+    return df
+
+
+def write_cache(df, path, digest=None):
+    """Store a typed frame (see ``to_typed_frame``) as a columnar .npz, atomically."""
+    numeric = {dtype: [c for c in df.columns if df[c].dtype == np.dtype(dtype)] for dtype in NUMERIC_DTYPES}
+    categorical = [c for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)]
+    unsupported = set(df.columns) - set(categorical) - {c for cols in numeric.values() for c in cols}
+    if unsupported:
+        raise TypeError(f"Columns need to_typed_frame first: {sorted(map(str, unsupported))}")
+    meta = {
+        'format_version': CACHE_FORMAT_VERSION,
+        'source_sha256': digest,
+        'columns': [str(c) for c in df.columns],
+        'numeric': {dtype: [str(c) for c in cols] for dtype, cols in numeric.items() if cols},
+        'float32_decimals': df.attrs.get('float32_decimals', {}),
+        'categories': {str(c): [str(v) for v in df[c].cat.categories] for c in categorical},
+        'rows': len(df),
+    }
+    arrays = {'__meta__': np.array(json.dumps(meta))}
+    # Column-major, so each column is one contiguous slice of the file
+    for dtype, cols in numeric.items():
+        if cols:
+            arrays[f'numeric_{dtype}'] = np.asfortranarray(df[cols].to_numpy(dtype=dtype))
+    for i, column in enumerate(categorical):
+        arrays[f'codes_{i}'] = np.ascontiguousarray(df[column].cat.codes.to_numpy())
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_cache(path, mmap=True):
+    """Rebuild the DataFrame from a cache entry; numeric data stays memory-mapped."""
+    arrays = read_npz(path, mmap)
+    meta = json.loads(str(arrays.pop('__meta__')[()]))
+    if meta.get('format_version') != CACHE_FORMAT_VERSION:
+        raise ValueError(f"Unsupported dataset cache format: {meta.get('format_version')}")
+
+    blocks = [pd.DataFrame(arrays[f'numeric_{dtype}'], columns=cols, copy=False)
+              for dtype, cols in meta['numeric'].items()]
+    df = pd.concat(blocks, axis=1) if blocks else pd.DataFrame(index=pd.RangeIndex(meta['rows']))
+    for i, (column, categories) in enumerate(meta['categories'].items()):
+        df[column] = pd.Categorical.from_codes(arrays[f'codes_{i}'], categories)
+    df = df[meta['columns']]
+    df.attrs['float32_decimals'] = meta['float32_decimals']
+    return df
+
+
+def read_csv_cached(csv_path, cache_dir=None, mmap=True):
+    """
+    ``pandas.read_csv`` replacement backed by the columnar cache.
+
+    The first call for a given file content parses the CSV and writes the
+    cache entry (removing the entry of the file's previous version); later
+    calls memory-map it. Falls back to an in-memory typed frame when the
+    cache cannot be written.
+    """
+    if not ENABLED:
+        return pd.read_csv(csv_path)
+
+    digest = source_hash(csv_path, cache_dir)
+    path = cache_path_for(csv_path, digest, cache_dir)
+    if os.path.exists(path):
+        try:
+            df = load_cache(path, mmap)
+            _replace_entry(csv_path, path, cache_dir)
+            return df
+        except Exception as e:
+            logger.warning('Dataset cache %s unreadable, rebuilding: %s', path, e)
+
+    df = to_typed_frame(pd.read_csv(csv_path))
+    try:
+        write_cache(df, path, digest)
+    except OSError as e:
+        logger.warning('Could not write dataset cache %s: %s', path, e)
+        return df
+
+    _replace_entry(csv_path, path, cache_dir)
+    return load_cache(path, mmap)
@@ -0,0 +1,459 @@
+"""
+Compiled inference for the crop classifiers.
+
+sklearn's ``predict_proba`` validates its input on every call (and a
+separate ``StandardScaler.transform`` does the same), which dominates the
+cost of scoring a single 7-feature row. The compiled models here extract the
+fitted parameters once into plain NumPy arrays, fold the scaler in where the
+maths allows, and evaluate ``predict_proba`` with no per-call checks:
+
+- GaussianNB: the scaler is folded into the class means/variances and the
+  joint log-likelihood becomes one quadratic form per class.
+- SVC (probability=True): one-vs-one kernel decision values, libsvm's
+  Platt sigmoids and pairwise coupling, vectorised over rows.
+- RandomForest / ExtraTrees / DecisionTree: every tree is flattened into
+  shared node arrays and all trees are walked together, level by level.
+
+Only NumPy is needed at prediction time. Use ``compile_validated`` to get a
+compiled model that has been checked against sklearn, or None.
+
+Compiled models can be exported with ``save_npz`` (an uncompressed NumPy
+archive of their arrays plus JSON metadata) and served by ``load_npz``,
+which memory-maps the arrays and never imports sklearn, so forked workers
+share the same read-only pages.
+"""
+import json
+import logging
+import os
+import struct
+import zipfile
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Set FAST_INFERENCE=0 to always use sklearn's predict_proba
+ENABLED = os.getenv('FAST_INFERENCE', '1') != '0'
+DEFAULT_ATOL = 1e-6
+EXPORT_FORMAT_VERSION = 1
+
+
+class CompiledModel:
+    """Base class: maps raw feature rows to class probabilities (columns follow ``classes_``)."""
+
+    kind = None
+    # Attributes written by save_npz: arrays, and JSON-serialisable parameters
+    ARRAYS = ()
+    PARAMS = ()
+
+    def __init__(self, classes, n_features, scaler=None):
+        self.classes_ = np.asarray(classes)
+        self.n_features_in_ = n_features
+        self.labels = None   # optional display names for classes_ (e.g. from a LabelEncoder)
+        # StandardScaler parameters; applied as (x - mean) / std, the same
+        # operations sklearn does, so split comparisons round identically
+        self._mean = None
+        self._std = None
+        if scaler is not None:
+            mean = getattr(scaler, 'mean_', None)
+            std = getattr(scaler, 'scale_', None)
+            self._mean = np.zeros(n_features) if mean is None else np.asarray(mean, dtype=np.float64)
+            self._std = np.ones(n_features) if std is None else np.asarray(std, dtype=np.float64)
+
+    def predict_proba(self, X):
+        raise NotImplementedError
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    def _as_array(self, X):
+        if hasattr(X, 'toarray'):
+            X = X.toarray()
+        X = np.asarray(X, dtype=np.float64)
+        return X.reshape(1, -1) if X.ndim == 1 else X
+
+    def _scaled(self, X):
+        X = self._as_array(X)
+        if self._mean is not None:
+            X = (X - self._mean) / self._std
+        return X
+
+
+class CompiledGaussianNB(CompiledModel):
+    kind = 'gaussian_nb'
+    ARRAYS = ('_a', '_b', '_c')
+
+    def __init__(self, model, scaler=None):
+        super().__init__(model.classes_, model.theta_.shape[1], scaler)
+        theta = np.asarray(model.theta_, dtype=np.float64)
+        var = np.asarray(model.var_, dtype=np.float64)
+        if self._mean is not None:
+            # N(x_scaled; theta, var) in terms of the raw x
+            theta = theta * self._std + self._mean
+            var = var * self._std ** 2
+            self._mean = self._std = None
+        # log P(c) + sum_f log N(x_f; theta, var) = x^2 . a + x . b + c
+        self._a = (-0.5 / var).T
+        self._b = (theta / var).T
+        self._c = (np.log(model.class_prior_)
+                   - 0.5 * np.sum(np.log(2.0 * np.pi * var), axis=1)
+                   - 0.5 * np.sum(theta ** 2 / var, axis=1))
+
+    def predict_proba(self, X):
+        X = self._as_array(X)
+        jll = (X * X) @ self._a + X @ self._b + self._c
+        jll -= jll.max(axis=1, keepdims=True)
+        np.exp(jll, out=jll)
+        jll /= jll.sum(axis=1, keepdims=True)
+        return jll
+
+
+class CompiledSVC(CompiledModel):
+    kind = 'svc'
+    ARRAYS = ('_sv', '_sv_sq', '_coef', '_intercept', '_prob_a', '_prob_b', '_pairs')
+    PARAMS = ('kernel', 'gamma', 'coef0', 'degree')
+
+    MIN_PROB = 1e-7
+
+    def __init__(self, model, scaler=None):
+        if not getattr(model, 'probability', False) or len(getattr(model, 'probA_', ())) == 0:
+            raise ValueError('SVC was trained without probability=True')
+        if model.kernel not in ('linear', 'rbf', 'poly', 'sigmoid'):
+            raise ValueError(f'Unsupported SVC kernel: {model.kernel}')
+        if hasattr(model.support_vectors_, 'toarray'):
+            raise ValueError('Sparse SVC models are not supported')
+        super().__init__(model.classes_, model.support_vectors_.shape[1], scaler)
+
+        self.kernel = model.kernel
+        self.gamma = float(model._gamma)
+        self.coef0 = float(model.coef0)
+        self.degree = int(model.degree)
+        self._sv = np.asarray(model.support_vectors_, dtype=np.float64)
+        self._sv_sq = np.einsum('ij,ij->i', self._sv, self._sv)
+
+        # One row of dual coefficients per class pair, spread over all support
+        # vectors (zeros for vectors of the other classes), so every pairwise
+        # decision value comes out of one matrix product
+        n_class = len(self.classes_)
+        dual = np.asarray(model._dual_coef_, dtype=np.float64)
+        starts = np.concatenate([[0], np.cumsum(model._n_support)])
+        pairs = [(i, j) for i in range(n_class) for j in range(i + 1, n_class)]
+        coef = np.zeros((len(pairs), self._sv.shape[0]))
+        for p, (i, j) in enumerate(pairs):
+            si, ei = starts[i], starts[i + 1]
+            sj, ej = starts[j], starts[j + 1]
+            coef[p, si:ei] = dual[j - 1, si:ei]
+            coef[p, sj:ej] = dual[i, sj:ej]
+        self._coef = coef.T
+        self._intercept = np.asarray(model._intercept_, dtype=np.float64)
+        self._prob_a = np.asarray(model._probA, dtype=np.float64)
+        self._prob_b = np.asarray(model._probB, dtype=np.float64)
+        self._pairs = np.array(pairs, dtype=np.intp).reshape(-1, 2)
+
+    def _kernel(self, X):
+        if self.kernel == 'linear':
+            return X @ self._sv.T
+        if self.kernel == 'rbf':
+            sq = np.einsum('ij,ij->i', X, X)[:, None] - 2.0 * (X @ self._sv.T) + self._sv_sq
+            return np.exp(-self.gamma * np.maximum(sq, 0.0))
+        dot = self.gamma * (X @ self._sv.T) + self.coef0
+        if self.kernel == 'poly':
+            return dot ** self.degree
+        return np.tanh(dot)
+
+    def decision_values(self, X):
+        """One-vs-one decision values, shape (n_rows, n_pairs), in libsvm pair order."""
+        return self._kernel(self._scaled(X)) @ self._coef + self._intercept
+
+    def predict_proba(self, X):
+        dec = self.decision_values(X)
+        # libsvm sigmoid_predict, written to avoid overflow
+        f = dec * self._prob_a + self._prob_b
+        pos = np.exp(-np.abs(f))
+        r = np.where(f >= 0, pos / (1.0 + pos), 1.0 / (1.0 + pos))
+        r = np.clip(r, self.MIN_PROB, 1.0 - self.MIN_PROB)
+
+        # R[n, i, j] = P(class i | i or j); coupled even for two classes, as sklearn's libsvm does
+        n_class = len(self.classes_)
+        R = np.zeros((dec.shape[0], n_class, n_class))
+        i, j = self._pairs[:, 0], self._pairs[:, 1]
+        R[:, i, j] = r
+        R[:, j, i] = 1.0 - r
+        return self._couple(R)
+
+    @staticmethod
+    def _couple(R):
+        """libsvm multiclass_probability (Wu, Lin & Weng method 2), vectorised over rows."""
+        n, k, _ = R.shape
+        Rt = np.swapaxes(R, 1, 2)                # Rt[n, t, j] = r[j][t]
+        Q = -Rt * R                               # Q[t][j] = -r[j][t] * r[t][j]
+        diag = np.einsum('ntj,ntj->nt', Rt, Rt) - np.einsum('ntt->nt', Rt) ** 2
+        idx = np.arange(k)
+        Q[:, idx, idx] = diag
+
+        p = np.full((n, k), 1.0 / k)
+        eps = 0.005 / k
+        active = np.ones(n, dtype=bool)
+        for _ in range(max(100, k)):
+            Qp = np.einsum('ntj,nj->nt', Q, p)
+            pQp = np.einsum('nt,nt->n', p, Qp)
+            active &= np.abs(Qp - pQp[:, None]).max(axis=1) >= eps
+            if not active.any():
+                break
+            rows = np.nonzero(active)[0]
+            Qa, pa, Qpa, pQpa = Q[rows], p[rows], Qp[rows], pQp[rows]
+            for t in range(k):
+                Qtt = Qa[:, t, t]
+                diff = (-Qpa[:, t] + pQpa) / Qtt
+                pa[:, t] += diff
+                scale = 1.0 + diff
+                pQpa = (pQpa + diff * (diff * Qtt + 2.0 * Qpa[:, t])) / scale / scale
+                Qpa = (Qpa + diff[:, None] * Qa[:, t, :]) / scale[:, None]
+                pa /= scale[:, None]
+            p[rows] = pa
+        return p
+
+
+class CompiledForest(CompiledModel):
+    kind = 'forest'
+    ARRAYS = ('_feature', '_threshold', '_left', '_right', '_value', '_roots')
+    PARAMS = ('max_depth',)
+
+    def __init__(self, model, scaler=None):
+        trees = getattr(model, 'estimators_', None)
+        if trees is None:
+            trees = [model]
+        super().__init__(model.classes_, model.n_features_in_, scaler)
+
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        self.max_depth = 0
+        for est in trees:
+            tree = est.tree_
+            if tree.n_outputs != 1:
+                raise ValueError('Multi-output trees are not supported')
+            leaf = tree.children_left == -1
+            # Leaves point at themselves so finished rows stay put while others descend
+            left = np.where(leaf, np.arange(tree.node_count), tree.children_left) + offset
+            right = np.where(leaf, np.arange(tree.node_count), tree.children_right) + offset
+            value = tree.value[:, 0, :].astype(np.float64)
+            value /= np.maximum(value.sum(axis=1, keepdims=True), 1e-300)
+
+            features.append(np.where(leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            lefts.append(left)
+            rights.append(right)
+            values.append(self._align_classes(est, value, model.classes_))
+            roots.append(offset)
+            offset += tree.node_count
+            self.max_depth = max(self.max_depth, tree.max_depth)
+
+        self._feature = np.concatenate(features).astype(np.intp)
+        self._threshold = np.concatenate(thresholds).astype(np.float64)
+        self._left = np.concatenate(lefts).astype(np.intp)
+        self._right = np.concatenate(rights).astype(np.intp)
+        self._value = np.concatenate(values)
+        self._roots = np.array(roots, dtype=np.intp)
+
+    @staticmethod
+    def _align_classes(est, value, classes):
+        # Forest members are fitted on encoded labels; a standalone tree keeps its own classes_
+        est_classes = getattr(est, 'classes_', None)
+        if est_classes is None or len(est_classes) == len(classes):
+            return value
+        aligned = np.zeros((value.shape[0], len(classes)))
+        aligned[:, np.asarray(est_classes, dtype=np.intp)] = value
+        return aligned
+
+    def apply(self, X):
+        """Leaf node (global index) reached in every tree, shape (n_rows, n_trees)."""
+        # sklearn compares float32 features against the split thresholds
+        X = self._scaled(X).astype(np.float32).astype(np.float64)
+        rows = np.arange(X.shape[0])[:, None]
+        nodes = np.broadcast_to(self._roots, (X.shape[0], len(self._roots))).copy()
+        for _ in range(self.max_depth):
+            go_left = X[rows, self._feature[nodes]] <= self._threshold[nodes]
+            nodes = np.where(go_left, self._left[nodes], self._right[nodes])
+        return nodes
+
+    def predict_proba(self, X):
+        return self._value[self.apply(X)].mean(axis=1)
+
+
+COMPILED_KINDS = {cls.kind: cls for cls in (CompiledGaussianNB, CompiledSVC, CompiledForest)}
+
+
+def compile_model(model, scaler=None):
+    """
+    Compile a fitted sklearn classifier (optionally preceded by a StandardScaler).
+
+    :raises ValueError: If the model type is not supported.
+    """
+    name = type(model).__name__
+    if name == 'GaussianNB':
+        return CompiledGaussianNB(model, scaler)
+    if name == 'SVC':
+        return CompiledSVC(model, scaler)
+    if name in ('RandomForestClassifier', 'ExtraTreesClassifier', 'DecisionTreeClassifier',
+                'ExtraTreeClassifier'):
+        return CompiledForest(model, scaler)
+    raise ValueError(f'No compiled backend for {name}')
+
+
+def max_probability_error(compiled, model, X, scaler=None):
+    """Largest absolute difference between compiled and sklearn probabilities on ``X``."""
+    X_model = scaler.transform(X) if scaler is not None else X
+    expected = model.predict_proba(X_model)
+    return float(np.max(np.abs(compiled.predict_proba(X) - expected)))
+
+
+def sample_inputs(model, scaler=None, n=256, seed=0):
+    """
+    Synthetic validation rows in the raw feature space.
+
+    Uses the scaler's mean/std when there is one; for tree models also picks
+    values right at the split thresholds, so both branches get exercised.
+    """
+    rng = np.random.default_rng(seed)
+    n_features = model.n_features_in_
+    if scaler is not None and getattr(scaler, 'mean_', None) is not None:
+        X = rng.normal(scaler.mean_, scaler.scale_ * 1.5, size=(n, n_features))
+    else:
+        X = rng.normal(0.0, 1.5, size=(n, n_features))
+
+    trees = getattr(model, 'estimators_', None) or ([model] if hasattr(model, 'tree_') else [])
+    if trees:
+        thresholds = [[] for _ in range(n_features)]
+        for est in trees:
+            t = est.tree_
+            for f, thr in zip(t.feature, t.threshold):
+                if f >= 0:
+                    thresholds[f].append(thr)
+        for f, values in enumerate(thresholds):
+            if values:
+                picks = rng.choice(values, size=n)
+                X[:, f] = picks + rng.choice([-1e-3, 0.0, 1e-3], size=n)
+        if scaler is not None and getattr(scaler, 'mean_', None) is not None:
+            X = X * scaler.scale_ + scaler.mean_
+    return X
+
+
+def compile_validated(model, scaler=None, X=None, atol=DEFAULT_ATOL):
+    """
+    Compile ``model`` and check it against sklearn on ``X`` (synthetic rows if None).
+
+    :return: The compiled model, or None when the model is unsupported or
+             its probabilities differ from sklearn's by more than ``atol``.
+    """
+    if model is None or not hasattr(model, 'predict_proba'):
+        return None
+    try:
+        compiled = compile_model(model, scaler)
+        if X is None:
+            X = sample_inputs(model, scaler)
+        error = max_probability_error(compiled, model, X, scaler)
+    except Exception as e:
+        logger.warning('Compiled inference unavailable for %s: %s', type(model).__name__, e)
+        return None
+
+    if error > atol:
+        logger.warning('Compiled %s disagrees with sklearn (max error %.2e); not used', type(model).__name__, error)
+        return None
+    return compiled
+
+
+def save_npz(compiled, path, labels=None):
+    """
+    Export a compiled model to an uncompressed ``.npz`` (written atomically).
+
+    :param labels: Optional class display names stored with the model.
+    """
+    labels = labels if labels is not None else compiled.labels
+    meta = {
+        'format_version': EXPORT_FORMAT_VERSION,
+        'kind': compiled.kind,
+        'classes': np.asarray(compiled.classes_).tolist(),
+        'labels': [str(label) for label in labels] if labels is not None else None,
+        'n_features_in': int(compiled.n_features_in_),
+        'params': {name: getattr(compiled, name) for name in compiled.PARAMS},
+    }
+    arrays = {name: getattr(compiled, name) for name in compiled.ARRAYS}
+    for name in ('_mean', '_std'):
+        if getattr(compiled, name) is not None:
+            arrays[name] = getattr(compiled, name)
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, __meta__=np.array(json.dumps(meta)), **arrays)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_npz(path, mmap=True):
+    """
+    Load a model exported by ``save_npz`` without importing sklearn.
+
+    With ``mmap=True`` the arrays are memory-mapped read-only straight from
+    the archive instead of being copied into each process.
+    """
+    arrays = read_npz(path, mmap)
+    meta = json.loads(str(arrays.pop('__meta__')[()]))
+    if meta.get('format_version') != EXPORT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported export format: {meta.get('format_version')}")
+    cls = COMPILED_KINDS.get(meta.get('kind'))
+    if cls is None:
+        raise ValueError(f"Unknown compiled model kind: {meta.get('kind')}")
+
+    compiled = cls.__new__(cls)
+    compiled.classes_ = np.asarray(meta['classes'])
+    compiled.n_features_in_ = meta['n_features_in']
+    compiled.labels = meta.get('labels')
+    compiled._mean = arrays.pop('_mean', None)
+    compiled._std = arrays.pop('_std', None)
+    for name, value in meta.get('params', {}).items():
+        setattr(compiled, name, value)
+    for name in cls.ARRAYS:
+        setattr(compiled, name, arrays[name])
+    return compiled
+
+
+def read_npz(path, mmap=True):
+    """Every array of an .npz, memory-mapped when possible (read into memory otherwise)."""
+    if mmap:
+        try:
+            return _mmap_npz(path)
+        except (ValueError, OSError, zipfile.BadZipFile) as e:
+            logger.warning('Memory-mapping %s failed, reading it instead: %s', path, e)
+    with np.load(path, allow_pickle=False) as data:
+        return {name: data[name] for name in data.files}
+
+
+def _mmap_npz(path):
+    """Memory-map every (stored, uncompressed) member of an .npz archive."""
+    arrays = {}
+    with zipfile.ZipFile(path) as zf, open(path, 'rb') as f:
+        for info in zf.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{info.filename} is compressed")
+            # Local file header: 30 fixed bytes, then file name and extra field
+            f.seek(info.header_offset)
+            header = f.read(30)
+            name_len, extra_len = struct.unpack('<HH', header[26:30])
+            f.seek(info.header_offset + 30 + name_len + extra_len)
+
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+            if dtype.hasobject:
+                raise ValueError(f"{info.filename} holds Python objects")
+
+            name = info.filename[:-4] if info.filename.endswith('.npy') else info.filename
+            if int(np.prod(shape)) == 0:
+                arrays[name] = np.empty(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=f.tell(),
+                                         shape=shape, order='F' if fortran else 'C')
+    return arrays
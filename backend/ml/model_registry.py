@@ -0,0 +1,289 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+import joblib
+
+from ml import fast_inference
+from ml.yield_scorer import YieldScorer
+
+logger = logging.getLogger(__name__)
+
+# Artifact name -> file name inside the model directory
+ARTIFACTS = {
+    'preproc_clf': 'preprocessor_clf.joblib',
+    'preproc_reg': 'preprocessor_reg.joblib',
+    'rf_model': 'rf_crop_model.joblib',
+    'reg_model': 'xgb_yield_model.joblib',
+}
+# Flat-array exports (ml.fast_inference.save_npz) loaded instead of the pickle when present
+EXPORTS = {
+    'rf_model': 'rf_crop_model.npz',
+}
+MANIFEST_FILE = 'manifest.json'
+
+
+class ModelLoadError(Exception):
+    """Raised when a model set cannot be loaded consistently."""
+
+
+def file_checksum(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def write_manifest(model_dir, version=None):
+    """
+    Record checksums of the artifacts currently in ``model_dir``.
+
+    Training writes this last, so the registry can tell a finished set of
+    models from one that is still being written.
+    """
+    def checksums_of(files):
+        sums = {}
+        for name, filename in files.items():
+            path = os.path.join(model_dir, filename)
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    sums[name] = file_checksum(f.read())
+        return sums
+
+    manifest = {
+        'version': version or datetime.now().strftime('%Y%m%d%H%M%S'),
+        'created_at': datetime.now().isoformat(),
+        'checksums': checksums_of(ARTIFACTS),
+        'exports': checksums_of(EXPORTS),
+    }
+    tmp_path = os.path.join(model_dir, MANIFEST_FILE + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(model_dir, MANIFEST_FILE))
+    return manifest
+
+
+class ModelSet:
+    """
+    An immutable snapshot of the models served together.
+
+    Request handlers take one snapshot per request, so a concurrent hot-swap
+    never mixes artifacts from two different training runs.
+    """
+
+    def __init__(self, artifacts, checksums, version, model_dir, load_seconds):
+        self.preproc_clf = artifacts.get('preproc_clf')
+        self.preproc_reg = artifacts.get('preproc_reg')
+        self.rf_model = artifacts.get('rf_model')
+        self.reg_model = artifacts.get('reg_model')
+        self.checksums = checksums
+        self.version = version
+        self.model_dir = model_dir
+        self.load_seconds = load_seconds
+        self.loaded_at = datetime.now().isoformat()
+
+        # sklearn-free predict_proba for the classifier, used only if it matches sklearn
+        # (an exported classifier was validated when it was written)
+        self.fast_clf = None
+        if isinstance(self.rf_model, fast_inference.CompiledModel):
+            self.fast_clf = self.rf_model
+        elif fast_inference.ENABLED and self.rf_model is not None:
+            self.fast_clf = fast_inference.compile_validated(self.rf_model)
+
+        self.yield_scorer = None
+        if self.preproc_reg is not None and self.reg_model is not None:
+            self.yield_scorer = YieldScorer(
+                self.preproc_reg, self.reg_model,
+                crops=getattr(self.rf_model, 'classes_', ()),
+            )
+
+    def _is_export(self, name):
+        return isinstance(getattr(self, name), fast_inference.CompiledModel)
+
+    @property
+    def complete(self):
+        return None not in (self.preproc_clf, self.preproc_reg, self.rf_model, self.reg_model)
+
+    def describe(self):
+        return {
+            'version': self.version,
+            'model_dir': self.model_dir,
+            'loaded_at': self.loaded_at,
+            'load_seconds': round(self.load_seconds, 4),
+            'complete': self.complete,
+            'fast_inference': self.fast_clf.kind if self.fast_clf is not None else None,
+            'artifacts': {
+                name: {
+                    'file': EXPORTS[name] if self._is_export(name) else filename,
+                    'loaded': getattr(self, name) is not None,
+                    'sha256': self.checksums.get(name),
+                }
+                for name, filename in ARTIFACTS.items()
+            },
+        }
+
+
+class ModelRegistry:
+    """
+    Holds the currently served ModelSet and swaps it atomically.
+
+    A new set is fully loaded (and warmed up, if a warm-up hook is given)
+    before it replaces the current one; if loading fails the current set
+    keeps serving. An incomplete set (e.g. the regressor file was missing)
+    is retried on access at most every ``retry_interval`` seconds.
+    """
+
+    def __init__(self, model_dir, retry_interval=30.0, warm_up=None):
+        """
+        :param model_dir: Directory holding the artifacts listed in ARTIFACTS.
+        :param retry_interval: Seconds between reload attempts of an incomplete set.
+        :param warm_up: Optional callable run on a freshly loaded ModelSet before it is served.
+        """
+        self.model_dir = model_dir
+        self.retry_interval = retry_interval
+        self.warm_up = warm_up
+        self._current = None
+        self._last_attempt = None
+        self._last_error = None
+        self._lock = threading.Lock()
+
+    def current(self):
+        """Return the served ModelSet, loading or retrying an incomplete one if due."""
+        models = self._current
+        if models is not None and models.complete:
+            return models
+        if not self._retry_due():
+            return models
+        with self._lock:
+            # Another thread may have retried while this one waited for the lock
+            if self._current is not models or not self._retry_due():
+                return self._current
+            try:
+                return self._load(None)
+            except ModelLoadError:
+                return self._current
+
+    def load(self, model_dir=None):
+        """
+        Load a full ModelSet from disk and make it the served one.
+
+        :param model_dir: Optional directory to load from (defaults to the registry's).
+        :return: The new ModelSet.
+        :raises ModelLoadError: If an artifact is unreadable or does not match the manifest.
+        """
+        with self._lock:
+            return self._load(model_dir)
+
+    def _retry_due(self):
+        return self._last_attempt is None or time.monotonic() - self._last_attempt >= self.retry_interval
+
+    def _load(self, model_dir):
+        """Body of ``load``; the caller holds the lock."""
+        self._last_attempt = time.monotonic()
+        try:
+            models = self._load_set(model_dir or self.model_dir)
+            if self.warm_up is not None:
+                self.warm_up(models)
+        except ModelLoadError as e:
+            self._last_error = str(e)
+            logger.error('Model load failed, keeping current models: %s', e)
+            raise
+
+        self._current = models
+        self._last_error = None
+        if model_dir:
+            self.model_dir = model_dir
+        logger.info('Loaded model set %s in %.2fs', models.version, models.load_seconds,
+                    extra={'load_seconds': round(models.load_seconds, 4)})
+        return models
+
+    def peek(self):
+        """Return the served ModelSet (or None) without loading or retrying."""
+        return self._current
+
+    def describe(self):
+        models = self._current
+        info = models.describe() if models is not None else {'version': None, 'complete': False}
+        info['last_error'] = self._last_error
+        return info
+
+    def _load_set(self, model_dir):
+        start = time.perf_counter()
+        manifest = self._read_manifest(model_dir)
+        expected = manifest.get('checksums', {}) if manifest else {}
+
+        artifacts, checksums = {}, {}
+        for name, filename in ARTIFACTS.items():
+            export = self._load_export(model_dir, name, manifest)
+            if export is not None:
+                artifacts[name], checksums[name] = export
+                continue
+
+            path = os.path.join(model_dir, filename)
+            if not os.path.exists(path):
+                if name in expected:
+                    raise ModelLoadError(f"{filename} is listed in the manifest but missing")
+                logger.warning('Model artifact not found: %s', path)
+                continue
+
+            with open(path, 'rb') as f:
+                data = f.read()
+            checksum = file_checksum(data)
+            if name in expected and expected[name] != checksum:
+                raise ModelLoadError(f"{filename} does not match the manifest (still being written?)")
+
+            try:
+                artifacts[name] = joblib.load(io.BytesIO(data))
+            except Exception as e:
+                raise ModelLoadError(f"Could not load {filename}: {e}")
+            checksums[name] = checksum
+
+        if manifest and manifest.get('version'):
+            version = str(manifest['version'])
+        elif checksums:
+            digest = hashlib.sha256(''.join(checksums[k] for k in sorted(checksums)).encode())
+            version = digest.hexdigest()[:12]
+        else:
+            version = None
+
+        return ModelSet(artifacts, checksums, version, model_dir, time.perf_counter() - start)
+
+    def _load_export(self, model_dir, name, manifest):
+        """
+        Memory-map the flat-array export of an artifact, if there is a usable one.
+
+        With a manifest, only an export it lists (and whose checksum matches)
+        is used, so an export left over from an older training run is ignored.
+        Returns ``(model, checksum)`` or None to fall back to the pickle.
+        """
+        filename = EXPORTS.get(name)
+        if not filename or not fast_inference.ENABLED:
+            return None
+        path = os.path.join(model_dir, filename)
+        if not os.path.exists(path):
+            return None
+        expected = (manifest or {}).get('exports', {})
+        if manifest and name not in expected:
+            return None
+
+        with open(path, 'rb') as f:
+            checksum = file_checksum(f.read())
+        if name in expected and expected[name] != checksum:
+            raise ModelLoadError(f"{filename} does not match the manifest (still being written?)")
+        try:
+            return fast_inference.load_npz(path), checksum
+        except Exception as e:
+            logger.warning('Could not load %s, using %s: %s', filename, ARTIFACTS[name], e)
+            return None
+
+    def _read_manifest(self, model_dir):
+        path = os.path.join(model_dir, MANIFEST_FILE)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except Exception as e:
+            raise ModelLoadError(f"Unreadable manifest {path}: {e}")
@@ -1,8 +1,13 @@
+import logging
 import os
 import pickle
 import numpy as np
 import random
 
+from . import fast_inference
+
+logger = logging.getLogger(__name__)
+
 class CropPredictor:
     def __init__(self):
         """
@@ -11,6 +16,14 @@ class CropPredictor:
         # Resolve path relative to this file
         current_dir = os.path.dirname(os.path.abspath(__file__))
         self.model_dir = os.path.join(os.path.dirname(current_dir), 'models')
+
+        # Compiled model with the scaler folded in (None -> sklearn path).
+        # The exported .npz (written by train.py) is served without importing
+        # sklearn or unpickling anything.
+        self.fast_model = self._load_export('crop_recommendation_model.npz')
+        if self.fast_model is not None:
+            self.agri_model = self.label_encoder = self.preprocessor = None
+            return
         
         self.agri_model = self._load_model('crop_recommendation_model.pkl')
         self.label_encoder = self._load_model('label_encoder.pkl')
@@ -19,7 +32,26 @@ class CropPredictor:
         # Actually, best to instantiate DataPreprocessor here to handle scaling consistency
         from .preprocess import DataPreprocessor
         self.preprocessor = DataPreprocessor()
+
+        if fast_inference.ENABLED and self.agri_model is not None and self.label_encoder is not None:
+            self.fast_model = fast_inference.compile_validated(self.agri_model, self.preprocessor.scaler)
+            if self.fast_model is not None:
+                self.fast_model.labels = list(self.label_encoder.classes_)
         
+    def _load_export(self, filename):
+        path = os.path.join(self.model_dir, filename)
+        if not fast_inference.ENABLED or not os.path.exists(path):
+            return None
+        try:
+            model = fast_inference.load_npz(path)
+        except Exception as e:
+            logger.error('Error loading exported model %s: %s', filename, e)
+            return None
+        if model.labels is None:
+            logger.warning('Exported model %s has no class labels; ignoring it', filename)
+            return None
+        return model
+
     def _load_model(self, filename):
         path = os.path.join(self.model_dir, filename)
         if os.path.exists(path):
@@ -27,7 +59,7 @@ class CropPredictor:
                 with open(path, 'rb') as f:
                     return pickle.load(f)
             except Exception as e:
-                print(f"Error loading model {filename}: {e}")
+                logger.error('Error loading model %s: %s', filename, e)
                 return None
         return None
 
@@ -38,7 +70,7 @@ class CropPredictor:
         :param top_n: Number of recommendations to return
         :return: List of dicts [{'crop': str, 'confidence': float}]
         """
-        if self.agri_model and self.label_encoder:
+        if self.fast_model is not None or (self.agri_model and self.label_encoder):
             try:
                 # 1. Preprocess (Scale)
                 # Ensure feature format is compatible with preprocessor
@@ -48,33 +80,38 @@ class CropPredictor:
                 
                 # We need to reshape for transformation
                 features_array = np.array(features).reshape(1, -1)
-                print(f"DEBUG_PREDICTOR: Raw Features: {features_array}")
+                logger.debug('Raw features: %s', features_array)
                 
                 # SAFETY CHECK: If inputs are all zeros (Sensor Failure), do not predict.
                 # Checking sum of absolute values or specific key nutrients
                 if np.sum(features_array) == 0:
-                    print("Warning: All sensor inputs are zero. Skipping prediction.")
+                    logger.warning('All sensor inputs are zero. Skipping prediction.')
                     return []
                 
-                # Apply scaling using the loaded scaler inside preprocessor
-                if self.preprocessor.scaler:
-                    features_scaled = self.preprocessor.scaler.transform(features_array)
-                    print(f"DEBUG_PREDICTOR: Scaled Features: {features_scaled}")
+                if self.fast_model is not None:
+                    # Scaling is folded into the compiled model
+                    probs = self.fast_model.predict_proba(features_array.astype(float))[0]
                 else:
-                    features_scaled = features_array
-                    print("DEBUG_PREDICTOR: No Scaler Found!")
+                    # Apply scaling using the loaded scaler inside preprocessor
+                    if self.preprocessor.scaler:
+                        features_scaled = self.preprocessor.scaler.transform(features_array)
+                        logger.debug('Scaled features: %s', features_scaled)
+                    else:
+                        features_scaled = features_array
+                        logger.warning('No scaler found; using raw features')
 
-                # 2. Predict Probabilities
-                probs = self.agri_model.predict_proba(features_scaled)[0]
-                print(f"DEBUG_PREDICTOR: Probabilities: {probs}")
-                top_idx_debug = probs.argsort()[-1]
-                print(f"DEBUG_PREDICTOR: Top Class Index: {top_idx_debug}, Max Prob: {probs[top_idx_debug]}")
+                    # 2. Predict Probabilities
+                    probs = self.agri_model.predict_proba(features_scaled)[0]
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug('Probabilities: %s', probs)
+                    top_idx_debug = int(probs.argmax())
+                    logger.debug('Top class index %s, max prob %.4f', top_idx_debug, probs[top_idx_debug])
                 
                 # 3. Get Top N
                 top_indices = probs.argsort()[-top_n:][::-1]
                 
                 results = []
-                classes = self.label_encoder.classes_
+                classes = self.fast_model.labels if self.fast_model is not None else self.label_encoder.classes_
                 
                 for idx in top_indices:
                     crop_name = classes[idx]
@@ -89,7 +126,7 @@ class CropPredictor:
                 return results
 
             except Exception as e:
-                print(f"Prediction Error: {e}")
+                logger.exception('Prediction error: %s', e)
                 # Fallback only on error
                 return self._mock_predict(top_n, features)
             
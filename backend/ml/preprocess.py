@@ -1,7 +1,24 @@
+import logging
 import numpy as np
 import os
 import pickle
-from sklearn.preprocessing import StandardScaler
+from sklearn.compose import ColumnTransformer
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+try:
+    from ml.dataset_cache import read_csv_cached, to_float64
+except ImportError:  # ml/ itself is on sys.path (train.py, debug_model.py)
+    from dataset_cache import read_csv_cached, to_float64
+
+logger = logging.getLogger(__name__)
+
+# Input columns of the served models (see build_input_row in api/predict.py)
+NUMERIC_FEATURES = ['soil_n', 'soil_p', 'soil_k', 'soil_ph', 'avg_temperature', 'avg_rainfall', 'humidity']
+CATEGORICAL_FEATURES = ['state', 'district', 'agro_climatic_zone', 'season', 'crop_type']
+CLASSIFICATION_TARGETS = ['crop', 'label']
+REGRESSION_TARGETS = ['yield_ton_per_hectare', 'yield']
 
 class DataPreprocessor:
     def __init__(self):
@@ -19,7 +36,7 @@ class DataPreprocessor:
                 with open(self.scaler_path, 'rb') as f:
                     return pickle.load(f)
             except Exception as e:
-                print(f"Error loading scaler: {e}")
+                logger.error('Error loading scaler: %s', e)
         return None
 
     def fit_and_save(self, data):
@@ -37,7 +54,7 @@ class DataPreprocessor:
             pickle.dump(scaler, f)
             
         self.scaler = scaler
-        print(f"Scaler saved to {self.scaler_path}")
+        logger.info('Scaler saved to %s', self.scaler_path)
 
     def preprocess(self, data):
         """
@@ -67,5 +84,58 @@ class DataPreprocessor:
             return features_array
             
         except Exception as e:
-            print(f"Error in preprocessing: {e}")
+            logger.error('Error in preprocessing: %s', e)
             raise ValueError(f"Preprocessing Failed: {e}")
+
+
+def load_dataset(path):
+    """Master dataset as a DataFrame with the exact CSV values (via the dataset cache)."""
+    return to_float64(read_csv_cached(path))
+
+
+def identify_targets(df):
+    """
+    Column names of the crop (classification) and yield (regression) targets.
+
+    :return: ``(clf_target, reg_target)``, either None when absent.
+    """
+    clf_target = next((c for c in CLASSIFICATION_TARGETS if c in df.columns), None)
+    reg_target = next((c for c in REGRESSION_TARGETS if c in df.columns), None)
+    return clf_target, reg_target
+
+
+def build_preprocessor(numeric, categorical):
+    """Median-impute and scale numbers, mode-impute and one-hot encode categories."""
+    return ColumnTransformer([
+        ('num', Pipeline([('impute', SimpleImputer(strategy='median')), ('scale', StandardScaler())]), numeric),
+        ('cat', Pipeline([('impute', SimpleImputer(strategy='most_frequent')),
+                          ('onehot', OneHotEncoder(handle_unknown='ignore'))]), categorical),
+    ], sparse_threshold=0)
+
+
+def preprocess_features(df, target):
+    """
+    Fit the preprocessor the backend serves for ``target``.
+
+    Features are the served input columns present in ``df``; the yield model
+    also gets the crop, since it scores every candidate crop of a farm. Rows
+    without a target value are dropped.
+
+    :return: ``(X, y, preprocessor, feature_names)`` with X a dense array.
+    """
+    numeric = [c for c in NUMERIC_FEATURES if c in df.columns]
+    categorical = [c for c in CATEGORICAL_FEATURES if c in df.columns]
+    if target in REGRESSION_TARGETS:
+        categorical += [c for c in CLASSIFICATION_TARGETS if c in df.columns][:1]
+
+    df = df[df[target].notna()]
+    X = df[numeric + categorical].copy()
+    for column in categorical:
+        X[column] = X[column].astype(object)
+    y = df[target].to_numpy()
+    if target in CLASSIFICATION_TARGETS:
+        y = y.astype(str)
+
+    preprocessor = build_preprocessor(numeric, categorical)
+    Xt = preprocessor.fit_transform(X)
+    return Xt, y, preprocessor, list(preprocessor.get_feature_names_out())
@@ -1,9 +1,14 @@
 import pandas as pd
 import numpy as np
+import hashlib
+import json
 import pickle
 import os
 import sys
-from sklearn.model_selection import train_test_split
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import sklearn
+from sklearn.model_selection import KFold, StratifiedKFold
 from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
 from sklearn.naive_bayes import GaussianNB
 from sklearn.svm import SVC
@@ -14,6 +19,184 @@ from sklearn.preprocessing import LabelEncoder
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from data_handler import DataHandler
 from preprocess import DataPreprocessor
+from fast_inference import compile_validated, save_npz
+
+CV_FOLDS = 5
+RANDOM_STATE = 42
+
+# name -> (estimator class, constructor params); the params are part of the fold cache key
+CANDIDATES = {
+    'Random Forest': (RandomForestClassifier, {'n_estimators': 100, 'random_state': RANDOM_STATE}),
+    'Gradient Boosting': (GradientBoostingClassifier, {'random_state': RANDOM_STATE}),
+    'Naive Bayes': (GaussianNB, {}),
+    'SVM': (SVC, {'probability': True, 'random_state': RANDOM_STATE}),  # probability=True for predict_proba
+}
+
+
+def dataset_hash(X, y):
+    """Content hash of the training matrix and labels (shape and dtype included)."""
+    digest = hashlib.sha256()
+    for arr in (np.ascontiguousarray(X), np.ascontiguousarray(y)):
+        digest.update(f"{arr.shape}{arr.dtype}".encode())
+        digest.update(arr.tobytes())
+    return digest.hexdigest()
+
+
+def _cache_key(data_hash, estimator_cls, params, split):
+    payload = json.dumps({
+        'data': data_hash,
+        'estimator': f"{estimator_cls.__module__}.{estimator_cls.__qualname__}",
+        'params': params,
+        'split': split,
+        'sklearn': sklearn.__version__,
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+def _fit_fold(estimator_cls, params, X, y, train_idx, test_idx, cache_path):
+    """
+    Fit one (candidate, fold) pair, or return its cached result.
+
+    Runs in a worker process. With ``test_idx`` None the fit is a final
+    refit on ``train_idx`` and the fitted model is returned (and cached)
+    instead of a score.
+    """
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                return dict(pickle.load(f), cached=True)
+        except Exception:
+            pass  # unreadable entry: refit and overwrite it
+
+    start = time.perf_counter()
+    model = estimator_cls(**params).fit(X[train_idx], y[train_idx])
+    fit_seconds = time.perf_counter() - start
+    if test_idx is None:
+        result = {'model': model, 'fit_seconds': fit_seconds}
+    else:
+        result = {'score': accuracy_score(y[test_idx], model.predict(X[test_idx])), 'fit_seconds': fit_seconds}
+
+    if cache_path:
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(result, f)
+        os.replace(tmp_path, cache_path)
+    return dict(result, cached=False)
+
+
+def _make_folds(y, n_folds):
+    counts = np.unique(y, return_counts=True)[1]
+    if counts.min() >= n_folds:
+        splitter = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=RANDOM_STATE)
+    else:
+        splitter = KFold(n_splits=n_folds, shuffle=True, random_state=RANDOM_STATE)
+    return list(splitter.split(np.zeros(len(y)), y))
+
+
+def _executor(max_workers):
+    """Process pool for the fits; None when it cannot be used (serial fallback)."""
+    if max_workers == 1:
+        return None
+    try:
+        return ProcessPoolExecutor(max_workers=max_workers)
+    except (OSError, NotImplementedError, ValueError) as e:
+        print(f"Process pool unavailable ({e}); fitting serially")
+        return None
+
+
+def select_model(X, y, candidates=None, n_folds=CV_FOLDS, cache_dir=None, max_workers=None):
+    """
+    Score every candidate with k-fold CV, fitting all (candidate, fold) pairs in parallel.
+
+    Fold results are cached in ``cache_dir`` keyed by the dataset hash, the
+    estimator and its params, and the fold split, so a rerun on unchanged
+    data only fits what changed.
+
+    :param max_workers: Worker processes (default: TRAIN_WORKERS or all cores; 1 = serial).
+    :return: Dict of name -> {'scores', 'mean', 'std', 'fit_seconds', 'wall_seconds',
+             'cached_folds', 'error'}, in candidate order.
+    """
+    candidates = candidates or CANDIDATES
+    if max_workers is None:
+        max_workers = int(os.getenv('TRAIN_WORKERS', '0')) or os.cpu_count() or 1
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+
+    folds = _make_folds(y, n_folds)
+    data_hash = dataset_hash(X, y)
+    report = {name: {'scores': [None] * len(folds), 'fit_seconds': 0.0, 'wall_seconds': None,
+                     'cached_folds': 0, 'error': None} for name in candidates}
+    remaining = {name: len(folds) for name in candidates}
+
+    tasks = []
+    for name, (estimator_cls, params) in candidates.items():
+        for i, (train_idx, test_idx) in enumerate(folds):
+            key = _cache_key(data_hash, estimator_cls, params, f"cv{len(folds)}-{RANDOM_STATE}-{i}")
+            cache_path = os.path.join(cache_dir, f"{key}.pkl") if cache_dir else None
+            tasks.append(((name, i), (estimator_cls, params, X, y, train_idx, test_idx, cache_path)))
+
+    start = time.perf_counter()
+
+    def record(name, i, outcome):
+        entry = report[name]
+        if isinstance(outcome, Exception):
+            entry['error'] = entry['error'] or f"{type(outcome).__name__}: {outcome}"
+        else:
+            entry['scores'][i] = outcome['score']
+            entry['fit_seconds'] += outcome['fit_seconds']
+            entry['cached_folds'] += outcome['cached']
+        remaining[name] -= 1
+        if not remaining[name]:
+            entry['wall_seconds'] = time.perf_counter() - start
+
+    pool = _executor(max_workers)
+    if pool is None:
+        for (name, i), args in tasks:
+            try:
+                outcome = _fit_fold(*args)
+            except Exception as e:
+                outcome = e
+            record(name, i, outcome)
+    else:
+        with pool:
+            futures = {pool.submit(_fit_fold, *args): task_id for task_id, args in tasks}
+            for future in as_completed(futures):
+                name, i = futures[future]
+                try:
+                    outcome = future.result()
+                except Exception as e:
+                    outcome = e
+                record(name, i, outcome)
+
+    for entry in report.values():
+        scores = [s for s in entry['scores'] if s is not None]
+        complete = entry['error'] is None and len(scores) == len(folds)
+        entry['mean'] = float(np.mean(scores)) if complete else None
+        entry['std'] = float(np.std(scores)) if complete else None
+    return report
+
+
+def fit_final(name, X, y, candidates=None, cache_dir=None):
+    """Refit the selected candidate on all of X, y (cached like the CV folds)."""
+    estimator_cls, params = (candidates or CANDIDATES)[name]
+    cache_path = None
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        key = _cache_key(dataset_hash(X, y), estimator_cls, params, 'full')
+        cache_path = os.path.join(cache_dir, f"{key}.pkl")
+    return _fit_fold(estimator_cls, params, X, y, np.arange(len(y)), None, cache_path)
+
+
+def print_report(report):
+    print(f"{'Model':<20} {'CV accuracy':>16} {'fit (s)':>9} {'wall (s)':>9} {'cached':>7}")
+    for name, entry in report.items():
+        if entry['mean'] is None:
+            print(f"{name:<20} failed: {entry['error']}")
+            continue
+        accuracy = f"{entry['mean']:.4f} +/- {entry['std']:.4f}"
+        print(f"{name:<20} {accuracy:>16} {entry['fit_seconds']:>9.2f} {entry['wall_seconds']:>9.2f} "
+              f"{entry['cached_folds']:>3}/{len(entry['scores'])}")
+
 
 def train_models():
     print("Loading data...")
@@ -48,40 +231,29 @@ def train_models():
     with open(os.path.join(model_dir, 'label_encoder.pkl'), 'wb') as f:
         pickle.dump(le, f)
 
-    # Train Test Split
-    X_train, X_test, y_train, y_test = train_test_split(X_scaled, y_encoded, test_size=0.2, random_state=42)
-
-    # Define Models
-    models = {
-        'Random Forest': RandomForestClassifier(n_estimators=100, random_state=42),
-        'Gradient Boosting': GradientBoostingClassifier(random_state=42),
-        'Naive Bayes': GaussianNB(),
-        'SVM': SVC(probability=True, random_state=42) # probability=True for predict_proba
-    }
+    # Model selection: k-fold CV of every candidate, fits spread over a process pool
+    cache_dir = os.getenv('TRAIN_CACHE_DIR') or os.path.join(model_dir, '.train_cache')
+    y_encoded = np.asarray(y_encoded)
 
-    best_model = None
-    best_accuracy = 0.0
-    best_model_name = ""
-
-    print("\nTraining Models:")
+    print(f"\nTraining Models ({CV_FOLDS}-fold CV):")
     print("-" * 30)
+    start = time.perf_counter()
+    report = select_model(X_scaled, y_encoded, cache_dir=cache_dir)
+    print_report(report)
 
-    for name, model in models.items():
-        try:
-            model.fit(X_train, y_train)
-            predictions = model.predict(X_test)
-            acc = accuracy_score(y_test, predictions)
-            print(f"{name}: {acc:.4f} accuracy")
-            
-            if acc > best_accuracy:
-                best_accuracy = acc
-                best_model = model
-                best_model_name = name
-        except Exception as e:
-            print(f"Error training {name}: {e}")
-
+    scored = {name: entry for name, entry in report.items() if entry['mean'] is not None}
+    if not scored:
+        print("Every candidate failed; no model saved.")
+        return
+    best_model_name = max(scored, key=lambda name: scored[name]['mean'])
+    best_accuracy = scored[best_model_name]['mean']
     print("-" * 30)
-    print(f"Best Model: {best_model_name} with {best_accuracy:.4f} accuracy")
+    print(f"Best Model: {best_model_name} with {best_accuracy:.4f} CV accuracy")
+
+    final = fit_final(best_model_name, X_scaled, y_encoded, cache_dir=cache_dir)
+    best_model = final['model']
+    print(f"Refit on all {len(y_encoded)} rows in {final['fit_seconds']:.2f}s"
+          f"{' (cached)' if final['cached'] else ''}; total {time.perf_counter() - start:.2f}s")
 
     # Save Best Model
     if best_model:
@@ -90,5 +262,17 @@ def train_models():
             pickle.dump(best_model, f)
         print(f"Best model saved to {model_path}")
 
+        # Flat-array export (scaler folded in, labels included) served without sklearn
+        export_path = os.path.join(model_dir, 'crop_recommendation_model.npz')
+        compiled = compile_validated(best_model, preprocessor.scaler)
+        if compiled is not None:
+            save_npz(compiled, export_path, labels=le.classes_)
+            print(f"Compiled model exported to {export_path}")
+        else:
+            # Never leave a stale export from a previous run next to the new pickle
+            if os.path.exists(export_path):
+                os.remove(export_path)
+            print(f"No compiled export for {best_model_name}; serving will use the pickle")
+
 if __name__ == "__main__":
     train_models()
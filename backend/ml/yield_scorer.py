@@ -0,0 +1,235 @@
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def crop_categories(preprocessor, crop_column='crop'):
+    """
+    The crop vocabulary of a fitted ColumnTransformer (the ``categories_`` of
+    the encoder applied to ``crop_column``), or None if it has no such encoder.
+    """
+    for _, transformer, columns in getattr(preprocessor, 'transformers_', []):
+        if isinstance(columns, str) or not hasattr(columns, '__iter__'):
+            continue
+        columns = list(columns)
+        if crop_column not in columns:
+            continue
+        steps = [step for _, step in getattr(transformer, 'steps', [])] or [transformer]
+        for step in steps:
+            categories = getattr(step, 'categories_', None)
+            if categories is not None and len(categories) == len(columns):
+                return [str(c) for c in categories[columns.index(crop_column)]]
+    return None
+
+
+class YieldScorer:
+    """
+    Scores predicted yield for input rows across their candidate crops.
+
+    The regression preprocessor encodes each column independently, so for a
+    given input only the encoded 'crop' block differs between candidate crops.
+    The scorer therefore encodes each input row once (recently seen inputs are
+    served from a small LRU cache), repeats it per candidate and swaps in a
+    cached encoding of the crop block, then predicts every (row, crop) pair in
+    a single call.
+
+    The crop columns are found by encoding one row with every crop of the
+    fitted encoder's vocabulary (``crop_categories``), so every column the
+    crop can set is known up front. The first scoring call, and every call
+    that caches a new crop block, is cross-checked against the plain path
+    (one frame with a row per pair, transformed as a whole). If the two
+    disagree - e.g. a custom preprocessor mixes crop with other columns - the
+    cache is disabled and the plain path is used from then on.
+    """
+
+    def __init__(self, preprocessor, model, crops=(), crop_column='crop', max_cached_rows=1024):
+        """
+        :param preprocessor: Fitted regression preprocessor (e.g. ColumnTransformer).
+        :param model: Fitted regressor exposing predict().
+        :param crops: Known crop labels, used to seed the crop block cache.
+        :param crop_column: Name of the crop input column.
+        :param max_cached_rows: Number of encoded input rows kept in the LRU cache.
+        """
+        self.preprocessor = preprocessor
+        self.model = model
+        self.crop_column = crop_column
+        vocabulary = crop_categories(preprocessor, crop_column) or []
+        self.known_crops = list(dict.fromkeys(vocabulary + [str(c) for c in crops]))
+
+        self._crop_cols = None      # indices of encoded columns that depend on crop
+        self._crop_blocks = {}      # crop -> encoded values at _crop_cols
+        self._row_cache = OrderedDict()  # input row key -> encoded row
+        self.max_cached_rows = max_cached_rows
+        self._sparse = False
+        self._use_cache = True
+        self._verified = False
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def score(self, rows, crops_per_row):
+        """
+        Predict yields for every (row, crop) pair.
+
+        :param rows: List of input dicts (without the crop column).
+        :param crops_per_row: List of crop lists, aligned with rows.
+        :return: List of yield lists, aligned with crops_per_row.
+        """
+        counts = [len(crops) for crops in crops_per_row]
+        if not sum(counts):
+            return [[] for _ in rows]
+
+        X = None
+        if self._use_cache:
+            try:
+                X = self._encode_cached(rows, crops_per_row, counts)
+            except Exception as e:
+                logger.warning('Yield scorer cache disabled: %s', e)
+                self._use_cache = False
+
+        if X is None:
+            flat = self.model.predict(self._encode_frame(rows, crops_per_row))
+        else:
+            flat = self.model.predict(X)
+            if not self._verified:
+                flat = self._verify(flat, rows, crops_per_row)
+
+        yields, pos = [], 0
+        for n in counts:
+            yields.append([float(v) for v in flat[pos:pos + n]])
+            pos += n
+        return yields
+
+    def stats(self):
+        """Row cache counters, in the same shape as TTLCache.stats()."""
+        total = self.hits + self.misses
+        return {
+            'enabled': self._use_cache,
+            'size': len(self._row_cache),
+            'maxsize': self.max_cached_rows,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else None,
+        }
+
+    def _frame(self, rows):
+        df = pd.DataFrame(rows)
+        if hasattr(self.preprocessor, 'feature_names_in_'):
+            missing = [c for c in self.preprocessor.feature_names_in_ if c not in df.columns]
+            if missing:
+                df = df.reindex(columns=list(df.columns) + missing)
+        return df
+
+    def _transform_dense(self, rows):
+        Xt = self.preprocessor.transform(self._frame(rows))
+        if hasattr(Xt, 'toarray'):
+            self._sparse = True
+            Xt = Xt.toarray()
+        return np.asarray(Xt, dtype=float)
+
+    def _encode_frame(self, rows, crops_per_row):
+        """Plain path: one frame with a row per (row, crop) pair."""
+        pairs = []
+        for row, crops in zip(rows, crops_per_row):
+            for crop in crops:
+                pair = dict(row)
+                pair[self.crop_column] = crop
+                pairs.append(pair)
+        return self.preprocessor.transform(self._frame(pairs))
+
+    def _learn_blocks(self, row, crops):
+        """Encode ``row`` once per crop and cache each crop's encoded block."""
+        Xt = self._transform_dense([dict(row, **{self.crop_column: c}) for c in crops])
+
+        if self._crop_cols is None:
+            same = (Xt == Xt[0]) | (np.isnan(Xt) & np.isnan(Xt[0]))
+            self._crop_cols = np.flatnonzero(~same.all(axis=0))
+
+        for crop, encoded in zip(crops, Xt):
+            self._crop_blocks[crop] = encoded[self._crop_cols]
+
+    def _encode_cached(self, rows, crops_per_row, counts):
+        """Fast path: transform each row once and swap the crop block per pair.
+
+        Returns None when the cache cannot be seeded yet (fewer than two crops
+        seen), in which case the caller uses the plain path for this call.
+        """
+        with self._lock:
+            missing = {c for crops in crops_per_row for c in crops if c not in self._crop_blocks}
+            if missing:
+                seed_row = next(r for r, crops in zip(rows, crops_per_row) if crops)
+                learn = sorted(missing)
+                if self._crop_cols is None:
+                    # Column detection needs several distinct crops
+                    learn = list(dict.fromkeys(learn + self.known_crops))
+                    if len(learn) < 2:
+                        return None
+                self._learn_blocks(seed_row, learn)
+                self._verified = False
+
+        scored = [i for i, n in enumerate(counts) if n]
+        base = self._encode_rows([rows[i] for i in scored], [crops_per_row[i][0] for i in scored])
+
+        X = np.repeat(base, [counts[i] for i in scored], axis=0)
+        if len(self._crop_cols):
+            blocks = [self._crop_blocks[c] for i in scored for c in crops_per_row[i]]
+            X[:, self._crop_cols] = np.vstack(blocks)
+
+        if self._sparse:
+            from scipy import sparse
+            return sparse.csr_matrix(X)
+        return X
+
+    def _encode_rows(self, rows, seed_crops):
+        """Encode input rows, reusing cached encodings of rows seen recently.
+
+        The crop block of a cached row is stale, but it is always overwritten
+        by the caller, so rows are keyed on their non-crop values only.
+        """
+        keys = []
+        for row in rows:
+            try:
+                key = tuple(sorted(row.items()))
+                hash(key)
+            except TypeError:
+                key = None
+            keys.append(key)
+
+        with self._lock:
+            cached = [self._row_cache.get(k) if k is not None else None for k in keys]
+            for k, enc in zip(keys, cached):
+                if enc is not None:
+                    self._row_cache.move_to_end(k)
+                    self.hits += 1
+                else:
+                    self.misses += 1
+
+        todo = [i for i, enc in enumerate(cached) if enc is None]
+        if todo:
+            fresh = self._transform_dense([
+                dict(rows[i], **{self.crop_column: seed_crops[i]}) for i in todo
+            ])
+            with self._lock:
+                for i, enc in zip(todo, fresh):
+                    cached[i] = enc
+                    if keys[i] is not None:
+                        self._row_cache[keys[i]] = enc
+                while len(self._row_cache) > self.max_cached_rows:
+                    self._row_cache.popitem(last=False)
+
+        return np.vstack(cached)
+
+    def _verify(self, flat, rows, crops_per_row):
+        """Cross-check the first cached prediction against the plain path."""
+        expected = self.model.predict(self._encode_frame(rows, crops_per_row))
+        self._verified = True
+        if not np.allclose(flat, expected, rtol=1e-6, atol=1e-9):
+            logger.warning('Yield scorer cache mismatch; falling back to per-request encoding.')
+            self._use_cache = False
+            return expected
+        return flat
@@ -1,35 +1,51 @@
 class ZoneMapper:
     """
     Maps Indian States to Agro-Climatic Zones (ACZ).
-    Based on Planning Commission of India's 15 ACZ classification.
+    Based on Planning Commission of India's ACZ classification, using the zone
+    names and state assignments of `mitti_mitra_master_dataset_all_india.csv`
+    so the offline answer is a category the models were trained on.
     """
     def __init__(self):
         self.state_zone_map = {
-            'jammu and kashmir': 'Western Himalayan Region',
-            'himachal pradesh': 'Western Himalayan Region',
-            'uttarakhand': 'Western Himalayan Region',
-            'punjab': 'Trans-Gangetic Plains',
-            'haryana': 'Trans-Gangetic Plains',
-            'delhi': 'Trans-Gangetic Plains',
-            'uttar pradesh': 'Upper Gangetic Plains',
+            'andaman and nicobar islands': 'Island Region',
+            'andhra pradesh': 'Eastern Plateau & Hills',
+            'arunachal pradesh': 'Eastern Himalayas',
+            'assam': 'Eastern Himalayas',
             'bihar': 'Middle Gangetic Plains',
-            'west bengal': 'Lower Gangetic Plains',
-            'assam': 'Eastern Himalayan Region',
-            'sikkim': 'Eastern Himalayan Region',
-            'odisha': 'East Coast Plains and Hills',
-            'andhra pradesh': 'East Coast Plains and Hills',
-            'tamil nadu': 'Southern Plateau and Hills',
-            'telangana': 'Southern Plateau and Hills',
-            'karnataka': 'Southern Plateau and Hills',
-            'kerala': 'West Coast Plains and Ghats',
-            'goa': 'West Coast Plains and Ghats',
-            'maharashtra': 'Western Plateau and Hills',
-            'gujarat': 'Gujarat Plains and Hills',
+            'chandigarh': 'Upper Gangetic Plains',
+            'chhattisgarh': 'Eastern Plateau & Hills',
+            'dadra and nagar haveli and daman and diu': 'Western Plateau & Hills',
+            'delhi': 'Upper Gangetic Plains',
+            'goa': 'West Coast Plains & Ghats',
+            'gujarat': 'Western Plateau & Hills',
+            'haryana': 'Trans-Gangetic Plains',
+            'himachal pradesh': 'Western Himalayas',
+            'jammu and kashmir': 'Western Himalayas',
+            'jharkhand': 'Eastern Plateau & Hills',
+            'karnataka': 'Southern Plateau & Hills',
+            'kerala': 'West Coast Plains & Ghats',
+            'ladakh': 'Western Himalayas',
+            'lakshadweep': 'Island Region',
+            'madhya pradesh': 'Central Plateau & Hills',
+            'maharashtra': 'Western Plateau & Hills',
+            'manipur': 'Eastern Himalayas',
+            'meghalaya': 'Eastern Himalayas',
+            'mizoram': 'Eastern Himalayas',
+            'nagaland': 'Eastern Himalayas',
+            'odisha': 'Eastern Plateau & Hills',
+            'puducherry': 'East Coast Plains',
+            'punjab': 'Trans-Gangetic Plains',
             'rajasthan': 'Western Dry Region',
-            'madhya pradesh': 'Central Plateau and Hills',
-            'chhattisgarh': 'Eastern Plateau and Hills',
-            'jharkhand': 'Eastern Plateau and Hills'
+            'sikkim': 'Eastern Himalayas',
+            'tamil nadu': 'Southern Plateau & Hills',
+            'telangana': 'Southern Plateau & Hills',
+            'tripura': 'Eastern Himalayas',
+            'uttar pradesh': 'Upper Gangetic Plains',
+            'uttarakhand': 'Western Himalayas',
+            'west bengal': 'Lower Gangetic Plains'
         }
+        # Zone names exactly as the training dataset spells them
+        self.zones = frozenset(self.state_zone_map.values())
 
     def get_zone(self, state):
         """
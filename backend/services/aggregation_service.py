@@ -1,53 +1,209 @@
+import logging
 from config.supabase_client import supabase
-from datetime import datetime, timedelta
+from services.rolling_aggregates import daily_store, reading_weight, window_start
+from utils.metrics import span
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
+import numpy as np
 import pandas as pd
 
+logger = logging.getLogger(__name__)
+
+# Postgres function defined in database/schema.sql
+WINDOW_STATS_RPC = 'sensor_window_stats'
+READING_COLUMNS = 'timestamp, temperature, humidity, ph, nitrogen, phosphorus, potassium, rainfall, sample_count, stats'
+SUMMARY_KEYS = ['temperature', 'humidity', 'ph', 'N', 'P', 'K', 'rainfall']
+FLEET_PERCENTILES = [10, 50, 90]
+PAGE_SIZE = 1000  # PostgREST's default max rows per response
+
 class AggregationService:
-    def get_30_day_average(self, device_id='pi_01'):
+    def __init__(self, pushdown_retry_interval=600.0):
+        # The RPC may not be deployed; after a failure, retry it only every so often
+        self.pushdown_retry_interval = pushdown_retry_interval
+        self._pushdown_failed_at = None
+
+    def get_30_day_average(self, device_id='pi_01', rebuild=False):
         """
         Fetches last 30 days of data for the device from Supabase and calculates stats.
         Returns dictionary with keys mapping to model features: N, P, K, temperature, humidity, ph, rainfall.
+
+        The window is the last 30 calendar days, today included (see
+        ``window_start``). The aggregation is pushed down to Postgres when the
+        `sensor_window_stats` function is available. Without it, a device whose
+        daily buckets are seeded is combined from the incrementally updated
+        buckets instead of re-reading every row, and the rest are done in
+        pandas from a full fetch that seeds the buckets; seeds expire after
+        DAILY_AGGREGATE_TTL seconds (default 300). ``rebuild=True`` always
+        does the full fetch. Devices without data (and offline mode) get mock values.
         """
-        if not supabase:
-            # Fallback for offline/local mode without Supabase connection
+        agg = self.device_average(device_id, rebuild)
+        if agg is None:
+            logger.info('No data found for aggregation, using mock.', extra={'device_id': device_id})
             return self._mock_aggregation()
+        return agg
+
+    def device_average(self, device_id, rebuild=False):
+        """
+        Like ``get_30_day_average``, but returns None instead of mock values
+        when the device has no readings or they cannot be fetched.
+        """
+        if not supabase:
+            return None
+
+        if not rebuild:
+            pushed = self.get_window_averages([device_id])
+            if pushed is not None:
+                return pushed.get(device_id)
+
+            if daily_store.is_seeded(device_id):
+                agg = daily_store.summary(device_id)
+                if agg:
+                    return agg
 
         try:
-            thirty_days_ago = (datetime.now() - timedelta(days=30)).isoformat()
-            
-            # Fetch data
-            response = supabase.table('sensor_readings')\
-                .select('*')\
-                .eq('device_id', device_id)\
-                .gte('timestamp', thirty_days_ago)\
-                .execute()
-            
-            data = response.data
+            data = self._fetch_readings(device_id, window_start().isoformat())
+            daily_store.rebuild(device_id, data or [])
             if not data:
-                print("No data found for aggregation, using mock.")
-                return self._mock_aggregation()
+                return None
                 
             df = pd.DataFrame(data)
+            # Pi window summaries stand for sample_count readings each
+            weights = pd.Series([reading_weight(row) for row in data], index=df.index)
+
+            def mean(column):
+                values = pd.to_numeric(df[column], errors='coerce')
+                mask = values.notna()
+                if not mask.any():
+                    return None
+                return round(float(np.average(values[mask], weights=weights[mask])), 2)
             
             # Map column names if they differ from model expectation
             # DB: nitrogen, phosphorus, potassium
             # Model: N, P, K
             
             agg = {
-                'temperature': round(df['temperature'].mean(), 2),
-                'humidity': round(df['humidity'].mean(), 2),
-                'ph': round(df['ph'].mean(), 2),
-                'N': round(df['nitrogen'].mean(), 2),
-                'P': round(df['phosphorus'].mean(), 2),
-                'K': round(df['potassium'].mean(), 2),
+                'temperature': mean('temperature'),
+                'humidity': mean('humidity'),
+                'ph': mean('ph'),
+                'N': mean('nitrogen'),
+                'P': mean('phosphorus'),
+                'K': mean('potassium'),
                 # If rainfall is not in DB (fetched from weather API usually), default to 0
                 'rainfall': round(df['rainfall'].sum(), 2) if 'rainfall' in df.columns else 100.0 
             }
             return agg
             
         except Exception as e:
-            print(f"Aggregation Service Error: {e}")
-            return self._mock_aggregation()
+            logger.error('Aggregation service error: %s', e, extra={'device_id': device_id})
+            return None
+
+    def _fetch_readings(self, device_id, since):
+        """All of a device's readings since ``since``, paged in a stable order."""
+        rows = []
+        while True:
+            with span('supabase'):
+                response = supabase.table('sensor_readings')\
+                    .select(READING_COLUMNS)\
+                    .eq('device_id', device_id)\
+                    .gte('timestamp', since)\
+                    .order('timestamp')\
+                    .order('id')\
+                    .range(len(rows), len(rows) + PAGE_SIZE - 1)\
+                    .execute()
+            page = response.data or []
+            rows.extend(page)
+            if len(page) < PAGE_SIZE:
+                return rows
+
+    def get_window_averages(self, device_ids=None, days=30):
+        """
+        Aggregates for several devices in one query, computed inside Postgres.
+
+        :param device_ids: List of device ids, or None for every device.
+        :return: {device_id: aggregate dict} (devices without readings are
+                 absent), or None when the pushed-down function is unavailable.
+        """
+        if not supabase or not self.pushdown_available():
+            return None
+
+        try:
+            with span('supabase'):
+                response = supabase.rpc(WINDOW_STATS_RPC, {
+                    'p_device_ids': list(device_ids) if device_ids is not None else None,
+                    'p_days': days,
+                    'p_since': window_start(days).isoformat()
+                }).execute()
+        except Exception as e:
+            logger.warning('Aggregation pushdown unavailable, using pandas: %s', e)
+            self._pushdown_failed_at = time.monotonic()
+            return None
+
+        self._pushdown_failed_at = None
+        return {row['device_id']: self._from_window_row(row) for row in (response.data or [])}
+
+    def iter_fleet_averages(self, device_ids, max_workers=8):
+        """
+        Yields (device_id, aggregate) for every device as soon as it is ready;
+        the aggregate is None for devices without data, never mock values.
+
+        Uses one grouped query when the pushed-down function is available;
+        otherwise aggregates the devices concurrently on a thread pool.
+        """
+        device_ids = list(dict.fromkeys(device_ids))
+        pushed = self.get_window_averages(device_ids) if supabase else None
+        if pushed is not None:
+            for device_id in device_ids:
+                yield device_id, pushed.get(device_id)
+            return
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(device_ids) or 1)) as pool:
+            futures = {pool.submit(self.device_average, d): d for d in device_ids}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+    def devices_in_region(self, region):
+        """Device ids registered for a region in the `devices` table."""
+        if not supabase:
+            return []
+        try:
+            with span('supabase'):
+                response = supabase.table('devices').select('device_id').eq('region', region).execute()
+            return [row['device_id'] for row in (response.data or [])]
+        except Exception as e:
+            logger.error('Device lookup error: %s', e)
+            return []
+
+    @staticmethod
+    def fleet_percentiles(summaries):
+        """Per-field percentiles across device summaries (devices without data are skipped)."""
+        fleet = {}
+        for key in SUMMARY_KEYS:
+            values = [float(s[key]) for s in summaries if s and s.get(key) is not None]
+            if values:
+                pcts = np.percentile(values, FLEET_PERCENTILES)
+                fleet[key] = {f'p{p}': round(float(v), 2) for p, v in zip(FLEET_PERCENTILES, pcts)}
+                fleet[key]['devices'] = len(values)
+        return fleet
+
+    def pushdown_available(self):
+        if self._pushdown_failed_at is None:
+            return True
+        return time.monotonic() - self._pushdown_failed_at >= self.pushdown_retry_interval
+
+    def _from_window_row(self, row):
+        def num(key):
+            value = row.get(key)
+            return round(float(value), 2) if value is not None else None
+
+        return {
+            'temperature': num('avg_temp'),
+            'humidity': num('avg_humidity'),
+            'ph': num('avg_ph'),
+            'N': num('avg_n'),
+            'P': num('avg_p'),
+            'K': num('avg_k'),
+            'rainfall': num('total_rain') or 0.0
+        }
 
     def _mock_aggregation(self):
         """
@@ -0,0 +1,360 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from config.supabase_client import supabase
+from utils.metrics import span
+
+logger = logging.getLogger(__name__)
+
+# Postgres error classes that mean "this row is bad", not "the database is down":
+# 22 data exception, 23 integrity constraint violation, 42 syntax/undefined column
+REJECTED_SQLSTATE_CLASSES = ('22', '23', '42')
+
+
+def is_rejection(error):
+    """True when PostgREST refused the data itself, so retrying cannot succeed."""
+    code = getattr(error, 'code', None)
+    return isinstance(code, str) and code[:2] in REJECTED_SQLSTATE_CLASSES
+
+
+class JournalLockedError(RuntimeError):
+    """Every journal slot is held by another process."""
+
+
+def _try_lock(f):
+    """Take an exclusive, non-blocking lock on an open file; False if another process holds it."""
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _read_journal(path, acked_seq):
+    """``(unacked (seq, record) entries, highest seq, line count)`` of a journal file."""
+    entries, max_seq, lines = [], acked_seq, 0
+    if not os.path.exists(path):
+        return entries, max_seq, lines
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # torn last line after a crash
+            lines += 1
+            max_seq = max(max_seq, entry['seq'])
+            if entry['seq'] > acked_seq:
+                entries.append((entry['seq'], entry['record']))
+    return entries, max_seq, lines
+
+
+def _read_ack(ack_path):
+    try:
+        with open(ack_path) as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+class IngestBuffer:
+    """
+    Write-behind buffer between the sensor ingest endpoint and Supabase.
+
+    ``append`` writes the record to a local append-only journal (fsynced) and
+    queues it in memory, so the HTTP handler can answer as soon as the reading
+    is durable. A background worker flushes queued records to
+    `sensor_readings` in batches of up to ``batch_size``, or every
+    ``flush_interval`` seconds, retrying failed batches with jittered
+    exponential backoff. After ``split_after`` consecutive failures the head
+    batch is retried one record at a time: records the database rejects
+    outright (see ``is_rejection``) are moved to a dead-letter file
+    (``<journal>.dead``) so one bad reading cannot block the queue, while
+    transient errors still back off and retry.
+
+    Journal lines carry a sequence number; the last flushed sequence is kept
+    in a sidecar ``.ack`` file so a restart replays only unflushed records.
+    The journal is truncated whenever the queue drains, and rewritten with
+    only the pending records once it holds ``compact_after`` flushed lines.
+
+    A journal belongs to one process. ``start`` takes an exclusive lock on
+    the first free of ``slots`` journal files (``<name>.<i>.jsonl``; just
+    ``journal_path`` when ``slots == 1``) and raises JournalLockedError if
+    all are held, so worker processes never share a journal. It then adopts
+    the unflushed records of slots no running process holds (e.g. after a
+    restart with fewer workers). Adoption is at-least-once: a crash between
+    copying and deleting an orphaned journal replays its records twice.
+    """
+
+    def __init__(self, journal_path, client=None, table='sensor_readings', batch_size=500,
+                 flush_interval=2.0, max_backoff=60.0, fsync=True, compact_after=50000, split_after=3,
+                 slots=1):
+        self.base_path = journal_path
+        self.slots = max(1, slots)
+        self.journal_path = None
+        self.ack_path = None
+        self.dead_letter_path = None
+        self.client = client if client is not None else supabase
+        self.table = table
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+        self.fsync = fsync
+        self.compact_after = compact_after
+        self.split_after = split_after
+
+        self._queue = deque()   # (seq, enqueued_at, record)
+        self._seq = 0
+        self._acked_seq = 0
+        self._journal = None
+        self._journal_lines = 0
+        self._slot_lock = None
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._thread = None
+        self._stopping = False
+
+        self.metrics = {
+            'enqueued': 0,
+            'flushed': 0,
+            'flush_batches': 0,
+            'flush_failures': 0,
+            'dead_lettered': 0,
+            'last_flush_seconds': None,
+            'max_flush_seconds': 0.0,
+            'total_flush_seconds': 0.0,
+            'last_error': None,
+        }
+
+    def start(self):
+        """
+        Claim a journal, replay its unflushed records and start the flush worker (idempotent).
+
+        :raises JournalLockedError: If every journal slot is held by another process.
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._claim()
+            self._replay()
+            self._adopt_orphans()
+            self._thread = threading.Thread(target=self._run, name='ingest-buffer', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=10.0):
+        """Ask the worker to flush what it can and exit."""
+        with self._wake:
+            self._stopping = True
+            self._wake.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def append(self, record):
+        """Durably journal one record and queue it for the next flush."""
+        if self._thread is None:
+            self.start()
+        with self._wake:
+            seq = self._write(record)
+            self._sync()
+            if len(self._queue) >= self.batch_size:
+                self._wake.notify()
+        return seq
+
+    def _write(self, record):
+        """Journal and queue one record (caller holds the lock and syncs)."""
+        self._seq += 1
+        self._journal.write(json.dumps({'seq': self._seq, 'record': record}, default=str) + '\n')
+        self._journal_lines += 1
+        self._queue.append((self._seq, time.monotonic(), record))
+        self.metrics['enqueued'] += 1
+        return self._seq
+
+    def _sync(self):
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+
+    def stats(self):
+        with self._lock:
+            depth = len(self._queue)
+            oldest = time.monotonic() - self._queue[0][1] if depth else 0.0
+            metrics = dict(self.metrics)
+        batches = metrics['flush_batches']
+        metrics['avg_flush_seconds'] = round(metrics['total_flush_seconds'] / batches, 4) if batches else None
+        metrics['total_flush_seconds'] = round(metrics['total_flush_seconds'], 4)
+        metrics.update({
+            'queue_depth': depth,
+            'oldest_age_seconds': round(oldest, 3),
+            'acked_seq': self._acked_seq,
+            'journal_path': self.journal_path,
+            'running': self._thread is not None and self._thread.is_alive(),
+        })
+        return metrics
+
+    def _slot_paths(self):
+        if self.slots == 1:
+            return [self.base_path]
+        stem, ext = os.path.splitext(self.base_path)
+        return [f'{stem}.{i}{ext}' for i in range(self.slots)]
+
+    def _claim(self):
+        os.makedirs(os.path.dirname(self.base_path) or '.', exist_ok=True)
+        for path in self._slot_paths():
+            lock = open(path + '.lock', 'a')
+            if _try_lock(lock):
+                self._slot_lock = lock
+                self.journal_path = path
+                self.ack_path = path + '.ack'
+                self.dead_letter_path = path + '.dead'
+                return
+            lock.close()
+        raise JournalLockedError(f"All {self.slots} ingest journal slots of {self.base_path} are in use")
+
+    def _replay(self):
+        self._acked_seq = _read_ack(self.ack_path)
+        entries, self._seq, self._journal_lines = _read_journal(self.journal_path, self._acked_seq)
+        now = time.monotonic()
+        self._queue.extend((seq, now, record) for seq, record in entries)
+        if entries:
+            logger.info('Ingest buffer replaying %d unflushed readings', len(entries))
+        self._journal = open(self.journal_path, 'a')
+
+    def _adopt_orphans(self):
+        """Move the unflushed records of journals no process holds into this one."""
+        candidates = dict.fromkeys(self._slot_paths() + [self.base_path])
+        for path in candidates:
+            if path == self.journal_path or not os.path.exists(path):
+                continue
+            lock = open(path + '.lock', 'a')
+            try:
+                if not _try_lock(lock):
+                    continue
+                entries, _, _ = _read_journal(path, _read_ack(path + '.ack'))
+                for _, record in entries:
+                    self._write(record)
+                self._sync()
+                for stale in (path, path + '.ack'):
+                    if os.path.exists(stale):
+                        os.remove(stale)
+                if entries:
+                    logger.info('Ingest buffer adopted %d unflushed readings from %s', len(entries), path)
+            finally:
+                lock.close()
+
+    def _run(self):
+        failures = 0
+        while True:
+            with self._wake:
+                if not self._queue and self._stopping:
+                    return
+                if len(self._queue) < self.batch_size and not self._stopping:
+                    self._wake.wait(self.flush_interval)
+                batch = [self._queue[i] for i in range(min(self.batch_size, len(self._queue)))]
+
+            if not batch:
+                continue
+
+            start = time.perf_counter()
+            try:
+                with span('supabase'):
+                    self.client.table(self.table).insert([rec for _, _, rec in batch]).execute()
+            except Exception as e:
+                failures += 1
+                self.metrics['flush_failures'] += 1
+                self.metrics['last_error'] = str(e)
+                if self._stopping:
+                    return
+                if failures >= self.split_after and self._isolate(batch):
+                    failures = 0
+                    continue
+                delay = min(self.max_backoff, self.flush_interval * 2 ** failures)
+                time.sleep(delay * random.uniform(0.5, 1.0))
+                continue
+
+            elapsed = time.perf_counter() - start
+            failures = 0
+            self._ack(batch[-1][0], len(batch), elapsed)
+
+    def _isolate(self, batch):
+        """
+        Insert ``batch`` record by record, dead-lettering rejected records.
+
+        Stops at the first transient error. Acks the records handled so far
+        and returns how many that was (0 means keep backing off).
+        """
+        start = time.perf_counter()
+        handled, inserted = 0, 0
+        for seq, _, record in batch:
+            try:
+                with span('supabase'):
+                    self.client.table(self.table).insert(record).execute()
+                inserted += 1
+            except Exception as e:
+                if not is_rejection(e):
+                    break
+                self._dead_letter(seq, record, e)
+            handled += 1
+
+        if handled:
+            self._ack(batch[handled - 1][0], handled, time.perf_counter() - start, flushed=inserted)
+        return handled
+
+    def _dead_letter(self, seq, record, error):
+        logger.error('Ingest buffer dropping rejected reading %d to %s: %s', seq, self.dead_letter_path, error)
+        with open(self.dead_letter_path, 'a') as f:
+            f.write(json.dumps({'seq': seq, 'error': str(error), 'record': record}, default=str) + '\n')
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        with self._lock:
+            self.metrics['dead_lettered'] += 1
+
+    def _ack(self, seq, count, elapsed, flushed=None):
+        with self._lock:
+            for _ in range(count):
+                self._queue.popleft()
+            self._acked_seq = seq
+
+            tmp_path = self.ack_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                f.write(str(seq))
+            os.replace(tmp_path, self.ack_path)
+
+            if not self._queue:
+                self._journal.truncate(0)
+                self._journal_lines = 0
+            elif self._journal_lines - len(self._queue) >= self.compact_after:
+                self._compact()
+
+            self.metrics['flushed'] += count if flushed is None else flushed
+            self.metrics['flush_batches'] += 1
+            self.metrics['last_flush_seconds'] = round(elapsed, 4)
+            self.metrics['max_flush_seconds'] = max(self.metrics['max_flush_seconds'], round(elapsed, 4))
+            self.metrics['total_flush_seconds'] += elapsed
+            self.metrics['last_error'] = None
+
+    def _compact(self):
+        """Rewrite the journal with only the pending records (caller holds the lock)."""
+        tmp_path = self.journal_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            for seq, _, record in self._queue:
+                f.write(json.dumps({'seq': seq, 'record': record}, default=str) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal.close()
+        os.replace(tmp_path, self.journal_path)
+        self._journal = open(self.journal_path, 'a')
+        self._journal_lines = len(self._queue)
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import logging
+import threading
+
+from config.supabase_client import supabase
+from utils.cache import TTLCache, MISSING
+from utils.metrics import span
+
+logger = logging.getLogger(__name__)
+
+OPTION_FIELDS = ['state', 'crop', 'season', 'crop_type', 'agro_climatic_zone', 'district']
+OPTIONS_VIEW = 'mitti_mitra_options'
+PAGE_SIZE = 1000
+# Errors meaning the view does not exist: Postgres undefined_table, and
+# PostgREST's "relation not in the schema cache"
+MISSING_RELATION_CODES = {'42P01', 'PGRST205'}
+
+
+def _is_missing_relation(error):
+    return getattr(error, 'code', None) in MISSING_RELATION_CODES
+
+
+class DistinctValuesService:
+    """
+    Distinct values of the form fields in `mitti_mitra_data`, computed once and
+    served from memory.
+
+    Values come from the `mitti_mitra_options` view (one (field, value) row per
+    distinct value, see database/schema.sql) when it exists, otherwise from a
+    single paged pass over the table selecting all fields at once, so results
+    are never truncated. Each result carries an ETag for conditional requests.
+    Other view errors are not taken as the view missing: the empty result is
+    cached for ``error_ttl`` and the view is tried again after that.
+    """
+
+    def __init__(self, client=None, ttl=600.0, error_ttl=30.0):
+        self.client = client if client is not None else supabase
+        self.cache = TTLCache(maxsize=1, ttl=ttl)
+        self.error_ttl = error_ttl
+        self._use_view = True
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Return ``(options, etag)``, recomputing only when the cache has expired."""
+        cached = self.cache.get('options')
+        if cached is not MISSING:
+            return cached
+
+        # Only one request recomputes; the others wait for its result
+        with self._lock:
+            cached = self.cache.get('options')
+            if cached is not MISSING:
+                return cached
+
+            try:
+                options = self._fetch()
+                ttl = None
+            except Exception as e:
+                logger.error('Options fetch failed: %s', e)
+                options = {f: [] for f in OPTION_FIELDS}
+                ttl = self.error_ttl
+
+            body = json.dumps(options, sort_keys=True).encode()
+            result = (options, hashlib.sha1(body).hexdigest())
+            self.cache.set('options', result, ttl=ttl)
+            return result
+
+    def invalidate(self):
+        """Drop the cached options, e.g. after new rows were imported."""
+        self.cache.invalidate()
+
+    def _fetch(self):
+        if self._use_view:
+            try:
+                return self._fetch_from_view()
+            except LookupError as e:
+                logger.info('%s, scanning mitti_mitra_data instead', e)
+                return self._fetch_from_table()
+            except Exception as e:
+                if not _is_missing_relation(e):
+                    raise
+                logger.warning('%s unavailable, scanning mitti_mitra_data instead: %s', OPTIONS_VIEW, e)
+                self._use_view = False
+        return self._fetch_from_table()
+
+    def _fetch_from_view(self):
+        values = {f: set() for f in OPTION_FIELDS}
+        for row in self._paged(OPTIONS_VIEW, 'field, value', ['field', 'value']):
+            if row.get('field') in values and row.get('value') is not None:
+                values[row['field']].add(row['value'])
+        if not any(values.values()):
+            raise LookupError(f"{OPTIONS_VIEW} is empty")
+        return {f: sorted(v) for f, v in values.items()}
+
+    def _fetch_from_table(self):
+        values = {f: set() for f in OPTION_FIELDS}
+        for row in self._paged('mitti_mitra_data', ', '.join(OPTION_FIELDS), ['id']):
+            for f in OPTION_FIELDS:
+                if row.get(f) is not None:
+                    values[f].add(row[f])
+        return {f: sorted(v) for f, v in values.items()}
+
+    def _paged(self, table, columns, order_by):
+        """Rows of ``table`` page by page, ordered by the unique key ``order_by``."""
+        start = 0
+        while True:
+            with span('supabase'):
+                query = self.client.table(table).select(columns)
+                for column in order_by:
+                    query = query.order(column)
+                resp = query.range(start, start + PAGE_SIZE - 1).execute()
+            rows = getattr(resp, 'data', None) or []
+            yield from rows
+            if len(rows) < PAGE_SIZE:
+                return
+            start += PAGE_SIZE
@@ -0,0 +1,164 @@
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+# sensor_readings columns tracked per daily bucket
+FIELDS = ['temperature', 'humidity', 'ph', 'nitrogen', 'phosphorus', 'potassium', 'rainfall']
+# Fields that are totals per row (a window summary carries the window's total, not a mean)
+SUM_FIELDS = {'rainfall'}
+
+
+def reading_weight(record):
+    """
+    Number of samples a row stands for: 1 for a raw reading, ``sample_count``
+    for a Pi window summary whose values are means over that many samples.
+    """
+    try:
+        return max(int(record.get('sample_count') or 1), 1)
+    except (TypeError, ValueError):
+        return 1
+
+
+def window_start(days=30):
+    """
+    First day of a ``days``-day report window: the last ``days`` calendar
+    days, today included. Every aggregation path (daily buckets, the full
+    rebuild and the Postgres pushdown) uses this same window.
+    """
+    return date.today() - timedelta(days=days - 1)
+
+
+def _reading_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    try:
+        return datetime.fromisoformat(str(value)).date()
+    except (TypeError, ValueError):
+        return date.today()
+
+
+class DailyAggregateStore:
+    """
+    Per-device daily partial aggregates (sum, count, min, max per field).
+    Rows that summarise a window of samples are weighted by ``sample_count``.
+
+    Buckets are updated as readings are ingested, so a 30-day report only
+    combines 30 small buckets instead of re-reading every row. A device is
+    "seeded" once its buckets were rebuilt from the database; until then
+    callers should do a full rebuild, because readings ingested before this
+    process started (or by other worker processes) are not in the store.
+    A seed expires after ``seed_ttl`` seconds, so readings that went through
+    other workers are picked up by the next rebuild.
+    """
+
+    def __init__(self, retention_days=35, seed_ttl=300.0):
+        self.retention_days = retention_days
+        self.seed_ttl = seed_ttl
+        self._buckets = {}   # device_id -> {date: {field: [sum, count, min, max]}}
+        self._seeded = {}    # device_id -> time.monotonic() of the last rebuild
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        """Fold one sensor_readings record into its device's daily bucket."""
+        device_id = record.get('device_id', 'pi_01')
+        day = _reading_date(record.get('timestamp'))
+        with self._lock:
+            self._add(self._buckets.setdefault(device_id, {}), day, record)
+            self._prune(device_id)
+
+    def rebuild(self, device_id, rows):
+        """Replace a device's buckets with ones computed from ``rows`` and mark it seeded."""
+        days = {}
+        for row in rows:
+            self._add(days, _reading_date(row.get('timestamp')), row)
+        with self._lock:
+            self._buckets[device_id] = days
+            self._seeded[device_id] = time.monotonic()
+            self._prune(device_id)
+
+    def is_seeded(self, device_id):
+        """True while the device's last rebuild is younger than ``seed_ttl``."""
+        seeded_at = self._seeded.get(device_id)
+        return seeded_at is not None and time.monotonic() - seeded_at < self.seed_ttl
+
+    def window(self, device_id, days=30):
+        """
+        Combine the last ``days`` daily buckets of a device (today included).
+
+        :return: {field: {'sum', 'count', 'min', 'max', 'mean'}} or None if no data.
+        """
+        since = window_start(days)
+        totals = {}
+        with self._lock:
+            for day, bucket in self._buckets.get(device_id, {}).items():
+                if day < since:
+                    continue
+                for field, (s, n, lo, hi) in bucket.items():
+                    t = totals.setdefault(field, [0.0, 0, lo, hi])
+                    t[0] += s
+                    t[1] += n
+                    t[2] = min(t[2], lo)
+                    t[3] = max(t[3], hi)
+
+        if not totals:
+            return None
+        return {
+            field: {'sum': s, 'count': n, 'min': lo, 'max': hi, 'mean': s / n}
+            for field, (s, n, lo, hi) in totals.items()
+        }
+
+    def summary(self, device_id, days=30):
+        """30-day report in the AggregationService format, or None if no data."""
+        stats = self.window(device_id, days)
+        if not stats:
+            return None
+
+        def mean(field):
+            return round(stats[field]['mean'], 2) if field in stats else None
+
+        return {
+            'temperature': mean('temperature'),
+            'humidity': mean('humidity'),
+            'ph': mean('ph'),
+            'N': mean('nitrogen'),
+            'P': mean('phosphorus'),
+            'K': mean('potassium'),
+            'rainfall': round(stats['rainfall']['sum'], 2) if 'rainfall' in stats else 0.0
+        }
+
+    def _add(self, days, day, record):
+        bucket = days.setdefault(day, {})
+        weight = reading_weight(record)
+        stats = record.get('stats') if isinstance(record.get('stats'), dict) else {}
+        for field in FIELDS:
+            value = record.get(field)
+            if value is None:
+                continue
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                continue
+            # Window summaries count as sample_count samples and carry their own extremes
+            n = 1 if field in SUM_FIELDS else weight
+            field_stats = stats.get(field) if isinstance(stats.get(field), dict) else {}
+            lo = float(field_stats['min']) if field_stats.get('min') is not None else value
+            hi = float(field_stats['max']) if field_stats.get('max') is not None else value
+            agg = bucket.get(field)
+            if agg is None:
+                bucket[field] = [value * n, n, lo, hi]
+            else:
+                agg[0] += value * n
+                agg[1] += n
+                agg[2] = min(agg[2], lo)
+                agg[3] = max(agg[3], hi)
+
+    def _prune(self, device_id):
+        cutoff = date.today() - timedelta(days=self.retention_days)
+        days = self._buckets.get(device_id, {})
+        for day in [d for d in days if d < cutoff]:
+            del days[day]
+
+
+# Shared by the ingest endpoints (updates) and AggregationService (reads)
+daily_store = DailyAggregateStore(seed_ttl=float(os.getenv('DAILY_AGGREGATE_TTL', '300')))
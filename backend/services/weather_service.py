@@ -1,7 +1,10 @@
+import logging
 import requests
 import os
 import random
 
+logger = logging.getLogger(__name__)
+
 class WeatherService:
     def __init__(self):
         self.api_key = os.getenv("OPENWEATHER_API_KEY")
@@ -39,7 +42,7 @@ class WeatherService:
             else:
                 return self._mock_weather()
         except Exception as e:
-            print(f"Weather API Error: {e}")
+            logger.error('Weather API error: %s', e)
             return self._mock_weather()
 
     def _mock_weather(self):
@@ -0,0 +1,142 @@
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from config.supabase_client import supabase
+from ml.zone_mapper import ZoneMapper
+from utils.cache import TTLCache, MISSING
+from utils.metrics import span
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 1000
+
+
+def _normalize(state):
+    return str(state).strip().lower()
+
+
+class ZoneResolver:
+    """
+    Resolves a state to its agro-climatic zone without a database round trip
+    per request.
+
+    Lookup order:
+      1. bounded LRU/TTL cache of recent answers
+      2. state -> zone table bulk-loaded from `mitti_mitra_data` in the
+         background at startup (refreshed in the background once it is older than ``table_ttl``,
+         or retried every ``retry_interval`` while it has never loaded)
+      3. the static ZoneMapper table, when the database is unavailable or the
+         table is still loading; only zone names in ``ZoneMapper.zones`` (the
+         training dataset's vocabulary) are ever returned
+    """
+
+    def __init__(self, client=None, cache_size=256, cache_ttl=3600.0, table_ttl=86400.0,
+                 retry_interval=300.0):
+        self.client = client if client is not None else supabase
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self.mapper = ZoneMapper()
+        self.table_ttl = table_ttl
+        self.retry_interval = retry_interval
+
+        self._table = {}
+        self._loaded_at = None
+        self._attempted_at = None
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self.sources = Counter()
+
+    def preload(self):
+        """
+        Bulk-load the whole state -> zone mapping, paging through the table
+        in primary-key order so no row is skipped or counted twice.
+
+        When a state appears with several zones the most frequent one wins.
+        Returns the number of states loaded; keeps the previous table on failure.
+        """
+        self._attempted_at = time.monotonic()
+        counts = defaultdict(Counter)
+        try:
+            start = 0
+            while True:
+                with span('supabase'):
+                    resp = self.client.table('mitti_mitra_data') \
+                        .select('state, agro_climatic_zone') \
+                        .order('id') \
+                        .range(start, start + PAGE_SIZE - 1) \
+                        .execute()
+                rows = getattr(resp, 'data', None) or []
+                for r in rows:
+                    if r.get('state') and r.get('agro_climatic_zone'):
+                        counts[_normalize(r['state'])][r['agro_climatic_zone']] += 1
+                if len(rows) < PAGE_SIZE:
+                    break
+                start += PAGE_SIZE
+        except Exception as e:
+            logger.warning('Zone table preload failed, using offline mapping: %s', e)
+            return len(self._table)
+        finally:
+            self._refreshing = False
+
+        with self._lock:
+            self._table = {state: zones.most_common(1)[0][0] for state, zones in counts.items()}
+            self._loaded_at = time.monotonic()
+        self.cache.invalidate()
+        logger.info('Preloaded agro-climatic zones for %d states', len(self._table))
+        return len(self._table)
+
+    def preload_async(self):
+        """Start :meth:`preload` on a daemon thread unless one is already running."""
+        with self._lock:
+            if self._refreshing:
+                return False
+            self._refreshing = True
+        threading.Thread(target=self.preload, daemon=True).start()
+        return True
+
+    def resolve(self, state):
+        """Return the agro-climatic zone for ``state``, or None if unknown."""
+        if not state:
+            return None
+        key = _normalize(state)
+
+        zone = self.cache.get(key)
+        if zone is not MISSING:
+            self.sources['cache'] += 1
+            return zone
+
+        self._refresh_if_stale()
+        zone = self._table.get(key)
+        if zone:
+            self.sources['table'] += 1
+        else:
+            zone = self.mapper.get_zone(key)
+            if zone not in self.mapper.zones:
+                zone = None
+            self.sources['fallback' if zone else 'unknown'] += 1
+
+        self.cache.set(key, zone)
+        return zone
+
+    def stats(self):
+        loaded_at = None
+        if self._loaded_at is not None:
+            age = time.monotonic() - self._loaded_at
+            loaded_at = datetime.fromtimestamp(time.time() - age).isoformat()
+        return {
+            'cache': self.cache.stats(),
+            'table_states': len(self._table),
+            'table_loaded_at': loaded_at,
+            'sources': dict(self.sources),
+        }
+
+    def _refresh_if_stale(self):
+        now = time.monotonic()
+        if self._loaded_at is not None:
+            if now - self._loaded_at < self.table_ttl:
+                return
+        elif self._attempted_at is not None and now - self._attempted_at < self.retry_interval:
+            return
+        self.preload_async()
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Tests import backend modules the way the app does (``from ml...``, ``from services...``)
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND not in sys.path:
+    sys.path.insert(0, BACKEND)
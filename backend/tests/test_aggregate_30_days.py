@@ -0,0 +1,129 @@
+import math
+import os
+import random
+import sys
+
+import pytest
+
+AGGREGATOR = os.path.join(os.path.dirname(__file__), '..', '..', 'raspberry_pi', 'aggregator')
+if AGGREGATOR not in sys.path:
+    sys.path.insert(0, AGGREGATOR)
+
+from aggregate_30_days import CHUNK_SIZE, RunningStats, StreamingAggregator, aggregate_data  # noqa: E402
+
+
+def _readings(n, seed=0):
+    rng = random.Random(seed)
+    readings = []
+    for i in range(n):
+        reading = {'temperature': rng.gauss(27, 4), 'humidity': rng.gauss(65, 10), 'ph': rng.gauss(6.5, 0.4),
+                   'nitrogen': rng.gauss(80, 15), 'phosphorus': rng.gauss(40, 8), 'potassium': rng.gauss(45, 9),
+                   'rainfall': abs(rng.gauss(0, 0.5))}
+        if i % 97 == 0:
+            reading['ph'] = None
+        if i % 101 == 0:
+            reading['nitrogen'] = float('nan')
+        if i % 103 == 0:
+            reading['humidity'] = 'n/a'
+        if i % 107 == 0:
+            reading['potassium'] = '45'
+        readings.append(reading)
+    return readings
+
+
+def _reference(values):
+    mean = math.fsum(values) / len(values)
+    return {'count': len(values), 'mean': mean, 'min': min(values), 'max': max(values),
+            'variance': math.fsum((v - mean) ** 2 for v in values) / (len(values) - 1)}
+
+
+def _assert_matches(stats, values):
+    expected = _reference(values)
+    assert stats.count == expected['count']
+    assert stats.min == expected['min'] and stats.max == expected['max']
+    assert stats.mean == pytest.approx(expected['mean'], rel=1e-12)
+    assert stats.variance == pytest.approx(expected['variance'], rel=1e-9)
+
+
+def test_add_and_update_match_a_two_pass_reference():
+    readings = _readings(CHUNK_SIZE * 2 + 17)
+    by_add = StreamingAggregator()
+    for reading in readings:
+        by_add.add(reading)
+    by_update = StreamingAggregator().update(iter(readings))
+
+    assert by_add.readings == by_update.readings == len(readings)
+    for field in by_add.fields:
+        values = []
+        for reading in readings:
+            try:
+                value = float(reading[field])
+            except (TypeError, ValueError):
+                continue
+            if not math.isnan(value):
+                values.append(value)
+        _assert_matches(by_add.stats[field], values)
+        _assert_matches(by_update.stats[field], values)
+    assert aggregate_data(readings) == by_add.summary()
+
+
+def test_merge_equals_a_single_pass():
+    values = [random.Random(1).uniform(-50, 150) for _ in range(1000)]
+    parts = [values[:1], values[1:300], [], values[300:]]
+    merged = RunningStats()
+    for part in parts:
+        stats = RunningStats()
+        for value in part:
+            stats.add(value)
+        merged.merge(stats)
+    _assert_matches(merged, values)
+    assert merged.total == pytest.approx(math.fsum(values), rel=1e-12)
+
+    # Merging into an empty instance copies; merging an empty one is a no-op
+    copy = RunningStats().merge(merged)
+    assert copy.to_dict() == merged.to_dict()
+    assert merged.merge(RunningStats()).to_dict() == copy.to_dict()
+
+
+def test_aggregators_merge_per_day_partials():
+    readings = _readings(3000)
+    days = [StreamingAggregator().update(readings[i:i + 1000]) for i in range(0, 3000, 1000)]
+    merged = StreamingAggregator()
+    for day in days:
+        merged.merge(day)
+    whole = StreamingAggregator().update(readings)
+
+    assert merged.readings == whole.readings
+    for field in whole.fields:
+        a, b = merged.stats[field], whole.stats[field]
+        assert (a.count, a.min, a.max) == (b.count, b.min, b.max)
+        assert a.mean == pytest.approx(b.mean, rel=1e-12)
+        assert a.variance == pytest.approx(b.variance, rel=1e-9)
+
+
+def test_serialize_restore_round_trip(tmp_path):
+    readings = _readings(2000)
+    agg = StreamingAggregator().update(readings[:1200])
+
+    assert StreamingAggregator.from_dict(agg.to_dict()).to_dict() == agg.to_dict()
+
+    path = str(tmp_path / 'state' / 'aggregate.json')
+    agg.save(path)
+    restored = StreamingAggregator.load(path)
+    assert restored.to_dict() == agg.to_dict()
+    assert not os.path.exists(path + '.tmp')
+
+    # A restored aggregate carries on exactly as if it had never been saved
+    restored.update(readings[1200:])
+    agg.update(readings[1200:])
+    assert restored.to_dict() == agg.to_dict()
+
+
+def test_restore_from_pi_summary_and_version_check():
+    stats = RunningStats.from_dict({'count': 5, 'mean': 2.0, 'variance': 0.5, 'min': 1.0, 'max': 3.0})
+    assert stats.m2 == pytest.approx(2.0)
+    assert stats.total == pytest.approx(10.0)
+    assert stats.variance == pytest.approx(0.5)
+
+    with pytest.raises(ValueError):
+        StreamingAggregator.from_dict({'version': StreamingAggregator.VERSION + 1, 'fields': {}})
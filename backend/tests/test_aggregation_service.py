@@ -0,0 +1,117 @@
+from datetime import datetime, time
+
+import pytest
+
+from services import aggregation_service as agg_module
+from services.aggregation_service import AggregationService
+from services.rolling_aggregates import DailyAggregateStore, window_start
+
+
+class _Response:
+    def __init__(self, data):
+        self.data = data
+
+
+class _Query:
+    def __init__(self, client):
+        self.client = client
+        self.since = None
+
+    def select(self, *args):
+        return self
+
+    def eq(self, *args):
+        return self
+
+    def gte(self, column, value):
+        self.since = value
+        return self
+
+    def order(self, *args):
+        return self
+
+    def range(self, *args):
+        return self
+
+    def execute(self):
+        self.client.fetched_since.append(self.since)
+        return _Response([r for r in self.client.rows if r['timestamp'] >= self.since])
+
+
+class _Rpc:
+    def __init__(self, client, params):
+        self.client = client
+        self.params = params
+
+    def execute(self):
+        self.client.rpc_params.append(self.params)
+        if not self.client.pushdown:
+            raise RuntimeError('function sensor_window_stats does not exist')
+        return _Response([{'device_id': 'pi_01', 'avg_temp': 30.0, 'total_rain': 0}])
+
+
+class _Client:
+    def __init__(self, rows, pushdown):
+        self.rows = rows
+        self.pushdown = pushdown
+        self.fetched_since = []
+        self.rpc_params = []
+
+    def table(self, name):
+        return _Query(self)
+
+    def rpc(self, name, params):
+        return _Rpc(self, params)
+
+
+def _reading(timestamp, temperature):
+    row = dict.fromkeys(agg_module.READING_COLUMNS.split(', '))
+    row.update(timestamp=timestamp, temperature=temperature)
+    return row
+
+
+def _rows():
+    return [
+        # The day before the window, the window's first midnight and now
+        _reading(datetime.combine(window_start(31), time.min).isoformat(), 99.0),
+        _reading(datetime.combine(window_start(30), time.min).isoformat(), 20.0),
+        _reading(datetime.now().replace(microsecond=0).isoformat(), 30.0),
+    ]
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = DailyAggregateStore()
+    monkeypatch.setattr(agg_module, 'daily_store', store)
+    return store
+
+
+def test_pushdown_and_rebuild_share_the_window(monkeypatch, store):
+    client = _Client(_rows(), pushdown=True)
+    monkeypatch.setattr(agg_module, 'supabase', client)
+    service = AggregationService()
+
+    assert service.device_average('pi_01')['temperature'] == 30.0
+    assert client.rpc_params[-1]['p_since'] == window_start(30).isoformat()
+
+    service.device_average('pi_01', rebuild=True)
+    assert client.fetched_since == [window_start(30).isoformat()]
+    # Seeded buckets do not shadow the pushdown while it is available
+    assert store.is_seeded('pi_01')
+    service.device_average('pi_01')
+    assert len(client.rpc_params) == 2
+
+
+def test_buckets_seed_and_serve_without_pushdown(monkeypatch, store):
+    client = _Client(_rows(), pushdown=False)
+    monkeypatch.setattr(agg_module, 'supabase', client)
+    service = AggregationService()
+
+    first = service.device_average('pi_01')
+    assert first['temperature'] == 25.0
+    assert store.is_seeded('pi_01')
+
+    # The RPC is in its retry cooldown, so the seeded buckets answer without a fetch
+    assert service.device_average('pi_01') == first
+    assert len(client.fetched_since) == 1
+    assert len(client.rpc_params) == 1
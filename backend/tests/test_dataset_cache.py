@@ -0,0 +1,81 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ml import dataset_cache
+from ml.dataset_cache import load_cache, read_csv_cached, to_float64
+
+DATASET = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'mitti_mitra_master_dataset_all_india.csv')
+
+
+def _write_csv(path, n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({'id': np.arange(n), 'count': rng.integers(-5, 5, n)})
+    for decimals in range(7):
+        # Up to the largest magnitude float32 can still round-trip at this precision
+        limit = 2 ** 23 / 10 ** decimals
+        df[f'd{decimals}'] = np.round(rng.uniform(-limit, limit, n), decimals)
+    df['tiny'] = rng.uniform(0, 1e-3, n)          # too many decimals: stays float64
+    df['huge'] = np.round(rng.uniform(1e7, 1e9, n), 2)  # too large for float32
+    df['sums'] = 0.1 + rng.integers(0, 100, n) * 0.2  # binary noise like 0.30000000000000004
+    df.loc[::7, 'd2'] = np.nan
+    df['state'] = rng.choice(['Bihar', 'Kerala', 'Tamil Nadu'], n)
+    df.loc[::11, 'state'] = None
+    df.to_csv(path, index=False)
+    return path
+
+
+def _strings(values):
+    return [None if pd.isna(v) else str(v) for v in values]
+
+
+def _assert_identical(cached, expected):
+    assert list(cached.columns) == list(expected.columns)
+    for column in expected.columns:
+        want = expected[column]
+        got = cached[column]
+        if pd.api.types.is_numeric_dtype(want):
+            assert got.dtype == want.dtype, column
+            # Bit for bit, NaNs included
+            assert got.to_numpy().tobytes() == want.to_numpy().tobytes(), column
+        else:
+            assert _strings(got) == _strings(want), column
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(dataset_cache, 'ENABLED', True)
+    return str(tmp_path / 'cache')
+
+
+@pytest.mark.parametrize('mmap', [True, False])
+def test_round_trip_is_bit_identical_to_read_csv(tmp_path, cache_dir, mmap):
+    csv_path = _write_csv(str(tmp_path / 'readings.csv'))
+    expected = pd.read_csv(csv_path)
+
+    first = read_csv_cached(csv_path, cache_dir, mmap=mmap)   # parses and writes the entry
+    second = read_csv_cached(csv_path, cache_dir, mmap=mmap)  # served from the entry
+    _assert_identical(to_float64(first), expected)
+    _assert_identical(to_float64(second), expected)
+
+    # The lossless columns really are stored narrower
+    assert second['d0'].dtype == np.float32 and second['d6'].dtype == np.float32
+    assert second['tiny'].dtype == np.float64 and second['huge'].dtype == np.float64
+    assert second['id'].dtype == np.int64
+
+
+def test_changed_source_replaces_its_entry(tmp_path, cache_dir):
+    csv_path = _write_csv(str(tmp_path / 'readings.csv'))
+    read_csv_cached(csv_path, cache_dir)
+    _write_csv(csv_path, seed=1)
+    _assert_identical(to_float64(read_csv_cached(csv_path, cache_dir)), pd.read_csv(csv_path))
+    entries = [name for name in os.listdir(cache_dir) if name.endswith('.npz')]
+    assert len(entries) == 1
+    _assert_identical(to_float64(load_cache(os.path.join(cache_dir, entries[0]))), pd.read_csv(csv_path))
+
+
+@pytest.mark.skipif(not os.path.exists(DATASET), reason='dataset not checked out')
+def test_training_dataset_round_trip(cache_dir):
+    _assert_identical(to_float64(read_csv_cached(DATASET, cache_dir)), pd.read_csv(DATASET))
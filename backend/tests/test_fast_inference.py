@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from sklearn.datasets import make_classification
+from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+from sklearn.naive_bayes import GaussianNB
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import SVC
+from sklearn.tree import DecisionTreeClassifier
+
+from ml import fast_inference
+
+ATOL = fast_inference.DEFAULT_ATOL
+
+
+@pytest.fixture(scope='module')
+def data():
+    X, y = make_classification(n_samples=400, n_features=7, n_informative=5, n_classes=4,
+                               n_clusters_per_class=1, random_state=0)
+    # Raw sensor-like scales, so the folded-in scaler matters
+    X = X * [20, 15, 30, 0.5, 5, 80, 10] + [80, 40, 45, 6.5, 27, 150, 65]
+    labels = np.array(['cotton', 'maize', 'rice', 'wheat'])[y]
+    return X, labels
+
+
+MODELS = {
+    'gaussian_nb': lambda: GaussianNB(),
+    'svc_rbf': lambda: SVC(probability=True, random_state=0),
+    'svc_linear': lambda: SVC(kernel='linear', probability=True, random_state=0),
+    'svc_poly': lambda: SVC(kernel='poly', degree=3, probability=True, random_state=0),
+    'random_forest': lambda: RandomForestClassifier(n_estimators=30, max_depth=8, random_state=0),
+    'extra_trees': lambda: ExtraTreesClassifier(n_estimators=20, random_state=0),
+    'decision_tree': lambda: DecisionTreeClassifier(max_depth=6, random_state=0),
+}
+
+
+@pytest.mark.parametrize('name', sorted(MODELS))
+@pytest.mark.parametrize('scaled', [True, False])
+def test_predict_proba_matches_sklearn(data, name, scaled):
+    X, y = data
+    scaler = StandardScaler().fit(X) if scaled else None
+    model = MODELS[name]().fit(scaler.transform(X) if scaled else X, y)
+
+    compiled = fast_inference.compile_model(model, scaler)
+    rng = np.random.default_rng(1)
+    rows = np.vstack([X[:50], fast_inference.sample_inputs(model, scaler), rng.normal(X.mean(0), X.std(0), (50, 7))])
+    expected = model.predict_proba(scaler.transform(rows) if scaled else rows)
+
+    np.testing.assert_array_equal(compiled.classes_, model.classes_)
+    np.testing.assert_allclose(compiled.predict_proba(rows), expected, rtol=0, atol=ATOL)
+    np.testing.assert_array_equal(compiled.predict(rows), model.classes_[np.argmax(expected, axis=1)])
+    assert fast_inference.compile_validated(model, scaler) is not None
+
+
+def test_single_row_and_unsupported_models(data):
+    X, y = data
+    model = RandomForestClassifier(n_estimators=10, random_state=0).fit(X, y)
+    compiled = fast_inference.compile_model(model)
+    np.testing.assert_allclose(compiled.predict_proba(X[0]), model.predict_proba(X[:1]), atol=ATOL)
+
+    assert fast_inference.compile_validated(SVC().fit(X, y)) is None  # no probability=True
+    with pytest.raises(ValueError):
+        fast_inference.compile_model(object())
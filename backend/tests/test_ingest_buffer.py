@@ -0,0 +1,138 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from services.ingest_buffer import IngestBuffer, is_rejection
+
+
+class _APIError(Exception):
+    """Stand-in for postgrest's APIError, which carries the SQLSTATE in ``code``."""
+
+    def __init__(self, message, code):
+        super().__init__(message)
+        self.code = code
+
+
+class _Client:
+    """Records inserted rows; ``reject`` maps a reading id to the error its insert raises."""
+
+    def __init__(self, reject=None, down=False):
+        self.reject = reject or {}
+        self.down = down
+        self.rows = []
+        self.lock = threading.Lock()
+
+    def table(self, name):
+        return self
+
+    def insert(self, rows):
+        self._pending = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def execute(self):
+        rows = self._pending
+        if self.down:
+            raise _APIError('could not connect to server', '08006')
+        for row in rows:
+            if row['id'] in self.reject:
+                raise self.reject[row['id']]
+        with self.lock:
+            self.rows.extend(rows)
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def _crash(buffer):
+    """Drop a buffer without flushing, as a killed process would (releases its lock)."""
+    with buffer._lock:
+        buffer._queue.clear()  # its idle worker thread has nothing left to flush
+    buffer._journal.close()
+    buffer._slot_lock.close()
+
+
+def test_is_rejection():
+    assert is_rejection(_APIError('bad number', '22P02'))
+    assert is_rejection(_APIError('duplicate key', '23505'))
+    assert is_rejection(_APIError('no such column', '42703'))
+    assert not is_rejection(_APIError('connection failure', '08006'))
+    assert not is_rejection(_APIError('jwt expired', 'PGRST301'))
+    assert not is_rejection(ConnectionError('reset by peer'))
+
+
+def test_replays_unacked_records_after_a_crash(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    crashed = IngestBuffer(path, client=_Client(), flush_interval=60, fsync=False)
+    for i in range(4):
+        crashed.append({'id': i})
+    _crash(crashed)
+
+    # The first reading was acked before the crash, and the last line was torn mid-write
+    with open(path + '.ack', 'w') as f:
+        f.write('1')
+    with open(path, 'a') as f:
+        f.write('{"seq": 5, "rec')
+
+    client = _Client()
+    buffer = IngestBuffer(path, client=client, flush_interval=0.01, fsync=False)
+    buffer.start()
+    assert _wait_for(lambda: len(client.rows) == 3)
+    assert [row['id'] for row in client.rows] == [1, 2, 3]
+
+    # Sequence numbers carry on after the replayed ones, and the drained journal is truncated
+    assert buffer.append({'id': 4}) == 5
+    assert _wait_for(lambda: len(client.rows) == 4)
+    assert _wait_for(lambda: os.path.getsize(path) == 0)
+    buffer.stop()
+
+
+def test_dead_letters_only_rejected_records(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    client = _Client(reject={1: _APIError('invalid input syntax for type numeric', '22P02')})
+    buffer = IngestBuffer(path, client=client, flush_interval=0.01, max_backoff=0.01, fsync=False, split_after=1)
+    for i in range(3):
+        buffer.append({'id': i})
+
+    assert _wait_for(lambda: len(client.rows) == 2)
+    assert [row['id'] for row in client.rows] == [0, 2]
+    with open(path + '.dead') as f:
+        dead = [json.loads(line) for line in f]
+    assert [entry['record']['id'] for entry in dead] == [1]
+    assert 'invalid input syntax' in dead[0]['error']
+    stats = buffer.stats()
+    assert stats['dead_lettered'] == 1 and stats['flushed'] == 2 and stats['queue_depth'] == 0
+    buffer.stop()
+
+
+def test_transient_errors_are_retried_not_dead_lettered(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    client = _Client(down=True)
+    buffer = IngestBuffer(path, client=client, flush_interval=0.01, max_backoff=0.02, fsync=False, split_after=1)
+    buffer.append({'id': 0})
+    buffer.append({'id': 1})
+
+    assert _wait_for(lambda: buffer.stats()['flush_failures'] >= 3)
+    assert buffer.stats()['queue_depth'] == 2
+    client.down = False
+    assert _wait_for(lambda: len(client.rows) == 2)
+    assert not os.path.exists(path + '.dead')
+    buffer.stop()
+
+
+@pytest.mark.parametrize('slots', [1, 3])
+def test_stats_report_the_claimed_journal(tmp_path, slots):
+    path = str(tmp_path / 'journal.jsonl')
+    buffer = IngestBuffer(path, client=_Client(), flush_interval=0.01, fsync=False, slots=slots)
+    buffer.start()
+    expected = path if slots == 1 else str(tmp_path / 'journal.0.jsonl')
+    assert buffer.stats()['journal_path'] == expected
+    buffer.stop()
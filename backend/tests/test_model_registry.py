@@ -0,0 +1,83 @@
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+
+from ml import fast_inference
+from ml.model_registry import ARTIFACTS, EXPORTS, ModelLoadError, ModelRegistry, write_manifest
+from ml.preprocess import build_preprocessor
+
+NUMERIC = ['soil_n', 'soil_ph', 'humidity']
+CATEGORICAL = ['state']
+
+
+def _frame(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'soil_n': rng.uniform(40, 120, n), 'soil_ph': rng.uniform(5.5, 8.0, n),
+        'humidity': rng.uniform(40, 85, n), 'state': rng.choice(['Bihar', 'Kerala', 'Punjab'], n),
+    })
+    df['crop'] = np.where(df['soil_n'] > 80, 'Rice', np.where(df['humidity'] > 60, 'Maize', 'Wheat'))
+    df['yield'] = df['soil_n'] / 40 + rng.normal(0, 0.1, n)
+    return df
+
+
+def _train(model_dir, seed=0):
+    """A complete model set with an npz export and a manifest, like train_models writes."""
+    df = _frame(seed=seed)
+    preproc_clf = build_preprocessor(NUMERIC, CATEGORICAL)
+    clf = RandomForestClassifier(n_estimators=10, random_state=seed).fit(preproc_clf.fit_transform(df), df['crop'])
+    preproc_reg = build_preprocessor(NUMERIC, CATEGORICAL + ['crop'])
+    reg = RandomForestRegressor(n_estimators=10, random_state=seed).fit(preproc_reg.fit_transform(df), df['yield'])
+
+    os.makedirs(model_dir, exist_ok=True)
+    for name, artifact in [('preproc_clf', preproc_clf), ('preproc_reg', preproc_reg),
+                           ('rf_model', clf), ('reg_model', reg)]:
+        joblib.dump(artifact, os.path.join(model_dir, ARTIFACTS[name]))
+    fast_inference.save_npz(fast_inference.compile_validated(clf), os.path.join(model_dir, EXPORTS['rf_model']))
+    write_manifest(model_dir, version=f'v{seed}')
+    return clf, preproc_clf.transform(df)
+
+
+@pytest.mark.parametrize('mmap', [True, False])
+def test_npz_export_round_trip(tmp_path, mmap):
+    clf, X = _train(str(tmp_path))
+    loaded = fast_inference.load_npz(str(tmp_path / EXPORTS['rf_model']), mmap=mmap)
+    np.testing.assert_array_equal(loaded.classes_, clf.classes_)
+    np.testing.assert_allclose(loaded.predict_proba(X), clf.predict_proba(X), atol=fast_inference.DEFAULT_ATOL)
+
+
+def test_registry_serves_the_export(tmp_path):
+    _train(str(tmp_path))
+    models = ModelRegistry(str(tmp_path)).load()
+    assert models.complete and models.version == 'v0'
+    assert models.fast_clf is models.rf_model
+    assert models.describe()['artifacts']['rf_model']['file'] == EXPORTS['rf_model']
+
+
+@pytest.mark.parametrize('artifact', ['rf_model.npz', 'reg_model'])
+def test_checksum_mismatch_keeps_the_current_set(tmp_path, artifact):
+    model_dir = str(tmp_path)
+    _train(model_dir)
+    registry = ModelRegistry(model_dir)
+    served = registry.load()
+
+    # Files of a new training run land before its manifest does
+    retrain = str(tmp_path / 'next')
+    _train(retrain, seed=1)
+    filename = EXPORTS['rf_model'] if artifact == 'rf_model.npz' else ARTIFACTS[artifact]
+    os.replace(os.path.join(retrain, filename), os.path.join(model_dir, filename))
+
+    with pytest.raises(ModelLoadError, match='does not match the manifest'):
+        registry.load()
+    assert registry.peek() is served
+    assert registry.current() is served
+    assert 'does not match the manifest' in registry.describe()['last_error']
+
+    # Once the manifest is rewritten the new file is accepted
+    write_manifest(model_dir, version='v1')
+    assert registry.load().version == 'v1'
+    assert registry.describe()['last_error'] is None
@@ -0,0 +1,80 @@
+import os
+
+import numpy as np
+import pytest
+from sklearn.datasets import make_classification
+from sklearn.naive_bayes import GaussianNB
+from sklearn.tree import DecisionTreeClassifier
+
+from ml.train import fit_final, select_model
+
+CANDIDATES = {
+    'Tree': (DecisionTreeClassifier, {'max_depth': 4, 'random_state': 0}),
+    'Naive Bayes': (GaussianNB, {}),
+}
+
+
+class _Broken:
+    def __init__(self, **params):
+        pass
+
+    def fit(self, X, y):
+        raise ValueError('cannot fit')
+
+
+@pytest.fixture(scope='module')
+def data():
+    X, y = make_classification(n_samples=200, n_features=6, n_informative=4, n_classes=3, random_state=0)
+    return X, y
+
+
+def _scores(report):
+    return {name: entry['scores'] for name, entry in report.items()}
+
+
+def test_parallel_matches_serial(data):
+    X, y = data
+    serial = select_model(X, y, CANDIDATES, n_folds=3, max_workers=1)
+    parallel = select_model(X, y, CANDIDATES, n_folds=3, max_workers=2)
+    assert _scores(serial) == _scores(parallel)
+    assert all(entry['error'] is None and entry['mean'] is not None for entry in serial.values())
+
+
+def test_rerun_reuses_cached_folds(tmp_path, data):
+    X, y = data
+    cache_dir = str(tmp_path)
+    first = select_model(X, y, CANDIDATES, n_folds=3, cache_dir=cache_dir, max_workers=1)
+    second = select_model(X, y, CANDIDATES, n_folds=3, cache_dir=cache_dir, max_workers=1)
+    assert _scores(first) == _scores(second)
+    assert all(entry['cached_folds'] == 0 for entry in first.values())
+    assert all(entry['cached_folds'] == 3 for entry in second.values())
+
+    # Changed params or data are different cache keys
+    tweaked = dict(CANDIDATES, Tree=(DecisionTreeClassifier, {'max_depth': 5, 'random_state': 0}))
+    third = select_model(X, y, tweaked, n_folds=3, cache_dir=cache_dir, max_workers=1)
+    assert third['Tree']['cached_folds'] == 0 and third['Naive Bayes']['cached_folds'] == 3
+    fourth = select_model(X[::-1].copy(), y[::-1].copy(), CANDIDATES, n_folds=3, cache_dir=cache_dir, max_workers=1)
+    assert all(entry['cached_folds'] == 0 for entry in fourth.values())
+
+    # A corrupt entry is refitted, not fatal
+    for name in os.listdir(cache_dir):
+        with open(os.path.join(cache_dir, name), 'wb') as f:
+            f.write(b'not a pickle')
+    again = select_model(X, y, CANDIDATES, n_folds=3, cache_dir=cache_dir, max_workers=1)
+    assert _scores(again) == _scores(first)
+
+
+def test_failing_candidate_is_reported_not_fatal(data):
+    X, y = data
+    report = select_model(X, y, dict(CANDIDATES, Broken=(_Broken, {})), n_folds=3, max_workers=1)
+    assert report['Broken']['mean'] is None
+    assert 'cannot fit' in report['Broken']['error']
+    assert report['Tree']['mean'] is not None
+
+
+def test_fit_final_is_cached(tmp_path, data):
+    X, y = data
+    first = fit_final('Tree', X, y, CANDIDATES, cache_dir=str(tmp_path))
+    second = fit_final('Tree', X, y, CANDIDATES, cache_dir=str(tmp_path))
+    assert not first['cached'] and second['cached']
+    np.testing.assert_array_equal(first['model'].predict(X), second['model'].predict(X))
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+
+from ml.preprocess import build_preprocessor
+from ml.yield_scorer import YieldScorer, crop_categories
+
+NUMERIC = ['soil_n', 'soil_ph', 'humidity']
+CATEGORICAL = ['state', 'crop_type', 'crop']
+CROPS = ['Cotton', 'Maize', 'Rice', 'Sugarcane', 'Wheat']
+
+
+@pytest.fixture(scope='module')
+def fitted():
+    rng = np.random.default_rng(0)
+    n = 600
+    df = pd.DataFrame({
+        'soil_n': rng.uniform(40, 120, n),
+        'soil_ph': rng.uniform(5.5, 8.0, n),
+        'humidity': rng.uniform(40, 85, n),
+        'state': rng.choice(['Bihar', 'Kerala', 'Punjab'], n),
+        'crop_type': rng.choice(['Agriculture', 'Horticulture'], n),
+        'crop': rng.choice(CROPS, n),
+    })
+    y = df['soil_n'] / 40 + (df['crop'] == 'Rice') * 2 + (df['crop'] == 'Wheat') + rng.normal(0, 0.1, n)
+    preprocessor = build_preprocessor(NUMERIC, CATEGORICAL)
+    model = RandomForestRegressor(n_estimators=20, random_state=0).fit(preprocessor.fit_transform(df), y)
+    return preprocessor, model
+
+
+ROWS = [
+    {'soil_n': 90.0, 'soil_ph': 6.5, 'humidity': 70.0, 'state': 'Bihar', 'crop_type': 'Agriculture'},
+    {'soil_n': 50.0, 'soil_ph': 7.5, 'humidity': 45.0, 'state': 'Punjab'},
+]
+
+
+def plain(preprocessor, model, rows, crops):
+    frame = pd.DataFrame([dict(row, crop=crop) for row in rows for crop in crops])
+    frame = frame.reindex(columns=list(preprocessor.feature_names_in_))
+    return model.predict(preprocessor.transform(frame)).reshape(len(rows), len(crops))
+
+
+def test_crop_categories_reads_the_encoder(fitted):
+    preprocessor, _ = fitted
+    assert crop_categories(preprocessor) == CROPS
+
+
+def test_score_matches_plain_path_for_every_training_crop(fitted):
+    preprocessor, model = fitted
+    # Seeded with a single classifier class, as with a partial classifier
+    scorer = YieldScorer(preprocessor, model, crops=['Rice'])
+
+    # One crop per call, so each call caches a crop block not seen before
+    for crop in CROPS:
+        got = scorer.score(ROWS, [[crop]] * len(ROWS))
+        np.testing.assert_allclose(np.array(got)[:, 0], plain(preprocessor, model, ROWS, [crop])[:, 0])
+
+    got = scorer.score(ROWS, [CROPS] * len(ROWS))
+    np.testing.assert_allclose(np.array(got), plain(preprocessor, model, ROWS, CROPS))
+    assert scorer.stats()['enabled']
+
+
+def test_unknown_crop_matches_plain_path(fitted):
+    preprocessor, model = fitted
+    scorer = YieldScorer(preprocessor, model)
+    scorer.score(ROWS, [CROPS] * len(ROWS))
+
+    got = scorer.score(ROWS, [['Millet', 'Rice']] * len(ROWS))
+    np.testing.assert_allclose(np.array(got), plain(preprocessor, model, ROWS, ['Millet', 'Rice']))
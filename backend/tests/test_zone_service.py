@@ -0,0 +1,54 @@
+import os
+import threading
+
+import pandas as pd
+
+from ml.zone_mapper import ZoneMapper
+from services.zone_service import ZoneResolver
+
+DATASET = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'mitti_mitra_master_dataset_all_india.csv')
+
+
+class _Offline:
+    """Client whose queries block until released, then fail like an unreachable database."""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def table(self, name):
+        return self
+
+    def select(self, *args):
+        return self
+
+    def order(self, *args):
+        return self
+
+    def range(self, *args):
+        return self
+
+    def execute(self):
+        self.release.wait(5)
+        raise ConnectionError('database unavailable')
+
+
+def test_mapper_matches_dataset_zones():
+    df = pd.read_csv(DATASET, usecols=['state', 'agro_climatic_zone']).drop_duplicates()
+    mapper = ZoneMapper()
+    assert mapper.zones == set(df['agro_climatic_zone'])
+    for state, zone in df.values:
+        assert mapper.get_zone(state) == zone
+
+
+def test_fallback_only_returns_known_zones():
+    client = _Offline()
+    resolver = ZoneResolver(client=client)
+    resolver.mapper.state_zone_map['atlantis'] = 'Sunken Plains and Hills'
+
+    # preload_async must not block startup; resolves use the offline table meanwhile
+    assert resolver.preload_async()
+    assert not resolver.preload_async()
+    assert resolver.resolve('Andhra Pradesh') == 'Eastern Plateau & Hills'
+    assert resolver.resolve('Atlantis') is None
+    assert resolver.resolve('Nowhere') is None
+    client.release.set()
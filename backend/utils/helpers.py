@@ -1,5 +1,9 @@
+import hmac
+import os
 from datetime import datetime
 
+SENSOR_FIELDS = ['temperature', 'humidity', 'ph', 'nitrogen', 'phosphorus', 'potassium', 'rainfall']
+
 def format_timestamp(dt_obj):
     """
     Standardize timestamp formatting.
@@ -15,6 +19,11 @@ def validate_sensor_data(data):
     """
     if not isinstance(data, dict):
         return False, "Invalid data format"
+
+    for field in SENSOR_FIELDS:
+        value = data.get(field)
+        if value is not None and (not isinstance(value, (int, float)) or isinstance(value, bool)):
+            return False, f"{field} must be a number"
         
     ph = data.get('ph')
     if ph is not None and (ph < 0 or ph > 14):
@@ -24,4 +33,26 @@ def validate_sensor_data(data):
     if hum is not None and (hum < 0 or hum > 100):
         return False, "Humidity out of range (0-100)"
         
+    count = data.get('sample_count')
+    if count is not None and (not isinstance(count, int) or isinstance(count, bool) or count < 1):
+        return False, "sample_count must be a positive integer"
+
+    stats = data.get('stats')
+    if stats is not None and not isinstance(stats, dict):
+        return False, "stats must be an object"
+        
     return True, "Valid"
+
+ADMIN_TOKEN_VARS = ['ADMIN_TOKEN', 'MODEL_ADMIN_TOKEN']  # MODEL_ADMIN_TOKEN: older name
+
+def check_admin_token(headers):
+    """
+    Checks the X-Admin-Token header against the ADMIN_TOKEN (or the older
+    MODEL_ADMIN_TOKEN) environment variable, in constant time.
+    Returns False when no token is configured.
+    """
+    supplied = headers.get('X-Admin-Token')
+    if not supplied:
+        return False
+    tokens = [os.getenv(name) for name in ADMIN_TOKEN_VARS]
+    return any(token and hmac.compare_digest(supplied.encode(), token.encode()) for token in tokens)
@@ -0,0 +1,168 @@
+"""
+Structured logging for the backend.
+
+``configure_logging()`` (called once by create_app) routes every logger
+through a bounded in-memory queue; a background QueueListener formats and
+writes the records, so request threads never wait on log I/O. When the
+queue is full, records are dropped and counted rather than blocking.
+
+Environment:
+  LOG_LEVEL    root level (default INFO)
+  LOG_LEVELS   per-module levels, e.g. "api.sensor_data=DEBUG,ml=WARNING"
+  LOG_FORMAT   "json" (default) or "text"
+
+High-frequency events can be sampled: pass ``extra={'sample_rate': 0.01}``
+to keep roughly one record in a hundred (per logger and message); kept
+records carry the rate so counts can be scaled back up.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import traceback
+from datetime import datetime, timezone
+
+QUEUE_SIZE = 10000
+
+# Attributes every LogRecord has; anything else was passed through ``extra``
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener = None
+_handler = None
+_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, extra fields, exception."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        elif record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps one record in every ``1 / sample_rate`` for records logged with a
+    ``sample_rate`` extra (counted per logger and message template).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        rate = getattr(record, 'sample_rate', None)
+        if rate is None or rate >= 1:
+            return True
+        if rate <= 0:
+            return False
+        every = max(int(round(1.0 / rate)), 1)
+        key = (record.name, record.msg)
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        return count % every == 0
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Resolve the message and traceback on the caller's thread, keep the
+        # record's extra fields, and drop references to unpicklable objects
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = ''.join(traceback.format_exception(*record.exc_info)).rstrip()
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _parse_levels(spec):
+    levels = {}
+    for item in (spec or '').split(','):
+        if '=' in item:
+            name, level = item.split('=', 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(level=None, module_levels=None, fmt=None, stream=None):
+    """
+    Install the queue-based handler on the root logger (idempotent).
+
+    Arguments override the LOG_LEVEL / LOG_LEVELS / LOG_FORMAT environment variables.
+    """
+    global _listener, _handler
+    with _lock:
+        if _listener is not None:
+            return _handler
+
+        level = (level or os.getenv('LOG_LEVEL', 'INFO')).upper()
+        module_levels = module_levels if module_levels is not None else _parse_levels(os.getenv('LOG_LEVELS'))
+        fmt = (fmt or os.getenv('LOG_FORMAT', 'json')).lower()
+
+        output = logging.StreamHandler(stream or sys.stderr)
+        if fmt == 'json':
+            output.setFormatter(JsonFormatter())
+        else:
+            output.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+
+        log_queue = queue.Queue(maxsize=QUEUE_SIZE)
+        _handler = NonBlockingQueueHandler(log_queue)
+        _handler.addFilter(SamplingFilter())
+
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(_handler)
+        root.setLevel(level)
+        for name, module_level in module_levels.items():
+            logging.getLogger(name).setLevel(module_level)
+
+        _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+        return _handler
+
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def logging_stats():
+    """Records dropped because the log queue was full."""
+    return {'dropped': _handler.dropped if _handler is not None else 0}
@@ -0,0 +1,218 @@
+"""
+Request latency instrumentation, exported in Prometheus text format.
+
+``init_app(app)`` times every request and serves ``GET /metrics``;
+``span('stage')`` times a named stage (zone enrichment, classification,
+Supabase calls, ...) inside a request. Both feed histograms labelled with
+the Flask endpoint, so per-stage p99s can be graphed and alerted on.
+Work done outside a request (e.g. the ingest flusher) is labelled
+``background``.
+
+Point-in-time values such as model load time and cache hit rates are
+pulled from collectors registered with ``register_collector`` (caches
+with ``register_cache``) when /metrics is scraped. Standard library only: the text format is simple
+enough not to need prometheus_client.
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, has_request_context, request
+
+# Seconds; spans from well under a millisecond (fertilizer rules) to
+# multi-second Supabase round trips
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+BACKGROUND = 'background'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + '}'
+
+
+def _format_value(value):
+    if value is None:
+        return 'NaN'
+    if isinstance(value, float) and math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram keyed by a fixed tuple of label names."""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            snapshot = sorted((k, list(v)) for k, v in self._series.items())
+        for labelvalues, series in snapshot:
+            labels = dict(zip(self.labelnames, labelvalues))
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_format_labels({**labels, "le": repr(bound)})} {cumulative}')
+            lines.append(f'{self.name}_bucket{_format_labels({**labels, "le": "+Inf"})} {series[-1]}')
+            lines.append(f'{self.name}_sum{_format_labels(labels)} {_format_value(series[-2])}')
+            lines.append(f'{self.name}_count{_format_labels(labels)} {series[-1]}')
+        return lines
+
+
+class Registry:
+    """Histograms plus scrape-time collectors, rendered together on /metrics."""
+
+    def __init__(self):
+        self.histograms = []
+        self.collectors = []
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        hist = Histogram(name, documentation, labelnames, buckets)
+        self.histograms.append(hist)
+        return hist
+
+    def register_collector(self, collector):
+        """
+        Add a callable run on every scrape.
+
+        It returns an iterable of ``(name, type, help, samples)`` tuples, where
+        type is ``gauge`` or ``counter`` and samples is a list of
+        ``(labels_dict, value)`` pairs. A failing collector is skipped.
+        """
+        self.collectors.append(collector)
+        return collector
+
+    def render(self):
+        lines = []
+        for hist in self.histograms:
+            lines.extend(hist.render())
+        for collector in self.collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                lines.append(f'# collector {getattr(collector, "__name__", collector)} failed: {_escape(e)}')
+                continue
+            for name, kind, documentation, samples in families:
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUEST_LATENCY = REGISTRY.histogram(
+    'mitti_http_request_duration_seconds',
+    'Time spent handling a request, by endpoint, method and status.',
+    ('endpoint', 'method', 'status'),
+)
+STAGE_LATENCY = REGISTRY.histogram(
+    'mitti_stage_duration_seconds',
+    'Time spent in a named stage, by endpoint and stage.',
+    ('endpoint', 'stage'),
+)
+
+register_collector = REGISTRY.register_collector
+
+
+def current_endpoint():
+    """Flask endpoint of the active request, or ``background`` outside one."""
+    if has_request_context():
+        return request.endpoint or 'unmatched'
+    return BACKGROUND
+
+
+@contextmanager
+def span(stage):
+    """Time the enclosed block as ``stage`` of the current endpoint."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - start, current_endpoint(), stage)
+
+
+_caches = {}
+
+
+def register_cache(name, stats):
+    """
+    Export a cache's hit/miss counters as ``cache="<name>"`` series.
+
+    ``stats`` is a callable returning a TTLCache.stats()-shaped dict (hits,
+    misses, hit_rate, size), or None while the cache does not exist.
+    """
+    _caches[name] = stats
+
+
+@register_collector
+def _cache_metrics():
+    caches = {}
+    for name, stats in list(_caches.items()):
+        try:
+            caches[name] = stats()
+        except Exception:
+            continue
+    caches = {name: s for name, s in caches.items() if s is not None}
+    return [
+        ('mitti_cache_hits_total', 'counter', 'Cache hits.',
+         [({'cache': name}, s.get('hits', 0)) for name, s in caches.items()]),
+        ('mitti_cache_misses_total', 'counter', 'Cache misses.',
+         [({'cache': name}, s.get('misses', 0)) for name, s in caches.items()]),
+        ('mitti_cache_hit_ratio', 'gauge', 'Hits / (hits + misses) since start.',
+         [({'cache': name}, s.get('hit_rate')) for name, s in caches.items()]),
+        ('mitti_cache_entries', 'gauge', 'Entries currently cached.',
+         [({'cache': name}, s.get('size', 0)) for name, s in caches.items()]),
+    ]
+
+
+def metrics_view():
+    return Response(REGISTRY.render(), mimetype=None, content_type=CONTENT_TYPE)
+
+
+def init_app(app, path='/metrics'):
+    """Time every request of ``app`` and serve the registry at ``path``."""
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            REQUEST_LATENCY.observe(time.perf_counter() - start, current_endpoint(),
+                                    request.method, str(response.status_code))
+        return response
+
+    app.add_url_rule(path, 'metrics', metrics_view, methods=['GET'])
@@ -21,17 +21,120 @@ CREATE TABLE IF NOT EXISTS sensor_readings (
     potassium NUMERIC(6, 2)    -- mg/kg
 );
 
+-- Pi edge aggregation: a row may summarise a window of samples. Values are then
+-- window means (rainfall the window total), sample_count the number of samples
+-- and stats the per-field count/mean/variance/min/max/rejected. Aggregates weight
+-- rows by sample_count so windows of different sizes merge correctly.
+ALTER TABLE sensor_readings ADD COLUMN IF NOT EXISTS sample_count INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE sensor_readings ADD COLUMN IF NOT EXISTS stats JSONB;
+
 -- Index for faster time-based queries (e.g., getting latest reading)
 CREATE INDEX IF NOT EXISTS idx_sensor_readings_timestamp ON sensor_readings (timestamp DESC);
 
+-- Registered field devices (used by fleet reports to select devices by region)
+CREATE TABLE IF NOT EXISTS devices (
+    device_id TEXT PRIMARY KEY,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    state TEXT,
+    district TEXT,
+    region TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_devices_region ON devices (region);
+
+-- Device + time lookups used by reports
+CREATE INDEX IF NOT EXISTS idx_sensor_readings_device_timestamp ON sensor_readings (device_id, timestamp DESC);
+
 -- Optional: Create a view for daily averages (if not handled by code)
-CREATE OR REPLACE VIEW daily_averages AS
+-- Per device and day; includes NPK and reading counts so days can be re-combined.
+DROP VIEW IF EXISTS daily_averages;
+CREATE VIEW daily_averages AS
 SELECT 
+    device_id,
     date_trunc('day', timestamp) as day,
-    AVG(temperature) as avg_temp,
-    AVG(humidity) as avg_humidity,
-    AVG(ph) as avg_ph,
+    SUM(sample_count) as readings,
+    SUM(temperature * sample_count) / NULLIF(SUM(sample_count) FILTER (WHERE temperature IS NOT NULL), 0) as avg_temp,
+    SUM(humidity * sample_count) / NULLIF(SUM(sample_count) FILTER (WHERE humidity IS NOT NULL), 0) as avg_humidity,
+    SUM(ph * sample_count) / NULLIF(SUM(sample_count) FILTER (WHERE ph IS NOT NULL), 0) as avg_ph,
+    SUM(nitrogen * sample_count) / NULLIF(SUM(sample_count) FILTER (WHERE nitrogen IS NOT NULL), 0) as avg_n,
+    SUM(phosphorus * sample_count) / NULLIF(SUM(sample_count) FILTER (WHERE phosphorus IS NOT NULL), 0) as avg_p,
+    SUM(potassium * sample_count) / NULLIF(SUM(sample_count) FILTER (WHERE potassium IS NOT NULL), 0) as avg_k,
     SUM(rainfall) as total_rain
 FROM sensor_readings
-GROUP BY 1
-ORDER BY 1 DESC;
+GROUP BY 1, 2
+ORDER BY 2 DESC;
+
+-- Window aggregates pushed down for AggregationService (called via supabase.rpc).
+-- Returns one row per device over the last p_days calendar days (today included),
+-- or from p_since when the caller passes its own window start; NULL p_device_ids
+-- means all devices. Rows are weighted by sample_count (Pi window summaries);
+-- readings counts samples.
+DROP FUNCTION IF EXISTS sensor_window_stats(TEXT[], INTEGER);
+CREATE OR REPLACE FUNCTION sensor_window_stats(p_device_ids TEXT[] DEFAULT NULL, p_days INTEGER DEFAULT 30,
+                                               p_since TIMESTAMPTZ DEFAULT NULL)
+RETURNS TABLE (
+    device_id TEXT,
+    readings BIGINT,
+    avg_temp NUMERIC,
+    avg_humidity NUMERIC,
+    avg_ph NUMERIC,
+    avg_n NUMERIC,
+    avg_p NUMERIC,
+    avg_k NUMERIC,
+    total_rain NUMERIC
+)
+LANGUAGE sql STABLE
+AS $$
+    SELECT
+        r.device_id,
+        SUM(r.sample_count),
+        SUM(r.temperature * r.sample_count) / NULLIF(SUM(r.sample_count) FILTER (WHERE r.temperature IS NOT NULL), 0),
+        SUM(r.humidity * r.sample_count) / NULLIF(SUM(r.sample_count) FILTER (WHERE r.humidity IS NOT NULL), 0),
+        SUM(r.ph * r.sample_count) / NULLIF(SUM(r.sample_count) FILTER (WHERE r.ph IS NOT NULL), 0),
+        SUM(r.nitrogen * r.sample_count) / NULLIF(SUM(r.sample_count) FILTER (WHERE r.nitrogen IS NOT NULL), 0),
+        SUM(r.phosphorus * r.sample_count) / NULLIF(SUM(r.sample_count) FILTER (WHERE r.phosphorus IS NOT NULL), 0),
+        SUM(r.potassium * r.sample_count) / NULLIF(SUM(r.sample_count) FILTER (WHERE r.potassium IS NOT NULL), 0),
+        COALESCE(SUM(r.rainfall), 0)
+    FROM sensor_readings r
+    WHERE r.timestamp >= COALESCE(p_since, CURRENT_DATE - (p_days - 1))
+      AND (p_device_ids IS NULL OR r.device_id = ANY(p_device_ids))
+    GROUP BY r.device_id;
+$$;
+
+-- Crop/yield records (data/mitti_mitra_master_dataset_all_india.csv) behind
+-- /api/data/records, /api/data/options and the zone table preload.
+-- `id` is the keyset cursor used for paging.
+CREATE TABLE IF NOT EXISTS mitti_mitra_data (
+    id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    state TEXT,
+    district TEXT,
+    agro_climatic_zone TEXT,
+    crop TEXT,
+    crop_type TEXT,
+    season TEXT,
+    soil_n NUMERIC(6, 2),
+    soil_p NUMERIC(6, 2),
+    soil_k NUMERIC(6, 2),
+    soil_ph NUMERIC(4, 2),
+    avg_temperature NUMERIC(5, 2),
+    avg_rainfall NUMERIC(7, 2),
+    humidity NUMERIC(5, 2),
+    area_hectare NUMERIC(10, 2),
+    yield_ton_per_hectare NUMERIC(7, 2)
+);
+
+-- Distinct form options (one row per field/value) for /api/data/options.
+-- Lets the backend fetch all dropdown values in one small query instead of
+-- scanning mitti_mitra_data.
+CREATE OR REPLACE VIEW mitti_mitra_options AS
+SELECT 'state' AS field, state AS value FROM mitti_mitra_data WHERE state IS NOT NULL GROUP BY state
+UNION ALL
+SELECT 'district', district FROM mitti_mitra_data WHERE district IS NOT NULL GROUP BY district
+UNION ALL
+SELECT 'agro_climatic_zone', agro_climatic_zone FROM mitti_mitra_data WHERE agro_climatic_zone IS NOT NULL GROUP BY agro_climatic_zone
+UNION ALL
+SELECT 'crop', crop FROM mitti_mitra_data WHERE crop IS NOT NULL GROUP BY crop
+UNION ALL
+SELECT 'crop_type', crop_type FROM mitti_mitra_data WHERE crop_type IS NOT NULL GROUP BY crop_type
+UNION ALL
+SELECT 'season', season FROM mitti_mitra_data WHERE season IS NOT NULL GROUP BY season;
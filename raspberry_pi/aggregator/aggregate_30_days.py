@@ -1,41 +1,258 @@
-import statistics
+import json
+import math
+import os
+
+# Fields to average
+MEAN_KEYS = ['temperature', 'humidity', 'ph', 'nitrogen', 'phosphorus', 'potassium']
+# Fields to sum
+SUM_KEYS = ['rainfall']
+# Readings buffered per field by StreamingAggregator.update before folding them in
+CHUNK_SIZE = 4096
+
+
+def _number(value):
+    """``value`` as a float, or None if it is missing, non-numeric or NaN."""
+    if value is None:
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) else value
+
+
+class RunningStats:
+    """
+    Count, mean, variance (Welford), sum, min and max of one field in O(1) memory.
+
+    Two instances merge exactly (Chan et al.'s parallel update), so partial
+    aggregates from different days, processes or devices can be combined.
+    """
+
+    __slots__ = ('count', 'mean', 'm2', 'total', 'min', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        count = self.count + 1
+        mean = self.mean
+        delta = value - mean
+        mean += delta / count
+        self.m2 += delta * (value - mean)
+        self.count = count
+        self.mean = mean
+        self.total += value
+        if count == 1:
+            self.min = self.max = value
+        elif value < self.min:
+            self.min = value
+        elif value > self.max:
+            self.max = value
+
+    def extend(self, values):
+        """
+        Fold a list of floats in one step: their count, sum, mean, m2, min and
+        max are computed with builtins and merged in, instead of one ``add``
+        per value.
+        """
+        if not values:
+            return self
+        batch = RunningStats()
+        batch.count = len(values)
+        batch.total = sum(values)
+        mean = batch.mean = batch.total / batch.count
+        batch.m2 = sum([(v - mean) * (v - mean) for v in values])
+        batch.min = min(values)
+        batch.max = max(values)
+        return self.merge(batch)
+
+    def merge(self, other):
+        if not other.count:
+            return self
+        if not self.count:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.total, self.min, self.max = other.total, other.min, other.max
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def variance(self):
+        """Sample variance (0.0 with fewer than two values)."""
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    def to_dict(self):
+        return {'count': self.count, 'mean': self.mean, 'm2': self.m2,
+                'total': self.total, 'min': self.min, 'max': self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.count = int(data.get('count', 0))
+        stats.mean = float(data.get('mean', 0.0))
+        stats.total = float(data.get('total', stats.mean * stats.count))
+        stats.min = data.get('min')
+        stats.max = data.get('max')
+        if 'm2' in data:
+            stats.m2 = float(data['m2'])
+        else:
+            # Summaries uploaded by the Pi carry the sample variance instead of m2
+            stats.m2 = float(data.get('variance', 0.0)) * max(stats.count - 1, 0)
+        return stats
+
+
+class StreamingAggregator:
+    """
+    Streaming replacement for building per-field lists of every reading.
+
+    Readings are folded in one at a time (``add``) or from any iterable
+    (``update``), keeping only a RunningStats per field, so 30 days of
+    minute-level readings never have to be in memory at once. Aggregators
+    can be merged (e.g. one per day) and saved to / loaded from a JSON file.
+    Standard library only, so the same module runs on the Pi and the backend.
+    """
+
+    VERSION = 1
+
+    def __init__(self, fields=None):
+        self.fields = list(fields or MEAN_KEYS + SUM_KEYS)
+        self.readings = 0
+        self.stats = {field: RunningStats() for field in self.fields}
+
+    def add(self, reading):
+        """Fold one reading dict into the aggregate; None / non-numeric values are skipped."""
+        self.readings += 1
+        get = reading.get
+        stats = self.stats
+        for field in self.fields:
+            value = _number(get(field))
+            if value is not None:
+                stats[field].add(value)
+        return self
+
+    def update(self, readings):
+        """
+        Fold every reading of an iterable (list, generator, file reader...).
+
+        Values are buffered per field and folded in with ``RunningStats.extend``
+        every CHUNK_SIZE readings, so memory stays bounded by one chunk.
+        """
+        columns = [(field, []) for field in self.fields]
+        pending = 0
+        for reading in readings:
+            get = reading.get
+            for field, values in columns:
+                value = get(field)
+                if value is None:
+                    continue
+                if value.__class__ is not float:
+                    value = _number(value)
+                    if value is None:
+                        continue
+                elif value != value:  # NaN
+                    continue
+                values.append(value)
+            pending += 1
+            if pending == CHUNK_SIZE:
+                self._fold(columns, pending)
+                pending = 0
+        self._fold(columns, pending)
+        return self
+
+    def _fold(self, columns, readings):
+        self.readings += readings
+        for field, values in columns:
+            if values:
+                self.stats[field].extend(values)
+                values.clear()
+
+    def merge(self, other):
+        """Combine another aggregator into this one (fields are unioned)."""
+        self.readings += other.readings
+        for field, stats in other.stats.items():
+            if field not in self.stats:
+                self.fields.append(field)
+                self.stats[field] = RunningStats()
+            self.stats[field].merge(stats)
+        return self
+
+    def summary(self, decimals=2):
+        """
+        Means for MEAN_KEYS and sums for SUM_KEYS, as returned by aggregate_data.
+        """
+        agg = {}
+        for field in self.fields:
+            stats = self.stats[field]
+            if field in SUM_KEYS:
+                agg[field] = round(stats.total, decimals) if stats.count else 0.0
+            else:
+                agg[field] = round(stats.mean, decimals) if stats.count else None
+        return agg
+
+    def to_dict(self):
+        return {
+            'version': self.VERSION,
+            'readings': self.readings,
+            'fields': {field: self.stats[field].to_dict() for field in self.fields},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('version', cls.VERSION) != cls.VERSION:
+            raise ValueError(f"Unsupported aggregator version: {data.get('version')}")
+        fields = data.get('fields', {})
+        agg = cls(fields.keys())
+        agg.readings = int(data.get('readings', 0))
+        for field, stats in fields.items():
+            agg.stats[field] = RunningStats.from_dict(stats)
+        return agg
+
+    def save(self, path):
+        """Write the aggregate to ``path`` atomically (temp file + rename)."""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
 
 def aggregate_data(readings):
     """
-    Aggregates a list of sensor reading dictionaries.
+    Aggregates sensor reading dictionaries.
     Calculates Mean for Temp, Humidity, pH, NPK.
     Calculates Sum for Rainfall (if present).
-    
-    :param readings: List of dicts, e.g. [{'temperature': 25.0, ...}, ...]
+
+    :param readings: List (or any iterable) of dicts, e.g. [{'temperature': 25.0, ...}, ...]
     :return: Dict with aggregated values.
     """
-    if not readings:
+    agg = StreamingAggregator().update(readings or [])
+    if not agg.readings:
         return None
-
-    # Fields to average
-    mean_keys = ['temperature', 'humidity', 'ph', 'nitrogen', 'phosphorus', 'potassium']
-    # Fields to sum
-    sum_keys = ['rainfall']
-    
-    agg = {}
-    
-    # Calculate Means
-    for key in mean_keys:
-        values = [r.get(key) for r in readings if r.get(key) is not None]
-        if values:
-            agg[key] = round(statistics.mean(values), 2)
-        else:
-            agg[key] = None
-            
-    # Calculate Sums
-    for key in sum_keys:
-        values = [r.get(key) for r in readings if r.get(key) is not None]
-        if values:
-            agg[key] = round(sum(values), 2)
-        else:
-            agg[key] = 0.0
-
-    return agg
+    return agg.summary()
 
 if __name__ == "__main__":
     # Test with stub data
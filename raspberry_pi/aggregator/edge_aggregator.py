@@ -0,0 +1,122 @@
+import os
+import sys
+import statistics
+from collections import Counter, deque
+
+# Ensure this directory is in path so we can import siblings
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+
+from aggregate_30_days import StreamingAggregator, MEAN_KEYS, SUM_KEYS
+
+# Fields averaged over a window, and fields accumulated (rain gauge tips)
+MEAN_FIELDS = MEAN_KEYS
+SUM_FIELDS = SUM_KEYS
+
+# Smallest deviation scale per field, so quantized sensors (DHT11 reports whole
+# degrees) with a MAD of 0 do not reject every change as an outlier
+MIN_SCALE = {
+    'temperature': 0.5,
+    'humidity': 1.0,
+    'ph': 0.1,
+    'nitrogen': 2.0,
+    'phosphorus': 2.0,
+    'potassium': 2.0,
+}
+
+
+class MedianMADFilter:
+    """
+    Rejects samples far from the median of the recent samples of a field.
+
+    A sample is an outlier when ``|x - median| > threshold * 1.4826 * MAD``
+    (1.4826 * MAD estimates the standard deviation for normal noise). The
+    reference window holds the last ``window`` raw samples, accepted or not,
+    so a genuine step change is accepted once it dominates the window.
+    """
+
+    def __init__(self, window=15, threshold=3.5, min_samples=5, min_scale=None):
+        self.window = window
+        self.threshold = threshold
+        self.min_samples = min_samples
+        self.min_scale = dict(MIN_SCALE, **(min_scale or {}))
+        self._recent = {}
+
+    def accept(self, field, value):
+        recent = self._recent.setdefault(field, deque(maxlen=self.window))
+        ok = True
+        if len(recent) >= self.min_samples:
+            median = statistics.median(recent)
+            mad = statistics.median(abs(v - median) for v in recent)
+            scale = max(1.4826 * mad, self.min_scale.get(field, 0.0))
+            ok = abs(value - median) <= self.threshold * scale
+        recent.append(value)
+        return ok
+
+
+class EdgeAggregator:
+    """
+    Turns a stream of high-rate sensor samples into one summary per window.
+
+    ``add`` filters each field through a MedianMADFilter and folds accepted
+    values into a StreamingAggregator; ``flush`` returns the window summary
+    (shaped like a single reading, so the backend stores it as one row) and
+    starts a new window. The filter history carries over between windows.
+    """
+
+    def __init__(self, filter=None):
+        self.filter = filter or MedianMADFilter()
+        self._reset()
+
+    def add(self, sample):
+        """Fold one sample (dict of field -> value or None) into the current window."""
+        accepted = {}
+        for field in MEAN_FIELDS + SUM_FIELDS:
+            value = sample.get(field)
+            if value is None:
+                continue
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                continue
+            if field in MEAN_FIELDS and not self.filter.accept(field, value):
+                self.rejected[field] += 1
+                continue
+            accepted[field] = value
+        self.window.add(accepted)
+
+    def flush(self):
+        """
+        Summary of the current window, then reset it.
+
+        :return: Reading dict with the per-field mean (sum for rainfall),
+                 ``sample_count`` and per-field ``stats`` (count, mean,
+                 variance, min, max, rejected), or None if nothing was sampled.
+        """
+        if not self.window.readings:
+            return None
+
+        summary = self.window.summary()
+        summary['sample_count'] = self.window.readings
+        summary['stats'] = {}
+        for field in MEAN_FIELDS + SUM_FIELDS:
+            stat = self.window.stats[field]
+            if field in SUM_FIELDS and not stat.count:
+                summary[field] = None
+            if stat.count or self.rejected[field]:
+                summary['stats'][field] = {
+                    'count': stat.count,
+                    'mean': round(stat.mean, 4),
+                    'variance': round(stat.variance, 4),
+                    'min': round(stat.min, 4) if stat.count else None,
+                    'max': round(stat.max, 4) if stat.count else None,
+                    'rejected': self.rejected[field],
+                }
+
+        self._reset()
+        return summary
+
+    def _reset(self):
+        self.window = StreamingAggregator(MEAN_FIELDS + SUM_FIELDS)
+        self.rejected = Counter()
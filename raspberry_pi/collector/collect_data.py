@@ -1,6 +1,4 @@
 import time
-import requests
-import json
 import os
 import sys
 from datetime import datetime
@@ -12,56 +10,145 @@ sys.path.append(parent_dir)
 
 try:
     from sensors.mock_sensor import MockSensorSuite
-    from config.pi_config import API_URL, COLLECTION_INTERVAL
+    from config.pi_config import (
+        API_URL, API_BATCH_URL, COLLECTION_INTERVAL, RETRY_DELAY, DEVICE_ID,
+        JOURNAL_PATH, JOURNAL_MAX_ROWS, REPLAY_BATCH_SIZE, MAX_RETRIES, COALESCE_SIZE,
+        USE_MOCK_SENSORS, DHT_PIN, DHT_TYPE, ADC_CHANNEL_PH, NPK_PORT, SENSOR_TIMEOUTS,
+        SAMPLE_INTERVAL, MAD_WINDOW, MAD_THRESHOLD
+    )
 except ImportError:
     # Fallback if config not yet created or running standalone
-    API_URL = "http://localhost:5000/api/sensor-data"
+    API_URL = "http://localhost:5000/api/sensor/data"
+    API_BATCH_URL = "http://localhost:5000/api/sensor/data/batch"
     COLLECTION_INTERVAL = 60 # seconds
+    RETRY_DELAY = 10
+    MAX_RETRIES = 3
+    COALESCE_SIZE = 24
+    DEVICE_ID = "pi_01"
+    JOURNAL_PATH = os.path.join(current_dir, "journal.db")
+    JOURNAL_MAX_ROWS = 200000
+    REPLAY_BATCH_SIZE = 500
+    USE_MOCK_SENSORS = True
+    DHT_PIN, DHT_TYPE, ADC_CHANNEL_PH, NPK_PORT = 4, 11, 0, "/dev/ttyUSB0"
+    SENSOR_TIMEOUTS = None
+    SAMPLE_INTERVAL = 10
+    MAD_WINDOW, MAD_THRESHOLD = 15, 3.5
     from sensors.mock_sensor import MockSensorSuite
 
-def save_locally(data):
+from collector.journal import ReadingJournal
+from collector.transport import UploadTransport, TransportError
+from aggregator.edge_aggregator import EdgeAggregator, MedianMADFilter
+
+LEGACY_CSV = os.path.join(current_dir, "offline_data.csv")
+
+def build_sensor_suite():
     """
-    Saves data to a local CSV file when offline.
+    Mock sensors by default; the concurrent hardware suite when USE_MOCK_SENSORS is off.
     """
-    file_path = os.path.join(current_dir, "offline_data.csv")
-    file_exists = os.path.isfile(file_path)
-    
-    with open(file_path, "a") as f:
-        if not file_exists:
-            f.write("timestamp,temperature,humidity,ph,nitrogen,phosphorus,potassium\n")
-        
-        line = f"{data['timestamp']},{data['temperature']},{data['humidity']},{data['ph']},{data['nitrogen']},{data['phosphorus']},{data['potassium']}\n"
-        f.write(line)
-        print("Data saved locally (offline mode).")
+    if USE_MOCK_SENSORS:
+        return MockSensorSuite()
+    from sensors.hardware_sensor import HardwareSensorSuite
+    return HardwareSensorSuite(
+        dht_pin=DHT_PIN, dht_type=DHT_TYPE, ph_channel=ADC_CHANNEL_PH,
+        npk_port=NPK_PORT, timeouts=SENSOR_TIMEOUTS
+    )
+
+def save_locally(journal, data):
+    """
+    Appends a reading to the local journal; it stays there until the backend acknowledges it.
+    """
+    return journal.append(data)
+
+def replay_backlog(journal, transport, batch_size=REPLAY_BATCH_SIZE):
+    """
+    Drains journaled readings to the backend in gzip-compressed batches.
+
+    Readings the backend stored, or rejected as invalid, are acknowledged and
+    deleted; anything else (network error, db_error) stays for the next try.
+    Returns the number of readings acknowledged.
+    """
+    acked = 0
+    while True:
+        batch = journal.pending(batch_size)
+        if not batch:
+            return acked
+
+        response = transport.post([reading for _, reading in batch])
+        if response.status_code != 200:
+            print(f" ! Backlog upload failed {response.status_code}: {response.text}")
+            return acked
+
+        done = [
+            batch[r['index']][0] for r in response.json().get('results', [])
+            if r.get('status') != 'rejected' or r.get('error') != 'db_error'
+        ]
+        journal.ack(done)
+        acked += len(done)
+        if len(done) < len(batch):
+            return acked
+
+def sample_window(suite, aggregator, duration=COLLECTION_INTERVAL, interval=SAMPLE_INTERVAL):
+    """
+    Samples the sensors every ``interval`` seconds for ``duration`` seconds
+    and returns the filtered window summary (None if no sample was taken).
+    """
+    window_end = time.monotonic() + duration
+    while True:
+        try:
+            aggregator.add(suite.get_all_data())
+        except Exception as e:
+            print(f" ! Sensor Error: {e}")
+        remaining = window_end - time.monotonic()
+        if remaining <= 0:
+            return aggregator.flush()
+        time.sleep(min(interval, remaining))
 
 def collect_loop():
-    print(f"Starting Data Collector... Sending to {API_URL}")
-    suite = MockSensorSuite()
+    print(f"Starting Data Collector... Sending to {API_BATCH_URL}")
+    suite = build_sensor_suite()
+    journal = ReadingJournal(JOURNAL_PATH, max_rows=JOURNAL_MAX_ROWS)
+    transport = UploadTransport(
+        API_BATCH_URL, retry_delay=RETRY_DELAY, max_retries=MAX_RETRIES, coalesce_size=COALESCE_SIZE
+    )
+    aggregator = EdgeAggregator(MedianMADFilter(window=MAD_WINDOW, threshold=MAD_THRESHOLD))
+
+    imported = journal.import_csv(LEGACY_CSV, defaults={'device_id': DEVICE_ID})
+    if imported:
+        print(f"Imported {imported} readings from {LEGACY_CSV} into the journal.")
     
     while True:
         try:
-            # 1. Read Data
-            data = suite.get_all_data()
+            # 1. Oversample for one window and keep only its summary
+            data = sample_window(suite, aggregator)
+            if data is None:
+                continue
+            data['device_id'] = DEVICE_ID
             data['timestamp'] = datetime.now().isoformat()
             
-            print(f"[{data['timestamp']}] Read: {data}")
-
-            # 2. Send to Backend
-            try:
-                response = requests.post(API_URL, json=data, timeout=5)
-                if response.status_code == 201 or response.status_code == 200:
-                    print(" > Sent to API successfully.")
-                else:
-                    print(f" ! API Error {response.status_code}: {response.text}")
-                    save_locally(data)
-            except requests.exceptions.RequestException as e:
-                print(f" ! Network Error: {e}")
-                save_locally(data)
+            means = {k: v for k, v in data.items() if k != 'stats'}
+            print(f"[{data['timestamp']}] Window summary: {means}")
+
+            # 2. Journal first, then drain everything pending (this reading included)
+            save_locally(journal, data)
+            pending = journal.count()
+            if not transport.should_send(pending):
+                # Link is degraded: hold readings back and send them as one larger batch later
+                print(f" > Link degraded; {pending} readings held for a coalesced upload.")
+            else:
+                try:
+                    sent = replay_backlog(journal, transport)
+                    backlog = journal.count()
+                    if backlog:
+                        print(f" > Sent {sent} readings; {backlog} still pending (offline mode).")
+                    else:
+                        print(f" > Sent {sent} readings to API successfully.")
+                except TransportError as e:
+                    print(f" ! Network Error: {e}")
+                    print(f" > {journal.count()} readings pending in local journal (offline mode).")
 
         except Exception as e:
             print(f" ! Critical Error: {e}")
-        
-        time.sleep(COLLECTION_INTERVAL)
+            time.sleep(RETRY_DELAY)
 
 if __name__ == "__main__":
     collect_loop()
@@ -0,0 +1,107 @@
+import csv
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+
+class ReadingJournal:
+    """
+    Durable store-and-forward journal for sensor readings (SQLite in WAL mode).
+
+    Every reading is appended with an increasing sequence number before it is
+    sent. Rows are deleted only once the backend has acknowledged them, and
+    the journal is capped at ``max_rows`` (oldest readings are dropped first)
+    so a Pi that stays offline for a long time cannot fill its SD card.
+    """
+
+    def __init__(self, path, max_rows=200000):
+        """
+        :param path: SQLite file path.
+        :param max_rows: Maximum number of unacknowledged readings kept on disk.
+        """
+        self.path = path
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS readings ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " created_at TEXT NOT NULL,"
+            " payload TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def append(self, reading):
+        """Store one reading; returns its sequence number."""
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO readings (created_at, payload) VALUES (?, ?)",
+                (datetime.now().isoformat(), json.dumps(reading, default=str))
+            )
+            self._trim(cur.lastrowid)
+            self._conn.commit()
+            return cur.lastrowid
+
+    def pending(self, limit=500):
+        """Oldest unacknowledged readings as a list of (seq, reading)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, payload FROM readings ORDER BY seq LIMIT ?", (limit,)
+            ).fetchall()
+        return [(seq, json.loads(payload)) for seq, payload in rows]
+
+    def ack(self, seqs):
+        """Delete readings the backend has accepted (or permanently rejected)."""
+        seqs = list(seqs)
+        if not seqs:
+            return
+        with self._lock:
+            self._conn.executemany("DELETE FROM readings WHERE seq = ?", [(s,) for s in seqs])
+            self._conn.commit()
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM readings").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def import_csv(self, csv_path, defaults=None):
+        """
+        One-off import of the legacy offline_data.csv backlog.
+
+        :param defaults: Fields missing from the CSV (e.g. device_id) to add to every reading.
+        The file is renamed to ``*.imported`` afterwards so it is not replayed twice.
+        """
+        if not os.path.exists(csv_path):
+            return 0
+        count = 0
+        with open(csv_path, newline='') as f:
+            for row in csv.DictReader(f):
+                reading = dict(defaults or {})
+                reading.update({k: self._number(v) for k, v in row.items() if v not in (None, '', 'None')})
+                reading['timestamp'] = row.get('timestamp')
+                self.append(reading)
+                count += 1
+        os.replace(csv_path, csv_path + '.imported')
+        return count
+
+    def _trim(self, last_seq):
+        # Bound by sequence range (cheap, unlike COUNT(*)); drops the oldest readings
+        cutoff = last_seq - self.max_rows
+        if cutoff > 0:
+            self._conn.execute("DELETE FROM readings WHERE seq <= ?", (cutoff,))
+
+    @staticmethod
+    def _number(value):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return value
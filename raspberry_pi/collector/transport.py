@@ -0,0 +1,116 @@
+import gzip
+import json
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class TransportError(Exception):
+    """Raised when an upload still fails after all retries."""
+
+
+class UploadTransport:
+    """
+    HTTP transport for the collector over a slow or flaky (cellular) link.
+
+    - One keep-alive ``requests.Session`` is reused for every upload, so the
+      TCP/TLS handshake is paid once instead of per reading.
+    - Bodies are gzip-compressed (JSON readings shrink 5-10x).
+    - Connection errors, timeouts, 429 and 5xx are retried up to
+      ``max_retries`` times with jittered exponential backoff starting at
+      ``retry_delay`` seconds.
+    - After ``degraded_after`` consecutive failed uploads the link is
+      "degraded": ``should_send`` then holds readings back until either
+      ``coalesce_size`` are pending or the backoff window has passed, so the
+      radio wakes up for one larger batch instead of every reading.
+    """
+
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+
+    def __init__(self, url, retry_delay=10, max_retries=3, max_backoff=900,
+                 timeout=(5, 30), degraded_after=2, coalesce_size=50, compress_min_bytes=256):
+        """
+        :param url: Batch endpoint (readings are POSTed as a JSON array).
+        :param retry_delay: Base delay in seconds for the first retry.
+        :param timeout: (connect, read) timeout in seconds per attempt.
+        :param compress_min_bytes: Bodies smaller than this are sent uncompressed.
+        """
+        self.url = url
+        self.retry_delay = retry_delay
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.degraded_after = degraded_after
+        self.coalesce_size = coalesce_size
+        self.compress_min_bytes = compress_min_bytes
+
+        self.session = requests.Session()
+        # Retries are handled here (with backoff); the adapter only pools the connection
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'Content-Type': 'application/json', 'Connection': 'keep-alive'})
+
+        self.failures = 0          # consecutive failed uploads
+        self._next_attempt = 0.0   # monotonic time the backoff window ends
+        self.stats = {'uploads': 0, 'attempts': 0, 'raw_bytes': 0, 'wire_bytes': 0}
+
+    @property
+    def degraded(self):
+        return self.failures >= self.degraded_after
+
+    def should_send(self, pending):
+        """Whether to power up the link for ``pending`` queued readings now."""
+        if not self.degraded:
+            return pending > 0
+        return pending >= self.coalesce_size or time.monotonic() >= self._next_attempt
+
+    def post(self, readings):
+        """
+        Upload a list of readings, retrying transient failures.
+
+        Returns the response (any status that is not retryable, e.g. 200 or
+        400); raises TransportError once every attempt has failed.
+        """
+        raw = json.dumps(readings).encode()
+        headers = {}
+        body = raw
+        if len(raw) >= self.compress_min_bytes:
+            body = gzip.compress(raw)
+            headers['Content-Encoding'] = 'gzip'
+
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(self._backoff(attempt))
+            self.stats['attempts'] += 1
+            try:
+                response = self.session.post(self.url, data=body, headers=headers, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                last_error = e
+                continue
+            if response.status_code in self.RETRY_STATUS:
+                last_error = f"HTTP {response.status_code}"
+                continue
+
+            self.failures = 0
+            self._next_attempt = 0.0
+            self.stats['uploads'] += 1
+            self.stats['raw_bytes'] += len(raw)
+            self.stats['wire_bytes'] += len(body)
+            return response
+
+        self.failures += 1
+        self._next_attempt = time.monotonic() + self._backoff(self.failures)
+        # Drop the pooled connection; it is likely dead after a link failure
+        self.session.close()
+        raise TransportError(f"Upload failed after {self.max_retries + 1} attempts: {last_error}")
+
+    def close(self):
+        self.session.close()
+
+    def _backoff(self, attempt):
+        delay = min(self.max_backoff, self.retry_delay * 2 ** (attempt - 1))
+        return delay * random.uniform(0.5, 1.0)
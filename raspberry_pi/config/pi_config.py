@@ -4,14 +4,38 @@ import os
 # Default to localhost for local testing. In production, this would be the IP of the server.
 API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:5000/api")
 API_URL = f"{API_BASE_URL}/sensor/data"
+API_BATCH_URL = f"{API_BASE_URL}/sensor/data/batch"
+
+# Device Identity
+DEVICE_ID = os.getenv("DEVICE_ID", "pi_01")
 
 # Data Collection Configuration
 COLLECTION_INTERVAL = 3600  # Seconds between readings
 RETRY_DELAY = 10         # Seconds to wait before retrying failed request
 
+# Edge Aggregation: sensors are oversampled within each COLLECTION_INTERVAL window,
+# outliers are dropped (median/MAD) and only the window summary is uploaded
+SAMPLE_INTERVAL = 30     # Seconds between samples inside a window
+MAD_WINDOW = 15          # Recent samples used as the outlier reference
+MAD_THRESHOLD = 3.5      # Reject samples more than this many robust std-devs from the median
+MAX_RETRIES = 3          # Retries per upload (delay doubles each time, with jitter)
+COALESCE_SIZE = 24       # While the link is degraded, wait for this many readings before uploading
+
+# Offline Journal (store-and-forward)
+JOURNAL_PATH = os.getenv("JOURNAL_PATH", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "collector", "journal.db"))
+JOURNAL_MAX_ROWS = 200000   # Oldest readings are dropped beyond this backlog
+REPLAY_BATCH_SIZE = 500     # Readings per compressed upload when draining the backlog
+
 # Sensor Hardware Configuration (GPIO BCM)
+USE_MOCK_SENSORS = os.getenv("USE_MOCK_SENSORS", "1") != "0"  # Set to 0 on the Pi to read real sensors
 DHT_PIN = 4
 DHT_TYPE = 11  # 11 for DHT11, 22 for DHT22
 
 # ADC / SPI Config (for pH, NPK if using analog)
 ADC_CHANNEL_PH = 0
+
+# RS485 Modbus port for the NPK sensor
+NPK_PORT = "/dev/ttyUSB0"
+
+# Per-sensor read timeouts in seconds; sensors are sampled concurrently
+SENSOR_TIMEOUTS = {"dht": 8.0, "ph": 2.0, "npk": 5.0}
@@ -21,10 +21,13 @@ class DHTSensor:
         """
         self.pin = pin
 
-        # Select correct DHT sensor model
-        self.sensor_type = (
-            Adafruit_DHT.DHT11 if sensor_type == 11 else Adafruit_DHT.DHT22
-        )
+        # Select correct DHT sensor model (only known when the library is installed)
+        if HAS_HARDWARE:
+            self.sensor_type = (
+                Adafruit_DHT.DHT11 if sensor_type == 11 else Adafruit_DHT.DHT22
+            )
+        else:
+            self.sensor_type = None
 
         # Use mock mode if forced OR if hardware library is unavailable
         self.is_mock = is_mock or not HAS_HARDWARE
@@ -0,0 +1,110 @@
+import sys
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+# Ensure this directory is in path so we can import siblings
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+
+from DHT_sensor import DHTSensor
+from ph_sensor import PHSensor
+from npk_sensor import NPKSensor
+
+# Worst-case seconds to wait for each bus (DHT read_retry can take ~30s when it keeps failing)
+DEFAULT_TIMEOUTS = {'dht': 8.0, 'ph': 2.0, 'npk': 5.0}
+
+
+class HardwareSensorSuite:
+    """
+    Sensor suite for the real hardware, with the same output as MockSensorSuite.
+
+    The DHT (GPIO), pH (ADC/SPI) and NPK (RS485 Modbus) sensors sit on
+    independent buses, so they are sampled concurrently and a cycle takes as
+    long as the slowest sensor instead of the sum of all of them.
+    Temperature and humidity come from a single DHT read.
+
+    Every sensor has its own timeout; a sensor that misses it reports None
+    for this cycle. A hung read cannot be cancelled, so a sensor whose
+    previous read is still running is skipped (None) rather than queued
+    again, which keeps at most one stuck thread per sensor.
+    """
+
+    def __init__(self, dht_pin=4, dht_type=11, ph_channel=0, npk_port='/dev/ttyUSB0',
+                 timeouts=None, is_mock=False):
+        """
+        :param timeouts: Per-sensor timeouts in seconds, e.g. {'dht': 8, 'ph': 2, 'npk': 5}.
+        :param is_mock: Force mock readings (useful to exercise the concurrency off the Pi).
+        """
+        self.dht_sensor = DHTSensor(pin=dht_pin, sensor_type=dht_type, is_mock=is_mock)
+        self.ph_sensor = PHSensor(channel=ph_channel, is_mock=is_mock)
+        self.npk_sensor = NPKSensor(port=npk_port, is_mock=is_mock)
+
+        self.readers = {
+            'dht': self.dht_sensor.read,
+            'ph': self.ph_sensor.read,
+            'npk': self.npk_sensor.read,
+        }
+        self.timeouts = dict(DEFAULT_TIMEOUTS, **(timeouts or {}))
+        self.last_timings = {}
+
+        self._executor = ThreadPoolExecutor(max_workers=len(self.readers), thread_name_prefix='sensor')
+        self._inflight = {}
+
+    def sample(self):
+        """
+        Read every sensor concurrently.
+
+        :return: {sensor_name: raw reading or None}
+        """
+        start = time.monotonic()
+        futures = {}
+        results = {}
+        for name, read in self.readers.items():
+            previous = self._inflight.get(name)
+            if previous is not None and not previous.done():
+                print(f"Sensor '{name}' is still busy with its previous read; skipping this cycle")
+                results[name] = None
+                continue
+            futures[name] = self._inflight[name] = self._executor.submit(read)
+
+        for name, future in futures.items():
+            # Each sensor gets its own budget, measured from the start of the cycle
+            remaining = self.timeouts.get(name, 5.0) - (time.monotonic() - start)
+            try:
+                results[name] = future.result(timeout=max(remaining, 0))
+            except FutureTimeout:
+                print(f"Sensor '{name}' timed out after {self.timeouts.get(name, 5.0)}s")
+                results[name] = None
+            except Exception as e:
+                print(f"Error reading sensor '{name}': {e}")
+                results[name] = None
+            self.last_timings[name] = round(time.monotonic() - start, 3)
+
+        return results
+
+    def get_all_data(self):
+        """
+        Returns a dictionary containing all sensor readings.
+        """
+        raw = self.sample()
+        dht = raw.get('dht') or {}
+        npk = raw.get('npk') or {}
+        return {
+            'temperature': dht.get('temperature'),
+            'humidity': dht.get('humidity'),
+            'ph': raw.get('ph'),
+            'nitrogen': npk.get('N'),
+            'phosphorus': npk.get('P'),
+            'potassium': npk.get('K')
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+if __name__ == "__main__":
+    suite = HardwareSensorSuite()
+    print("Hardware Sensor Suite Data:", suite.get_all_data())
+    print("Timings (s):", suite.last_timings)
@@ -0,0 +1,584 @@
+"""Latency/throughput benchmarks for the prediction and ingestion paths.
+
+Usage:
+  python scripts/benchmark.py                          # run every case, print a table
+  python scripts/benchmark.py -k recommend -k ingest   # only cases whose name contains a pattern
+  python scripts/benchmark.py --output results.json    # also write machine-readable results
+  python scripts/benchmark.py --save-baseline          # store results as the baseline
+  python scripts/benchmark.py --compare                # exit 1 if a case regressed vs the baseline
+
+Everything runs in-process against an in-memory stand-in for Supabase, on
+synthetic data generated from a fixed seed, so two runs on the same machine
+measure the same work. The /api/predict cases use the models in --model-dir
+when that set is complete; otherwise a small model set with the same
+preprocessors is fitted on synthetic data first (cached in --fixture-dir).
+
+Each case is timed in rounds: the number of calls per round is calibrated
+so a round takes at least --min-time seconds, and the reported figures are
+per-call statistics over --rounds rounds. A case regresses when its median
+exceeds the baseline median by more than --tolerance (relative). Baselines
+are only comparable on the same machine; the stored machine info is
+compared and a mismatch is reported.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+BACKEND = os.path.join(ROOT, 'backend')
+if BACKEND not in sys.path:
+    sys.path.insert(0, BACKEND)
+AGGREGATOR = os.path.join(ROOT, 'raspberry_pi', 'aggregator')
+if AGGREGATOR not in sys.path:
+    sys.path.insert(0, AGGREGATOR)
+
+import numpy as np
+import pandas as pd
+
+from ml.preprocess import CATEGORICAL_FEATURES as CATEGORICAL, NUMERIC_FEATURES as NUMERIC, build_preprocessor
+
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+DEFAULT_FIXTURE_DIR = os.path.join(tempfile.gettempdir(), 'mitti_mitra_bench_models')
+RESULTS_VERSION = 1
+FIXTURE_VERSION = 2  # bump when build_fixture_models changes, so cached fixtures are rebuilt
+SEED = 42
+
+STATES = ['Karnataka', 'Kerala', 'Punjab', 'Bihar', 'Gujarat', 'Assam', 'Telangana', 'Rajasthan']
+SEASONS = ['Kharif', 'Rabi', 'Zaid']
+CROP_TYPES = ['Agriculture', 'Horticulture']
+CROPS = ['rice', 'wheat', 'maize', 'cotton', 'sugarcane', 'banana', 'mango', 'groundnut']
+
+# 30 days of readings at 60, 5 and 1 minute intervals
+AGGREGATION_SIZES = [720, 8640, 43200]
+BATCH_SIZES = [10, 100]
+INGEST_BATCH_SIZE = 500
+
+
+# ---------------------------------------------------------------- Supabase stand-in
+
+class _Response:
+    def __init__(self, data):
+        self.data = data
+
+
+class _FakeQuery:
+    """The subset of the PostgREST query builder the backend uses."""
+
+    def __init__(self, store, table):
+        self.store = store
+        self.table = table
+        self._filters = []
+        self._order = None
+        self._limit = None
+        self._range = None
+        self._insert = None
+
+    def select(self, columns='*'):
+        return self
+
+    def eq(self, column, value):
+        self._filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def gt(self, column, value):
+        self._filters.append(lambda row: row.get(column) is not None and row[column] > value)
+        return self
+
+    def gte(self, column, value):
+        self._filters.append(lambda row: row.get(column) is not None and row[column] >= value)
+        return self
+
+    def order(self, column, desc=False):
+        self._order = (column, desc)
+        return self
+
+    def limit(self, n):
+        self._limit = n
+        return self
+
+    def range(self, start, end):
+        self._range = (start, end)
+        return self
+
+    def insert(self, records):
+        self._insert = records if isinstance(records, list) else [records]
+        return self
+
+    def execute(self):
+        rows = self.store.tables[self.table]
+        if self._insert is not None:
+            rows.extend(dict(r) for r in self._insert)
+            return _Response(self._insert)
+        result = [r for r in rows if all(f(r) for f in self._filters)]
+        if self._order is not None:
+            column, desc = self._order
+            result.sort(key=lambda r: (r.get(column) is None, r.get(column)), reverse=desc)
+        if self._range is not None:
+            result = result[self._range[0]:self._range[1] + 1]
+        if self._limit is not None:
+            result = result[:self._limit]
+        return _Response(result)
+
+
+class FakeSupabase:
+    """In-memory tables; RPCs are reported as not deployed (pandas fallback)."""
+
+    def __init__(self):
+        self.tables = defaultdict(list)
+
+    def table(self, name):
+        return _FakeQuery(self, name)
+
+    def rpc(self, name, params=None):
+        raise RuntimeError(f"function {name} does not exist")
+
+
+# ---------------------------------------------------------------- synthetic data
+
+def synthetic_rows(n, rng):
+    """Request payloads in the shape /api/predict/recommend receives."""
+    return [{
+        'N': int(rng.integers(0, 140)), 'P': int(rng.integers(5, 145)), 'K': int(rng.integers(5, 205)),
+        'ph': round(float(rng.uniform(4.5, 8.5)), 2),
+        'temperature': round(float(rng.uniform(10, 40)), 1),
+        'humidity': round(float(rng.uniform(20, 95)), 1),
+        'rainfall': round(float(rng.uniform(20, 300)), 1),
+        'state': STATES[int(rng.integers(len(STATES)))],
+        'season': SEASONS[int(rng.integers(len(SEASONS)))],
+        'crop_type': CROP_TYPES[int(rng.integers(len(CROP_TYPES)))],
+    } for _ in range(n)]
+
+
+def synthetic_readings(n, rng, device_id='bench_pi', days=30):
+    """``n`` sensor readings evenly spread over the last ``days`` days."""
+    end = datetime.now(timezone.utc)
+    step = timedelta(days=days) / max(n, 1)
+    values = {
+        'temperature': rng.normal(27, 4, n), 'humidity': rng.normal(65, 10, n),
+        'ph': rng.normal(6.5, 0.4, n), 'nitrogen': rng.normal(80, 15, n),
+        'phosphorus': rng.normal(40, 8, n), 'potassium': rng.normal(45, 9, n),
+        'rainfall': np.abs(rng.normal(0, 0.5, n)),
+    }
+    return [
+        dict({k: round(float(v[i]), 2) for k, v in values.items()},
+             device_id=device_id, sample_count=1, stats=None,
+             timestamp=(end - step * (n - i)).isoformat())
+        for i in range(n)
+    ]
+
+
+def build_fixture_models(out_dir, n=4000):
+    """Fit a small model set with the production preprocessor on synthetic data."""
+    from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+    import joblib
+
+    rng = np.random.default_rng(SEED)
+    df = pd.DataFrame({
+        'soil_n': rng.uniform(0, 140, n), 'soil_p': rng.uniform(5, 145, n),
+        'soil_k': rng.uniform(5, 205, n), 'soil_ph': rng.uniform(4.5, 8.5, n),
+        'avg_temperature': rng.uniform(10, 40, n), 'avg_rainfall': rng.uniform(20, 300, n),
+        'humidity': rng.uniform(20, 95, n),
+        'state': rng.choice(STATES, n), 'district': rng.choice(['d1', 'd2', 'd3', 'd4'], n),
+        'agro_climatic_zone': rng.choice(['Zone A', 'Zone B', 'Zone C'], n),
+        'season': rng.choice(SEASONS, n), 'crop_type': rng.choice(CROP_TYPES, n),
+    })
+    df['crop'] = np.array(CROPS)[(df['soil_n'] // 20 + df['avg_rainfall'] // 100).astype(int) % len(CROPS)]
+    df['yield'] = df['soil_n'] / 40 + df['humidity'] / 30 + rng.normal(0, 0.3, n)
+
+    preproc_clf = build_preprocessor(NUMERIC, CATEGORICAL)
+    clf = RandomForestClassifier(n_estimators=100, max_depth=12, random_state=SEED, n_jobs=1)
+    clf.fit(preproc_clf.fit_transform(df[NUMERIC + CATEGORICAL]), df['crop'])
+
+    preproc_reg = build_preprocessor(NUMERIC, CATEGORICAL + ['crop'])
+    reg = RandomForestRegressor(n_estimators=50, max_depth=10, random_state=SEED, n_jobs=1)
+    reg.fit(preproc_reg.fit_transform(df[NUMERIC + CATEGORICAL + ['crop']]), df['yield'])
+
+    os.makedirs(out_dir, exist_ok=True)
+    joblib.dump(preproc_clf, os.path.join(out_dir, 'preprocessor_clf.joblib'))
+    joblib.dump(preproc_reg, os.path.join(out_dir, 'preprocessor_reg.joblib'))
+    joblib.dump(clf, os.path.join(out_dir, 'rf_crop_model.joblib'))
+    joblib.dump(reg, os.path.join(out_dir, 'xgb_yield_model.joblib'))
+    with open(os.path.join(out_dir, 'fixture_version'), 'w') as f:
+        f.write(str(FIXTURE_VERSION))
+    return out_dir
+
+
+def fixture_current(fixture_dir):
+    """True if ``fixture_dir`` holds models built by this version of build_fixture_models."""
+    try:
+        with open(os.path.join(fixture_dir, 'fixture_version')) as f:
+            return f.read().strip() == str(FIXTURE_VERSION)
+    except OSError:
+        return False
+
+
+# ---------------------------------------------------------------- environment
+
+class Bench:
+    """Backend modules wired to the Supabase stand-in, imported once per run."""
+
+    def __init__(self, model_dir, fixture_dir):
+        self.workdir = tempfile.mkdtemp(prefix='mitti_bench_')
+        os.environ.setdefault('LOG_LEVEL', 'WARNING')
+        os.environ['PRELOAD_MODELS'] = '0'
+        os.environ['INGEST_JOURNAL_PATH'] = os.path.join(self.workdir, 'sensor_readings.jsonl')
+
+        # Every backend module imports the shared client from here
+        import config.supabase_client as supabase_client
+        self.db = FakeSupabase()
+        supabase_client.supabase = self.db
+
+        from app import create_app
+        from api import predict, sensor_data
+        self.app = create_app()
+        self.client = self.app.test_client()
+        self.predict = predict
+        self.sensor_data = sensor_data
+
+        self.model_source = 'repo'
+        try:
+            models = predict.model_registry.load(model_dir)
+            complete = models.complete
+        except Exception:
+            complete = False
+        if not complete:
+            self.model_source = 'synthetic'
+            if not fixture_current(fixture_dir):
+                build_fixture_models(fixture_dir)
+            predict.model_registry.load(fixture_dir)
+
+    @property
+    def models(self):
+        return self.predict.model_registry.peek()
+
+    def close(self):
+        self.sensor_data.ingest_buffer.stop()
+
+
+# ---------------------------------------------------------------- cases
+
+CASES = []
+
+
+def case(name):
+    """Register ``setup(bench) -> callable``; the callable is what gets timed."""
+    def register(setup):
+        CASES.append((name, setup))
+        return setup
+    return register
+
+
+def _post(bench, path, payload, expect=200):
+    def call():
+        resp = bench.client.post(path, json=payload)
+        if resp.status_code != expect:
+            raise RuntimeError(f"{path} returned {resp.status_code}: {resp.get_data(as_text=True)[:200]}")
+    return call
+
+
+@case('recommend.single')
+def _recommend_single(bench):
+    return _post(bench, '/api/predict/recommend', synthetic_rows(1, np.random.default_rng(SEED))[0])
+
+
+for _size in BATCH_SIZES:
+    @case(f'recommend.batch[{_size}]')
+    def _recommend_batch(bench, size=_size):
+        return _post(bench, '/api/predict/recommend/batch', synthetic_rows(size, np.random.default_rng(SEED)))
+
+
+for _size in [1, 1000]:
+    @case(f'preproc_clf.transform[{_size}]')
+    def _transform(bench, size=_size):
+        predict = bench.predict
+        rows = [predict.build_input_row(r) for r in synthetic_rows(size, np.random.default_rng(SEED))]
+        frame = predict._frame_for(bench.models.preproc_clf, rows)
+        preproc = bench.models.preproc_clf
+        return lambda: preproc.transform(frame)
+
+
+def _crop_predictor(fast):
+    from ml import fast_inference
+    from ml.predictor import CropPredictor
+    enabled = fast_inference.ENABLED
+    fast_inference.ENABLED = fast
+    try:
+        predictor = CropPredictor()
+    finally:
+        fast_inference.ENABLED = enabled
+    if predictor.fast_model is None and predictor.agri_model is None:
+        raise RuntimeError('backend/models has no crop_recommendation_model')
+    features = [90, 42, 43, 20.9, 82.0, 6.5, 202.9]  # N, P, K, temperature, humidity, ph, rainfall
+    return lambda: predictor.predict(features)
+
+
+@case('crop_predictor.predict')
+def _crop_predictor_fast(bench):
+    return _crop_predictor(True)
+
+
+@case('crop_predictor.predict[sklearn]')
+def _crop_predictor_sklearn(bench):
+    return _crop_predictor(False)
+
+
+for _size in AGGREGATION_SIZES:
+    @case(f'aggregation.full[{_size}]')
+    def _aggregation_full(bench, size=_size):
+        from services.aggregation_service import AggregationService
+        device_id = f'bench_full_{size}'
+        bench.db.tables['sensor_readings'].extend(synthetic_readings(size, np.random.default_rng(SEED), device_id))
+        service = AggregationService()
+        return lambda: service.get_30_day_average(device_id, rebuild=True)
+
+    @case(f'aggregation.incremental[{_size}]')
+    def _aggregation_incremental(bench, size=_size):
+        from services.aggregation_service import AggregationService
+        device_id = f'bench_incr_{size}'
+        bench.db.tables['sensor_readings'].extend(synthetic_readings(size, np.random.default_rng(SEED), device_id))
+        service = AggregationService()
+        service.get_30_day_average(device_id, rebuild=True)  # seeds the daily buckets
+        return lambda: service.get_30_day_average(device_id)
+
+    @case(f'aggregate_data[{_size}]')
+    def _aggregate_data(bench, size=_size):
+        from aggregate_30_days import aggregate_data
+        readings = synthetic_readings(size, np.random.default_rng(SEED))
+        return lambda: aggregate_data(readings)
+
+
+def _reading(i):
+    return {'device_id': 'bench_ingest', 'temperature': 25.0 + i % 7, 'humidity': 60.0,
+            'ph': 6.5, 'nitrogen': 80, 'phosphorus': 40, 'potassium': 45, 'rainfall': 0.0}
+
+
+@case('ingest.single[write_behind]')
+def _ingest_write_behind(bench):
+    if not bench.sensor_data.WRITE_BEHIND:
+        raise RuntimeError('INGEST_WRITE_BEHIND is disabled')
+    # Journaled (fsync) and queued; the flush worker drains into the stand-in
+    return _post(bench, '/api/sensor/data', _reading(0), expect=202)
+
+
+@case('ingest.single[direct]')
+def _ingest_direct(bench):
+    sensor_data = bench.sensor_data
+    write_behind = sensor_data.WRITE_BEHIND
+    call = _post(bench, '/api/sensor/data', _reading(0), expect=201)
+
+    def run():
+        sensor_data.WRITE_BEHIND = False
+        try:
+            call()
+        finally:
+            sensor_data.WRITE_BEHIND = write_behind
+    return run
+
+
+@case(f'ingest.batch[{INGEST_BATCH_SIZE}]')
+def _ingest_batch(bench):
+    return _post(bench, '/api/sensor/data/batch', [_reading(i) for i in range(INGEST_BATCH_SIZE)])
+
+
+# ---------------------------------------------------------------- runner
+
+def measure(fn, rounds, min_time, warmup):
+    """Per-call seconds of each round, with the call count calibrated to ``min_time``."""
+    for _ in range(warmup):
+        fn()
+
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9)))
+
+    timings = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            timings.append((time.perf_counter() - start) / number)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return number, timings
+
+
+def summarize(number, timings):
+    ordered = sorted(timings)
+    median = statistics.median(ordered)
+    return {
+        'rounds': len(ordered),
+        'calls_per_round': number,
+        'min': ordered[0],
+        'median': median,
+        'mean': statistics.fmean(ordered),
+        'p95': ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))],
+        'stdev': statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+        'ops_per_sec': 1.0 / median if median else None,
+    }
+
+
+def machine_info():
+    import sklearn
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'sklearn': sklearn.__version__,
+        'commit': commit,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Return ``(regressions, rows)`` comparing medians against ``baseline``.
+
+    A case regresses when ``median > baseline_median * (1 + tolerance)``.
+    """
+    base_cases = baseline.get('cases', {})
+    regressions, rows = [], []
+    for name, stats in results['cases'].items():
+        base = base_cases.get(name)
+        if not base or 'median' not in stats or 'median' not in base:
+            rows.append((name, None, 'new' if not base else 'n/a'))
+            continue
+        ratio = stats['median'] / base['median'] if base['median'] else float('inf')
+        status = 'REGRESSED' if ratio > 1 + tolerance else ('improved' if ratio < 1 - tolerance else 'ok')
+        if status == 'REGRESSED':
+            regressions.append(name)
+        rows.append((name, ratio, status))
+    return regressions, rows
+
+
+def _fmt(seconds):
+    if seconds is None:
+        return '-'
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f'{seconds / scale:.2f} {unit}'
+    return f'{seconds / 1e-9:.0f} ns'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-k', dest='patterns', action='append', default=[],
+                        help='Run only cases whose name contains this substring (repeatable).')
+    parser.add_argument('--list', action='store_true', help='List case names and exit.')
+    parser.add_argument('--rounds', type=int, default=7)
+    parser.add_argument('--min-time', type=float, default=0.1, help='Minimum seconds per round.')
+    parser.add_argument('--warmup', type=int, default=3, help='Untimed calls before calibration.')
+    parser.add_argument('--model-dir', default=os.path.join(ROOT, 'models'))
+    parser.add_argument('--fixture-dir', default=DEFAULT_FIXTURE_DIR,
+                        help='Where synthetic models are cached when --model-dir is incomplete.')
+    parser.add_argument('--output', help='Write results as JSON to this path.')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='Store these results as the baseline.')
+    parser.add_argument('--compare', action='store_true', help='Exit 1 when a case regressed vs the baseline.')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed relative slowdown of the median (default 0.25).')
+    args = parser.parse_args(argv)
+
+    selected = [(name, setup) for name, setup in CASES
+                if not args.patterns or any(p in name for p in args.patterns)]
+    if args.list:
+        for name, _ in selected:
+            print(name)
+        return 0
+
+    random.seed(SEED)
+    np.random.seed(SEED)
+    bench = Bench(args.model_dir, args.fixture_dir)
+    results = {
+        'version': RESULTS_VERSION,
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'machine': machine_info(),
+        'config': {'rounds': args.rounds, 'min_time': args.min_time, 'warmup': args.warmup,
+                   'models': bench.model_source, 'seed': SEED},
+        'cases': {},
+    }
+
+    print(f"{'case':<36} {'median':>10} {'min':>10} {'p95':>10} {'ops/s':>10}")
+    try:
+        for name, setup in selected:
+            try:
+                fn = setup(bench)
+                number, timings = measure(fn, args.rounds, args.min_time, args.warmup)
+            except Exception as e:
+                results['cases'][name] = {'error': f'{type(e).__name__}: {e}'}
+                print(f'{name:<36} failed: {e}')
+                continue
+            stats = summarize(number, timings)
+            results['cases'][name] = stats
+            print(f"{name:<36} {_fmt(stats['median']):>10} {_fmt(stats['min']):>10} "
+                  f"{_fmt(stats['p95']):>10} {stats['ops_per_sec']:>10.1f}")
+    finally:
+        bench.close()
+
+    if args.output:
+        _write_json(args.output, results)
+        print(f'Wrote {args.output}')
+
+    status = 0
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f'No baseline at {args.baseline}; run with --save-baseline first')
+            status = 1
+        else:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+            base_machine = {k: v for k, v in baseline.get('machine', {}).items() if k != 'commit'}
+            this_machine = {k: v for k, v in results['machine'].items() if k != 'commit'}
+            if base_machine != this_machine:
+                print('Warning: baseline was recorded on a different machine or library versions')
+            regressions, rows = compare(results, baseline, args.tolerance)
+            print(f"\nvs baseline {baseline.get('machine', {}).get('commit')} (tolerance {args.tolerance:.0%})")
+            for name, ratio, state in rows:
+                print(f"{name:<36} {(f'{ratio:.2f}x' if ratio is not None else '-'):>8}  {state}")
+            failed = [n for n, s in results['cases'].items() if 'error' in s]
+            if regressions or failed:
+                print(f"\n{len(regressions)} regressed, {len(failed)} failed")
+                status = 1
+
+    if args.save_baseline:
+        _write_json(args.baseline, results)
+        print(f'Saved baseline to {args.baseline}')
+    return status
+
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
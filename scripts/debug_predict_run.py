@@ -6,10 +6,11 @@ from backend.api import predict as p
 from backend.services.fertilizer_service import recommend_fertilizer
 
 print('Loading models...')
+models = None
 try:
-    p.load_models()
-    print('Loaded: preproc_clf=', type(p.preproc_clf), 'rf_model=', type(p.rf_model))
-    print('Loaded: preproc_reg=', type(p.preproc_reg), 'reg_model=', type(p.reg_model))
+    models = p.load_models()
+    print('Loaded: preproc_clf=', type(models.preproc_clf), 'rf_model=', type(models.rf_model))
+    print('Loaded: preproc_reg=', type(models.preproc_reg), 'reg_model=', type(models.reg_model))
 except Exception:
     traceback.print_exc()
 
@@ -33,19 +34,19 @@ print('\nInput row:', input_row)
 
 # classification
 try:
-    if p.preproc_clf is not None and p.rf_model is not None:
+    if models is not None and models.preproc_clf is not None and models.rf_model is not None:
         df = pd.DataFrame([input_row])
         print('\nDF columns before:', df.columns.tolist())
-        if hasattr(p.preproc_clf, 'feature_names_in_'):
-            print('preproc_clf.feature_names_in_ length=', len(p.preproc_clf.feature_names_in_))
-            for c in p.preproc_clf.feature_names_in_:
+        if hasattr(models.preproc_clf, 'feature_names_in_'):
+            print('preproc_clf.feature_names_in_ length=', len(models.preproc_clf.feature_names_in_))
+            for c in models.preproc_clf.feature_names_in_:
                 if c not in df.columns:
                     df[c] = np.nan
         print('DF columns after:', df.columns.tolist())
-        Xc = p.preproc_clf.transform(df)
+        Xc = models.preproc_clf.transform(df)
         print('Xc shape:', getattr(Xc, 'shape', type(Xc)))
-        probs = p.rf_model.predict_proba(Xc)
-        classes = p.rf_model.classes_
+        probs = models.rf_model.predict_proba(Xc)
+        classes = models.rf_model.classes_
         print('Probs dtype:', type(probs), 'classes dtype:', type(classes), 'classes example:', classes[:5])
         top_idx = np.argsort(probs[0])[::-1][:3]
         clf_preds = [
@@ -61,17 +62,17 @@ except Exception:
 
 # regression
 try:
-    if 'clf_preds' in locals() and clf_preds and p.preproc_reg is not None and p.reg_model is not None:
+    if 'clf_preds' in locals() and clf_preds and models is not None and models.preproc_reg is not None and models.reg_model is not None:
         yields = []
         for entry in clf_preds:
             dfr = pd.DataFrame([input_row])
             dfr['crop'] = entry['crop']
-            if hasattr(p.preproc_reg, 'feature_names_in_'):
-                for c in p.preproc_reg.feature_names_in_:
+            if hasattr(models.preproc_reg, 'feature_names_in_'):
+                for c in models.preproc_reg.feature_names_in_:
                     if c not in dfr.columns:
                         dfr[c] = np.nan
-            Xr = p.preproc_reg.transform(dfr)
-            val = float(p.reg_model.predict(Xr)[0])
+            Xr = models.preproc_reg.transform(dfr)
+            val = float(models.reg_model.predict(Xr)[0])
             entry['predicted_yield'] = val
             yields.append(val)
         print('\nRegression yields:', yields)
@@ -2,12 +2,28 @@
 
 Usage:
   python scripts/infer.py [input_csv]
+  python scripts/infer.py grid.csv --chunksize 100000 --workers 8 --output outputs/grid.parquet
 
-Outputs `outputs/predictions.csv` with added columns `pred_crop` and `pred_yield` when models exist.
+Outputs `outputs/predictions.csv` (or --output) with the input columns plus
+`pred_crop`, `pred_yield` and, for each of the --top-k crops, `crop_<i>`,
+`prob_<i>` and `yield_<i>`. `pred_yield` is the yield of the row's own `crop`
+when the input has one, otherwise of the top crop. Rows that cannot be scored
+keep empty predictions and say why in `error`; the run goes on.
+
+Without --chunksize the whole file is loaded (through the dataset cache) and
+scored at once. With --chunksize the input is streamed: chunks are scored on
+a process pool whose workers load the models once, and predictions are
+appended to the output in input order as chunks finish, so memory stays
+bounded by a few chunks whatever the input size. Output is CSV, or Parquet
+when --output ends in .parquet (needs pyarrow).
 """
+import argparse
 import os
 import sys
-import joblib
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 import pandas as pd
 
@@ -15,125 +31,317 @@ import pandas as pd
 ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
+BACKEND = os.path.join(ROOT, 'backend')
+if BACKEND not in sys.path:
+    sys.path.insert(0, BACKEND)
 
-from sklearn.impute import SimpleImputer
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
-from sklearn.pipeline import Pipeline
-from sklearn.compose import ColumnTransformer
+from ml.dataset_cache import read_csv_cached, to_float64
+from ml.model_registry import ModelLoadError, ModelRegistry
 
+DEFAULT_INPUT = os.path.expanduser(r"c:/Users/NITHYA/Downloads/mitti_mitra_master_dataset_all_india.csv")
+DEFAULT_OUTPUT = os.path.join('outputs', 'predictions.csv')
+TOP_K = 3
+IN_FLIGHT_PER_WORKER = 2  # chunks queued per worker; bounds memory while streaming
 
-def transform_with_saved_preprocessor(df: pd.DataFrame, preprocessor_path: str):
-    """Load a saved preprocessor and transform the input DataFrame.
+_worker_models = None  # models loaded once per worker process
 
-    Returns transformed array on success, or raises if transform fails.
-    """
-    preproc = joblib.load(preprocessor_path)
-    X = df.copy()
 
-    # Determine expected input columns for the saved preprocessor
-    expected_cols = None
+def expected_columns(preproc):
+    """Input columns a saved preprocessor was fitted on (None if unknown)."""
     if hasattr(preproc, 'feature_names_in_'):
-        expected_cols = list(preproc.feature_names_in_)
-    else:
-        # Try to extract column selectors from transformers_
-        expected_cols = []
-        try:
-            for name, transformer, cols in preproc.transformers_:
-                if cols is None or cols == 'drop' or cols == 'passthrough':
-                    continue
-                if isinstance(cols, (list, tuple, np.ndarray)):
-                    expected_cols.extend(list(cols))
-        except Exception:
-            expected_cols = None
-
-    # If we determined expected columns, ensure they exist in X (fill missing with NaN)
-    if expected_cols:
-        for c in expected_cols:
-            if c not in X.columns:
-                X[c] = np.nan
-
-    # Transform using the saved preprocessor
-    return preproc.transform(X)
-
-
-def main():
-    in_csv = sys.argv[1] if len(sys.argv) > 1 else os.path.expanduser(r"c:/Users/NITHYA/Downloads/mitti_mitra_master_dataset_all_india.csv")
+        return list(preproc.feature_names_in_)
+    # Try to extract column selectors from transformers_
+    expected_cols = []
+    try:
+        for name, transformer, cols in preproc.transformers_:
+            if cols is None or cols == 'drop' or cols == 'passthrough':
+                continue
+            if isinstance(cols, (list, tuple, np.ndarray)):
+                expected_cols.extend(list(cols))
+    except Exception:
+        return None
+    return expected_cols or None
+
+
+def align_columns(df: pd.DataFrame, preproc):
+    """Add the columns ``preproc`` expects but ``df`` lacks (as NaN)."""
+    expected_cols = expected_columns(preproc)
+    missing = [c for c in expected_cols or [] if c not in df.columns]
+    if missing:
+        df = df.assign(**{c: np.nan for c in missing})
+    return df
+
+
+def load_models(model_dir='models'):
+    """
+    Load the model set once through ModelRegistry, so the artifacts pass the
+    same manifest/checksum checks as in the API.
+
+    The classifier is served from the memory-mapped ``rf_crop_model.npz``
+    export when there is a valid one (no unpickling; pages shared by all
+    workers), or compiled from the pickle when that matches sklearn.
+
+    :raises ModelLoadError: If an artifact is unreadable or does not match the manifest.
+    """
+    models = ModelRegistry(model_dir).load()
+    return {
+        'preproc_clf': models.preproc_clf,
+        'preproc_reg': models.preproc_reg,
+        'clf': models.fast_clf if models.fast_clf is not None else models.rf_model,
+        'reg': models.reg_model,
+    }
+
+
+def score_frame(models, df, top_k=TOP_K):
+    """
+    Predictions for one frame of input rows.
+
+    :return: DataFrame aligned with ``df`` holding pred_crop, pred_yield and
+             crop_i / prob_i / yield_i for i in 1..top_k (columns are absent
+             when the model they need is missing).
+    """
+    out = pd.DataFrame(index=df.index)
+    if not len(df):
+        return out
+
+    top_crops = None
+    if models['preproc_clf'] is not None and models['clf'] is not None:
+        Xc = models['preproc_clf'].transform(align_columns(df, models['preproc_clf']))
+        probs = models['clf'].predict_proba(Xc)
+        classes = np.asarray(models['clf'].classes_)
+        k = min(top_k, probs.shape[1])
+        top_idx = np.argsort(-probs, axis=1, kind='stable')[:, :k]
+        top_crops = classes[top_idx]
+        top_probs = np.take_along_axis(probs, top_idx, axis=1)
+        out['pred_crop'] = top_crops[:, 0]
+        for i in range(k):
+            out[f'crop_{i + 1}'] = top_crops[:, i]
+            out[f'prob_{i + 1}'] = top_probs[:, i]
+
+    preproc_reg, reg = models['preproc_reg'], models['reg']
+    if preproc_reg is not None and reg is not None:
+        if 'crop' in df.columns:
+            out['pred_yield'] = reg.predict(preproc_reg.transform(align_columns(df, preproc_reg)))
+        if top_crops is not None:
+            # Every (row, candidate crop) pair in one predict call
+            k = top_crops.shape[1]
+            pairs = df.loc[df.index.repeat(k)].reset_index(drop=True)
+            pairs['crop'] = top_crops.ravel()
+            yields = reg.predict(preproc_reg.transform(align_columns(pairs, preproc_reg))).reshape(-1, k)
+            if 'crop' not in df.columns:
+                out['pred_yield'] = yields[:, 0]
+            for i in range(k):
+                out[f'yield_{i + 1}'] = yields[:, i]
+    return out
+
+
+def score_rows(models, df, top_k=TOP_K):
+    """
+    ``score_frame`` that survives bad rows.
+
+    A frame that fails is split in halves until the failing rows are
+    isolated; those get empty predictions and the message in the ``error``
+    column (empty for every other row), so one bad row never aborts a run.
+    """
+    errors = {}
+    out = _score_isolating(models, df, top_k, errors)
+    if errors:
+        print(f'{len(errors)} of {len(df)} rows could not be scored')
+    out['error'] = pd.Series(errors, index=df.index, dtype=object) if errors else None
+    return out
+
+
+def _score_isolating(models, df, top_k, errors):
+    try:
+        return score_frame(models, df, top_k)
+    except Exception as e:
+        if len(df) <= 1:
+            errors.update((index, str(e)) for index in df.index)
+            return pd.DataFrame(index=df.index)
+    mid = len(df) // 2
+    return pd.concat([_score_isolating(models, df.iloc[:mid], top_k, errors),
+                      _score_isolating(models, df.iloc[mid:], top_k, errors)])
+
+
+def _init_worker(model_dir):
+    global _worker_models
+    _worker_models = load_models(model_dir)
+
+
+def _score_chunk(df, top_k):
+    return pd.concat([df, score_rows(_worker_models, df, top_k)], axis=1)
+
+
+class PredictionWriter:
+    """
+    Appends scored chunks to a CSV or Parquet file as they arrive.
+
+    Rows go to ``<path>.tmp``; ``close()`` publishes it under ``path`` and
+    ``abort()`` deletes it, so a failed run never leaves a truncated output.
+    The Parquet schema is fixed from the first chunk (numbers as float64,
+    booleans as bool, everything else, including columns that are empty in
+    that chunk, as string) and every chunk is converted to it, so a column
+    that is all-NaN or parsed with another dtype in a later chunk still fits
+    (a bad value in a number column is written as null).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.lower().endswith('.parquet')
+        self.rows = 0
+        self._writer = None
+        self._schema = None
+        if self.parquet:
+            import pyarrow  # noqa: F401 - fail before scoring, not after the first chunk
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._tmp_path = path + '.tmp'
+
+    @staticmethod
+    def _arrow_schema(df):
+        import pyarrow as pa
+        fields = []
+        for column in df.columns:
+            values = df[column]
+            if values.isna().all():
+                kind = pa.string()
+            elif pd.api.types.is_bool_dtype(values):
+                kind = pa.bool_()
+            elif pd.api.types.is_numeric_dtype(values):
+                kind = pa.float64()
+            else:
+                kind = pa.string()
+            fields.append(pa.field(str(column), kind))
+        return pa.schema(fields)
+
+    def _conform(self, df):
+        """``df`` with the columns and dtypes of the Parquet schema."""
+        import pyarrow as pa
+        columns = {}
+        for field in self._schema:
+            values = df[field.name] if field.name in df.columns else pd.Series(pd.NA, index=df.index)
+            if field.type == pa.float64():
+                columns[field.name] = pd.to_numeric(values, errors='coerce').astype('float64')
+            elif field.type == pa.bool_():
+                columns[field.name] = values.astype('boolean')
+            else:
+                columns[field.name] = values.astype('string')
+        return pd.DataFrame(columns, index=df.index)
+
+    def write(self, df):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            if self._writer is None:
+                self._schema = self._arrow_schema(df)
+                self._writer = pq.ParquetWriter(self._tmp_path, self._schema)
+            table = pa.Table.from_pandas(self._conform(df), schema=self._schema, preserve_index=False)
+            self._writer.write_table(table)
+        else:
+            df.to_csv(self._tmp_path, mode='a' if self.rows else 'w', header=not self.rows, index=False)
+        self.rows += len(df)
+
+    def close(self):
+        """Finish the file and publish it under ``path``."""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if os.path.exists(self._tmp_path):
+            os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        """Discard everything written so far."""
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            except Exception:
+                pass
+            self._writer = None
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+
+def stream_predictions(in_csv, out_path, model_dir='models', chunksize=100000, workers=None, top_k=TOP_K):
+    """
+    Score ``in_csv`` chunk by chunk on a process pool, writing rows in input order.
+
+    At most ``workers * IN_FLIGHT_PER_WORKER`` chunks are read ahead, so memory
+    does not grow with the input. ``workers=1`` scores in this process.
+    """
+    workers = workers or os.cpu_count() or 1
+    writer = PredictionWriter(out_path)
+    chunks = pd.read_csv(in_csv, chunksize=chunksize)
+    start = time.perf_counter()
+    try:
+        if workers == 1:
+            _init_worker(model_dir)
+            for chunk in chunks:
+                writer.write(_score_chunk(chunk, top_k))
+                print(f'Scored {writer.rows} rows ({time.perf_counter() - start:.1f}s)')
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(model_dir,)) as pool:
+                pending = deque()
+                for chunk in chunks:
+                    pending.append(pool.submit(_score_chunk, chunk, top_k))
+                    while len(pending) >= workers * IN_FLIGHT_PER_WORKER:
+                        writer.write(pending.popleft().result())
+                        print(f'Scored {writer.rows} rows ({time.perf_counter() - start:.1f}s)')
+                while pending:
+                    writer.write(pending.popleft().result())
+                    print(f'Scored {writer.rows} rows ({time.perf_counter() - start:.1f}s)')
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+    return writer.rows
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Predict crops and yields for every row of a CSV.')
+    parser.add_argument('input_csv', nargs='?', default=DEFAULT_INPUT)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='.csv or .parquet output path.')
+    parser.add_argument('--models', default='models', help='Directory with the trained artifacts.')
+    parser.add_argument('--top-k', type=int, default=TOP_K, help='Candidate crops (with yields) per row.')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='Stream the input in chunks of this many rows (constant memory).')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes for --chunksize (default: all cores; 1 = in-process).')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    in_csv = args.input_csv
     if not os.path.exists(in_csv):
         print('Input CSV not found:', in_csv)
         sys.exit(1)
 
-    df = pd.read_csv(in_csv)
-    outputs = df.copy()
-    # Try classifier preprocessor first
-    clf_preproc_path = os.path.join('models', 'preprocessor_clf.joblib')
-    reg_preproc_path = os.path.join('models', 'preprocessor_reg.joblib')
-
-    # Default placeholders
-    clf_X = None
-    reg_X = None
-
-    if os.path.exists(clf_preproc_path):
-        try:
-            clf_X = transform_with_saved_preprocessor(df, clf_preproc_path)
-            print('Transformed input with classifier preprocessor')
-        except Exception as e:
-            print('Failed to transform with classifier preprocessor:', e)
-
-    if os.path.exists(reg_preproc_path):
-        try:
-            reg_X = transform_with_saved_preprocessor(df, reg_preproc_path)
-            print('Transformed input with regressor preprocessor')
-        except Exception as e:
-            print('Failed to transform with regressor preprocessor:', e)
-
-    # Fall back to simple_per-inference transform if needed
-    if clf_X is None or reg_X is None:
-        try:
-            X_trans, feat_names = simple_preprocess_for_inference(df)
-            if clf_X is None:
-                clf_X = X_trans
-            if reg_X is None:
-                reg_X = X_trans
-            print('Used simple inference preprocessor fallback')
-        except Exception as e:
-            print('Fallback preprocessing failed:', e)
-            clf_X = clf_X or None
-            reg_X = reg_X or None
-    os.makedirs('outputs', exist_ok=True)
-
-    # Classifier
-    clf_path = os.path.join('models', 'rf_crop_model.joblib')
-    if os.path.exists(clf_path):
-        clf = joblib.load(clf_path)
-        try:
-            if clf_X is None:
-                raise RuntimeError('No preprocessed input available for classifier')
-            preds = clf.predict(clf_X)
-            outputs['pred_crop'] = preds
-            print('Classifier predictions added.')
-        except Exception as e:
-            print('Classifier predict failed:', e)
-    else:
-        print('Classifier model not found at', clf_path)
-
-    # Regressor
-    reg_path = os.path.join('models', 'xgb_yield_model.joblib')
-    if os.path.exists(reg_path):
-        reg = joblib.load(reg_path)
-        try:
-            if reg_X is None:
-                raise RuntimeError('No preprocessed input available for regressor')
-            preds = reg.predict(reg_X)
-            outputs['pred_yield'] = preds
-            print('Regressor predictions added.')
-        except Exception as e:
-            print('Regressor predict failed:', e)
-    else:
-        print('Regressor model not found at', reg_path)
-
-    out_file = os.path.join('outputs', 'predictions.csv')
-    outputs.to_csv(out_file, index=False)
-    print('Saved predictions to', out_file)
+    if args.chunksize:
+        rows = stream_predictions(in_csv, args.output, args.models, args.chunksize, args.workers, args.top_k)
+        print(f'Saved {rows} predictions to', args.output)
+        return
+
+    try:
+        models = load_models(args.models)
+    except ModelLoadError as e:
+        print('Could not load models:', e)
+        sys.exit(1)
+    for key, label in [('preproc_clf', 'Classifier preprocessor'), ('clf', 'Classifier model'),
+                       ('preproc_reg', 'Regressor preprocessor'), ('reg', 'Regressor model')]:
+        if models[key] is None:
+            print(f'{label} not found in', args.models)
+
+    # Exact CSV values, as in streaming mode and at training time
+    df = to_float64(read_csv_cached(in_csv))
+    outputs = pd.concat([df, score_rows(models, df, args.top_k)], axis=1)
+    writer = PredictionWriter(args.output)
+    try:
+        writer.write(outputs)
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+    print('Saved predictions to', args.output)
 
 
 if __name__ == '__main__':
@@ -2,31 +2,50 @@
 
 Usage:
   python scripts/train_models.py
+  python scripts/train_models.py --search halving --time-budget 600
+
+The default ``grid`` search runs GridSearchCV over the small grids below.
+``halving`` runs a budget-aware successive-halving search over much wider
+spaces: random configurations are scored on a small subsample of the
+training rows, the best third is kept and re-scored on three times as many
+rows, and so on up to the full training set. The search stops early once
+--time-budget seconds are spent (the best configuration of the last
+completed rung wins). XGBoost candidates always train with early stopping
+on a validation split, so n_estimators is found rather than searched.
+Every evaluation is appended to ``models/search_trace_<task>.jsonl``.
 
 The script looks for the dataset at the Downloads path used when you attached
 the file. If not found there it will try `data/` inside the repo.
 
 Outputs:
-- Saved models in `models/` (joblib)
+- Saved models in `models/` (joblib), plus `rf_crop_model.npz` (flattened
+  trees, loaded by the backend without unpickling)
 - Printed evaluation metrics and feature importances
 """
+import argparse
+import json
+import math
 import os
 import sys
+import time
 import joblib
 
 # Ensure project root is importable when running scripts from workspace root
 ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
+BACKEND = os.path.join(ROOT, 'backend')
+if BACKEND not in sys.path:
+    sys.path.insert(0, BACKEND)
 import traceback
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
 
-from sklearn.model_selection import train_test_split, GridSearchCV, cross_val_score
+from sklearn.model_selection import train_test_split, GridSearchCV, KFold, StratifiedKFold
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import accuracy_score, f1_score, mean_squared_error, r2_score
+from sklearn.metrics import accuracy_score, f1_score, mean_squared_error, r2_score, get_scorer
 
 try:
     from xgboost import XGBRegressor
@@ -34,6 +53,8 @@ except Exception:
     XGBRegressor = None
 
 from ml.preprocess import load_dataset, identify_targets, preprocess_features
+from ml.model_registry import write_manifest
+from ml.fast_inference import compile_validated, save_npz
 
 
 DATA_PATHS = [
@@ -42,6 +63,37 @@ DATA_PATHS = [
 ]
 
 
+# Search spaces for --search halving
+RF_SPACE = {
+    'n_estimators': [100, 200, 400],
+    'max_depth': [None, 10, 20, 30],
+    'min_samples_leaf': [1, 2, 4],
+    'max_features': ['sqrt', 'log2', None],
+    'class_weight': [None, 'balanced'],
+}
+XGB_SPACE = {
+    'learning_rate': [0.3, 0.1, 0.05, 0.02],
+    'max_depth': [3, 4, 6, 8],
+    'subsample': [0.7, 0.85, 1.0],
+    'colsample_bytree': [0.6, 0.8, 1.0],
+    'min_child_weight': [1, 3, 5],
+    'reg_lambda': [0.1, 1.0, 10.0],
+}
+XGB_MAX_ESTIMATORS = 2000
+XGB_EARLY_STOPPING_ROUNDS = 50
+XGB_VALIDATION_FRACTION = 0.1
+
+SEARCH = {
+    'mode': 'grid',
+    'time_budget': None,    # seconds per search, None = unlimited
+    'n_candidates': 27,     # configurations in the first rung
+    'eta': 3,               # keep 1/eta of the configurations per rung
+    'min_samples': 500,     # training rows per configuration in the first rung
+    'cv': 3,
+    'trace_dir': 'models',
+}
+
+
 def find_dataset() -> str:
     for p in DATA_PATHS:
         if os.path.exists(p):
@@ -49,24 +101,149 @@ def find_dataset() -> str:
     raise FileNotFoundError(f"Dataset not found. Checked: {DATA_PATHS}")
 
 
+def sample_configs(space, n, rng):
+    """``n`` distinct random configurations from a dict of value lists (all of them if fewer exist)."""
+    keys = sorted(space)
+    total = math.prod(len(space[k]) for k in keys)
+    picks = rng.choice(total, size=min(n, total), replace=False)
+    configs = []
+    for flat in picks:
+        config = {}
+        for k in keys:
+            flat, i = divmod(int(flat), len(space[k]))
+            config[k] = space[k][i]
+        configs.append(config)
+    return configs
+
+
+def _fit_with_early_stopping(estimator, X, y, rng):
+    """Fit an XGBoost model with early stopping on a held-out slice of X, y."""
+    order = rng.permutation(len(y))
+    n_val = max(1, int(len(y) * XGB_VALIDATION_FRACTION))
+    val, train = order[:n_val], order[n_val:]
+    estimator.fit(X[train], y[train], eval_set=[(X[val], y[val])], verbose=False)
+    return estimator
+
+
+def _cv_score(make_estimator, params, X, y, scoring, cv, classification, early_stopping, seed):
+    """Mean CV score of one configuration; also the mean best_iteration with early stopping."""
+    if classification and np.unique(y, return_counts=True)[1].min() >= cv:
+        splitter = StratifiedKFold(n_splits=cv, shuffle=True, random_state=seed)
+    else:
+        splitter = KFold(n_splits=cv, shuffle=True, random_state=seed)
+    scorer = get_scorer(scoring)
+    rng = np.random.default_rng(seed)
+
+    scores, iterations = [], []
+    for train_idx, test_idx in splitter.split(np.zeros(len(y)), y):
+        estimator = make_estimator(params)
+        if early_stopping:
+            _fit_with_early_stopping(estimator, X[train_idx], y[train_idx], rng)
+            iterations.append(int(estimator.best_iteration) + 1)
+        else:
+            estimator.fit(X[train_idx], y[train_idx])
+        scores.append(scorer(estimator, X[test_idx], y[test_idx]))
+    return float(np.mean(scores)), (int(np.median(iterations)) if iterations else None)
+
+
+def successive_halving(make_estimator, space, X, y, scoring, trace_path,
+                       classification=False, early_stopping=False, seed=42):
+    """
+    Successive-halving search over ``space`` with rows as the resource.
+
+    Rung ``r`` scores the surviving configurations on ``min_samples * eta**r``
+    training rows (the last rung on all of them) with ``cv``-fold CV and keeps
+    the best ``1/eta``. Stops when one configuration is left, the rows run
+    out, or ``SEARCH['time_budget']`` is spent. Every evaluation is appended
+    to ``trace_path`` as one JSON line.
+
+    :return: ``(best_params, best_score, best_iteration)``; best_iteration is
+             the early-stopped tree count (None without early stopping).
+    """
+    rng = np.random.default_rng(seed)
+    y = np.asarray(y)
+    eta, cv = SEARCH['eta'], SEARCH['cv']
+    budget = SEARCH['time_budget']
+    start = time.perf_counter()
+
+    configs = sample_configs(space, SEARCH['n_candidates'], rng)
+    order = rng.permutation(len(y))
+    n_rows = min(len(y), max(SEARCH['min_samples'], cv * 2))
+    best = None  # (score, params, best_iteration) of the last completed rung
+
+    os.makedirs(os.path.dirname(trace_path) or '.', exist_ok=True)
+    with open(trace_path, 'w') as trace:
+        rung = 0
+        while configs:
+            rows = np.sort(order[:n_rows])
+            results = []
+            for params in configs:
+                if budget is not None and time.perf_counter() - start > budget:
+                    break
+                t0 = time.perf_counter()
+                try:
+                    score, iteration = _cv_score(make_estimator, params, X[rows], y[rows], scoring, cv,
+                                                 classification, early_stopping, seed)
+                    error = None
+                except Exception as e:
+                    score, iteration, error = float('-inf'), None, f'{type(e).__name__}: {e}'
+                results.append((score, params, iteration))
+                trace.write(json.dumps({
+                    'rung': rung, 'n_samples': int(n_rows), 'params': params, 'score': score,
+                    'best_iteration': iteration, 'fit_seconds': round(time.perf_counter() - t0, 4),
+                    'elapsed_seconds': round(time.perf_counter() - start, 4), 'error': error,
+                }, default=str) + '\n')
+                trace.flush()
+
+            finished = len(results) == len(configs)
+            if finished or best is None:
+                ranked = sorted((r for r in results if math.isfinite(r[0])), key=lambda r: -r[0])
+                if ranked:
+                    best = ranked[0]
+            if not finished or len(configs) == 1 or n_rows >= len(y):
+                if not finished:
+                    print(f"Time budget spent during rung {rung}; using the best of the last completed rung")
+                break
+
+            keep = max(1, len(ranked) // eta)
+            configs = [params for _, params, _ in ranked[:keep]]
+            n_rows = min(len(y), n_rows * eta)
+            rung += 1
+
+    if best is None:
+        raise RuntimeError('Search evaluated no configuration within the budget')
+    print(f"Search finished in {time.perf_counter() - start:.1f}s after {rung + 1} rung(s); trace: {trace_path}")
+    return best[1], best[0], best[2]
+
+
 def train_classification(X, y, feature_names=None):
     print("Training RandomForestClassifier for crop recommendation...")
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
 
-    param_grid = {
-        'n_estimators': [100, 200],
-        'max_depth': [10, 20, None]
-    }
-    clf = RandomForestClassifier(random_state=42)
-    gs = GridSearchCV(clf, param_grid, cv=3, scoring='f1_macro', n_jobs=-1)
-    gs.fit(X_train, y_train)
+    if SEARCH['mode'] == 'halving':
+        make = lambda params: RandomForestClassifier(random_state=42, n_jobs=-1, **params)
+        best_params, score, _ = successive_halving(
+            make, RF_SPACE, X_train, y_train, 'f1_macro',
+            os.path.join(SEARCH['trace_dir'], 'search_trace_classification.jsonl'),
+            classification=True,
+        )
+        print(f"Best CV f1_macro: {score:.4f}")
+        best = make(best_params).fit(X_train, y_train)
+    else:
+        param_grid = {
+            'n_estimators': [100, 200],
+            'max_depth': [10, 20, None]
+        }
+        clf = RandomForestClassifier(random_state=42)
+        gs = GridSearchCV(clf, param_grid, cv=3, scoring='f1_macro', n_jobs=-1)
+        gs.fit(X_train, y_train)
+        best, best_params = gs.best_estimator_, gs.best_params_
 
-    best = gs.best_estimator_
     y_pred = best.predict(X_test)
     acc = accuracy_score(y_test, y_pred)
     f1 = f1_score(y_test, y_pred, average='macro')
 
-    print(f"Best params: {gs.best_params_}")
+    print(f"Best params: {best_params}")
     print(f"Accuracy: {acc:.4f}")
     print(f"F1 (macro): {f1:.4f}")
 
@@ -86,6 +263,17 @@ def train_classification(X, y, feature_names=None):
     joblib.dump(best, 'models/rf_crop_model.joblib')
     print('Saved classifier to models/rf_crop_model.joblib')
 
+    # Flattened tree arrays; the backend memory-maps these instead of unpickling the forest
+    compiled = compile_validated(best, X=X_test)
+    if compiled is not None:
+        save_npz(compiled, 'models/rf_crop_model.npz')
+        print('Exported flattened classifier to models/rf_crop_model.npz')
+    else:
+        # Never leave a stale export from a previous run next to the new forest
+        if os.path.exists('models/rf_crop_model.npz'):
+            os.remove('models/rf_crop_model.npz')
+        print('Warning: classifier export failed validation; backend will load the joblib file')
+
 
 def train_regression(X, y, feature_names=None):
     print("Training XGBoostRegressor for yield prediction...")
@@ -95,21 +283,36 @@ def train_regression(X, y, feature_names=None):
 
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
-    param_grid = {
-        'n_estimators': [100, 200],
-        'learning_rate': [0.1, 0.01],
-        'max_depth': [3, 6]
-    }
-    reg = XGBRegressor(random_state=42, objective='reg:squarederror')
-    gs = GridSearchCV(reg, param_grid, cv=3, scoring='neg_root_mean_squared_error', n_jobs=-1)
-    gs.fit(X_train, y_train)
+    if SEARCH['mode'] == 'halving':
+        make = lambda params: XGBRegressor(
+            random_state=42, objective='reg:squarederror', n_estimators=XGB_MAX_ESTIMATORS,
+            early_stopping_rounds=XGB_EARLY_STOPPING_ROUNDS, **params)
+        best_params, score, n_trees = successive_halving(
+            make, XGB_SPACE, X_train, np.asarray(y_train), 'neg_root_mean_squared_error',
+            os.path.join(SEARCH['trace_dir'], 'search_trace_regression.jsonl'),
+            early_stopping=True,
+        )
+        print(f"Best CV RMSE: {-score:.4f}")
+        # Final model: the tree count early stopping settled on, fitted on all training rows
+        best_params = dict(best_params, n_estimators=n_trees)
+        best = XGBRegressor(random_state=42, objective='reg:squarederror', **best_params)
+        best.fit(X_train, y_train)
+    else:
+        param_grid = {
+            'n_estimators': [100, 200],
+            'learning_rate': [0.1, 0.01],
+            'max_depth': [3, 6]
+        }
+        reg = XGBRegressor(random_state=42, objective='reg:squarederror')
+        gs = GridSearchCV(reg, param_grid, cv=3, scoring='neg_root_mean_squared_error', n_jobs=-1)
+        gs.fit(X_train, y_train)
+        best, best_params = gs.best_estimator_, gs.best_params_
 
-    best = gs.best_estimator_
     y_pred = best.predict(X_test)
     rmse = np.sqrt(mean_squared_error(y_test, y_pred))
     r2 = r2_score(y_test, y_pred)
 
-    print(f"Best params: {gs.best_params_}")
+    print(f"Best params: {best_params}")
     print(f"RMSE: {rmse:.4f}")
     print(f"R2: {r2:.4f}")
 
@@ -129,7 +332,25 @@ def train_regression(X, y, feature_names=None):
     print('Saved regressor to models/xgb_yield_model.joblib')
 
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Train the crop and yield models.')
+    parser.add_argument('--search', choices=['grid', 'halving'], default=SEARCH['mode'],
+                        help='Hyperparameter search: small exhaustive grid, or budget-aware successive halving.')
+    parser.add_argument('--time-budget', type=float, default=SEARCH['time_budget'],
+                        help='Seconds each halving search may spend (default: no limit).')
+    parser.add_argument('--n-candidates', type=int, default=SEARCH['n_candidates'],
+                        help='Configurations sampled for the first halving rung.')
+    parser.add_argument('--eta', type=int, default=SEARCH['eta'],
+                        help='Halving factor: keep 1/eta of the configurations per rung.')
+    parser.add_argument('--min-samples', type=int, default=SEARCH['min_samples'],
+                        help='Training rows per configuration in the first rung.')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    SEARCH.update(mode=args.search, time_budget=args.time_budget, n_candidates=args.n_candidates,
+                  eta=max(2, args.eta), min_samples=args.min_samples)
     try:
         path = find_dataset()
         print('Using dataset:', path)
@@ -170,6 +391,10 @@ def main():
         else:
             print('No regression target detected; skipping regression training')
 
+        # Written last: the backend only hot-swaps to a set whose checksums match
+        manifest = write_manifest('models')
+        print('Wrote models/manifest.json, version', manifest['version'])
+
     except Exception:
         print('Training pipeline failed:')
         traceback.print_exc()